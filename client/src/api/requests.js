@@ -141,4 +141,28 @@ export const getUserSuggestions = async (query, signal) => {
 export const getSession = async () => {
   const res = await api.get("/me");
   return res.data;
-};
\ No newline at end of file
+};
+// Clone a list or template into a new list, or save a list as a template
+export const cloneList = async ({ sourceListId, listName, resetQuantities, includeMembers, asTemplate }) => {
+  const res = await api.post("/dashboard/clone_list", { sourceListId, listName, resetQuantities, includeMembers, asTemplate });
+  return res.data;
+};
+
+// Fetch list templates saved by user
+export const fetchUserTemplates = async () => {
+  const res = await api.get("/dashboard/templates");
+  return res.data;
+};
+
+// Fetch consolidated shopping view across lists (all lists if listIds is omitted)
+export const fetchShoppingView = async (listIds) => {
+  const params = listIds ? { list_ids: listIds.join(",") } : {};
+  const res = await api.get("/dashboard/shopping_view", { params });
+  return res.data;
+};
+
+// Fetch data of several lists at once
+export const fetchListsData = async (listIds) => {
+  const res = await api.get("/list/get_lists_data", { params: { ids: listIds.join(",") } });
+  return res.data;
+};
@@ -1,13 +1,16 @@
 """
 Main Flask backend script.
 """
+from dataclasses import fields
 from datetime import timedelta
-import json
+from functools import wraps
+import hashlib
 import os
-import sqlite3
+import random
+import time
 import bcrypt
 from dotenv import load_dotenv
-from flask import Flask, request, jsonify, session
+from flask import Blueprint, Flask, Response, current_app, request, jsonify, session
 from flask_cors import CORS
 
 from notifications import (
@@ -19,33 +22,228 @@ from notifications import (
     ActionableNotificationType
 )
 
+from backup import backup_scheduler
+from catalog import item_catalog
+from compression import init_compression
+import db
+from json_provider import make_json_provider
 from logger import logger
+from memory_repository import MemoryStore
+from metrics import init_metrics, metrics, render_metrics
+from migrations import apply_migrations
+from partitioned_repository import PartitionedStore
+from profiler import query_profiler
+from purger import list_purger
+import repository
+from repository import DatabaseBusyError, IntegrityError, get_repo
+from sqlite_repository import SqliteStore
+from schemas import (
+    AddItemRequest,
+    AddUserToListRequest,
+    CloneListRequest,
+    CreateListRequest,
+    DeleteItemRequest,
+    DeleteListRequest,
+    EditItemRequest,
+    EditListRequest,
+    ItemData,
+    LoginRequest,
+    ManageUsersRequest,
+    NotificationIdsRequest,
+    RegisterRequest,
+    SetThemeRequest,
+    validate_body
+)
 
 load_dotenv()
 
-# Defines app specification
-app = Flask(__name__)
-#CORS(app, origins=["http://localhost:3000"], supports_credentials=True)
-CORS(app, supports_credentials=True)
+# Routes are registered on a blueprint so that `create_app()` can build 
+# independent app instances (e.g. one per pre-forked server worker)
+bp = Blueprint('api', __name__)
 
-# Sets secret key for CORS capabilities
-app_secret = os.getenv("FLASK_SECRET_KEY")
-if not app_secret:
-    raise RuntimeError("Environment variable 'FLASK_SECRET_KEY' is not set. Please define it in your .env file.")
+# Maximum number of lists that can be fetched by one `/list/get_lists_data` request
+MAX_BATCH_LISTS = 100
 
-app.secret_key = app_secret
+# Times an idempotent route is run again when the database stayed busy past the writer's deadline
+BUSY_RETRIES = 2
 
-# Enables session expiration after a set time
-app.config['SESSION_PERMANENT'] = False
-app.permanent_session_lifetime = timedelta(days=7)
+# Upper bound (seconds) of the random pause before running an idempotent route again
+BUSY_RETRY_PAUSE = 0.25
+
+
+# ------------------------------------------------------------------------
+#       APP FACTORY
+# ------------------------------------------------------------------------
+
+def create_app(config: dict | None = None) -> Flask:
+    """
+    Create and configure a Flask app instance.
+
+    Configuration is read from the environment (and `.env`), then overridden by `config`.
+
+    ---
+    Config Keys:
+    - `SECRET_KEY` (str): Session signing key. Defaults to the `FLASK_SECRET_KEY` environment variable.
+    - `DATABASE` (str): Path to the SQLite database. Defaults to `db.DB_PATH`.
+    - `NOTIFICATIONS_DATABASE` (str | None): Path to a separate SQLite database for notifications,
+      with its own write lock, or None to keep them in `DATABASE`. Existing notifications are moved
+      there by the migrations. Defaults to the `GROCERY_NOTIFICATIONS_DB_PATH` environment variable.
+    - `LIST_PARTITIONS` (int): Number of files the list tables are hash-partitioned across by list ID
+      (see `partitioned_repository.py`), each with its own write lock, or `0` to keep them in `DATABASE`.
+      Existing lists are split by the migrations, after which the number cannot change. Defaults to the
+      `GROCERY_LIST_PARTITIONS` environment variable, or `0`.
+    - `DATA_BACKEND` (str): `'sqlite'` to serve the database at `DATABASE`, or `'memory'` to serve 
+      an in-memory copy of it (see `memory_repository.py`), which is never written back. Defaults to 
+      the `GROCERY_DATA_BACKEND` environment variable, or `'sqlite'`.
+    - `RUN_MIGRATIONS` (bool): Whether to migrate the database on startup. Defaults to `True`
+      unless `GROCERY_RUN_MIGRATIONS=0`. Production servers run migrations once in the 
+      master process instead.
+    - `START_LIST_PURGER` (bool): Whether to start the background list purger. Defaults to `True`.
+    - `BACKUP_INTERVAL` (float): Seconds between scheduled online backups (see `backup.py`), or `0`
+      to disable them. Defaults to `GROCERY_BACKUP_INTERVAL_MINUTES` (default `0`) times 60.
+    - `JSON_PROVIDER` (str): `'orjson'`, `'stdlib'` or `'auto'` (orjson if installed). Defaults to 
+      the `GROCERY_JSON_PROVIDER` environment variable, or `'auto'`.
+    - `COMPRESS_*`: Response compression settings, see `compression.init_compression()`.
+    - `METRICS_ENABLED` (bool): Whether to record request metrics and serve `/metrics`. Defaults 
+      to `True` unless `GROCERY_METRICS=0`.
+    - `QUERY_PROFILER` (bool): Whether to capture slow SQL statements, reported at `/debug/slow_queries`.
+      The report exposes SQL text and query plans without authentication, so it is meant for 
+      development and is off unless `GROCERY_QUERY_PROFILER=1`.
+    - `SLOW_QUERY_MS` (float): Duration from which a statement counts as slow. Defaults to 
+      `GROCERY_SLOW_QUERY_MS` or `50`.
+
+    Returns:
+    - `Flask`: The configured app.
+
+    Raises:
+    - `RuntimeError` if no secret key is configured.
+    """
+    app = Flask(__name__)
+    #CORS(app, origins=["http://localhost:3000"], supports_credentials=True)
+    CORS(app, supports_credentials=True)
+    
+    app.config.update(
+        SECRET_KEY=os.getenv("FLASK_SECRET_KEY"),
+        DATABASE=os.getenv("GROCERY_DB_PATH", db.DB_PATH),
+        NOTIFICATIONS_DATABASE=os.getenv("GROCERY_NOTIFICATIONS_DB_PATH", db.NOTIFICATIONS_DB_PATH),
+        LIST_PARTITIONS=int(os.getenv("GROCERY_LIST_PARTITIONS", db.LIST_PARTITIONS)),
+        DATA_BACKEND=os.getenv("GROCERY_DATA_BACKEND", "sqlite"),
+        RUN_MIGRATIONS=os.getenv("GROCERY_RUN_MIGRATIONS", "1") != "0",
+        START_LIST_PURGER=True,
+        BACKUP_INTERVAL=backup_scheduler.interval,
+        JSON_PROVIDER=os.getenv("GROCERY_JSON_PROVIDER", "auto"),
+        METRICS_ENABLED=os.getenv("GROCERY_METRICS", "1") != "0",
+        QUERY_PROFILER=os.getenv("GROCERY_QUERY_PROFILER", "0") == "1",
+        SLOW_QUERY_MS=float(os.getenv("GROCERY_SLOW_QUERY_MS", 50)),
+    )
+    app.config.update(config or {})
+    
+    # Sets secret key for CORS capabilities
+    if not app.config['SECRET_KEY']:
+        raise RuntimeError("Environment variable 'FLASK_SECRET_KEY' is not set. Please define it in your .env file.")
+    
+    # Enables session expiration after a set time
+    app.config['SESSION_PERMANENT'] = False
+    app.permanent_session_lifetime = timedelta(days=7)
+    
+    # Serializes all responses with orjson when available
+    app.json = make_json_provider(app, app.config['JSON_PROVIDER'])
+    
+    # Compresses large responses with brotli or gzip
+    init_compression(app)
+    
+    # Records per-route latency, status and SQL metrics, served at `/metrics`
+    if app.config['METRICS_ENABLED']:
+        init_metrics(app)
+    
+    # Captures slow SQL statements and their query plans
+    if app.config['QUERY_PROFILER']:
+        query_profiler.enable(app.config['SLOW_QUERY_MS'] / 1000)
+    
+    db.configure(app.config['DATABASE'], app.config['NOTIFICATIONS_DATABASE'] or None, app.config['LIST_PARTITIONS'])
+    
+    # Brings existing databases up to the current schema
+    if app.config['RUN_MIGRATIONS']:
+        migration_conn = db.connect()
+        apply_migrations(migration_conn)
+        migration_conn.close()
+    
+    # Routes reach the data only through the repositories of the configured backend
+    if app.config['DATA_BACKEND'] == 'memory':
+        if os.path.exists(app.config['DATABASE']):
+            repository.configure(MemoryStore.load(app.config['DATABASE'], db.NOTIFICATIONS_DB_PATH, db.LIST_PARTITIONS))
+        else:
+            repository.configure(MemoryStore.empty())
+    elif app.config['DATA_BACKEND'] == 'sqlite' and db.LIST_PARTITIONS:
+        repository.configure(PartitionedStore())
+    elif app.config['DATA_BACKEND'] == 'sqlite':
+        repository.configure(SqliteStore())
+    else:
+        raise RuntimeError(f"Unknown data backend: {app.config['DATA_BACKEND']}")
+    
+    # Hard-deletes soft-deleted lists in the background
+    if app.config['START_LIST_PURGER'] and app.config['DATA_BACKEND'] == 'sqlite':
+        list_purger.start()
+    
+    # Snapshots the database on a schedule while it stays in use
+    if app.config['BACKUP_INTERVAL'] > 0 and app.config['DATA_BACKEND'] == 'sqlite':
+        backup_scheduler.interval = app.config['BACKUP_INTERVAL']
+        backup_scheduler.start()
+    
+    app.register_blueprint(bp)
+    
+    return app
+
+
+# ------------------------------------------------------------------------
+#       ERROR HANDLING
+# ------------------------------------------------------------------------
+
+@bp.app_errorhandler(DatabaseBusyError)
+def database_busy(e):
+    """
+    Respond with `503 Service Unavailable` and a `Retry-After` header when a write
+    could not get the database in time. Nothing of the request's writes was applied.
+    """
+    logger.warning("Database busy: %s", e)
+    response = jsonify({'success': False, 'error': 'The server is busy, please try again.'})
+    response.status_code = 503
+    # Spread out retries from clients that failed together
+    response.headers['Retry-After'] = str(random.randint(1, 3))
+    return response
+
+def idempotent(view):
+    """
+    Route decorator marking a route as idempotent, so safe to run again from the start.
+
+    When the database stays busy past the writer's deadline, the route is run again up to
+    `BUSY_RETRIES` times after a random pause, before responding with `503`. Routes that 
+    are not idempotent, or that have effects outside their unit of work (such as new items 
+    and users, which the partitioned store commits on their own right away, see 
+    `partitioned_repository.py`), are not decorated; they respond with `503` straight away 
+    and leave retrying to the client.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        for attempt in range(BUSY_RETRIES + 1):
+            try:
+                return view(*args, **kwargs)
+            except DatabaseBusyError:
+                if attempt == BUSY_RETRIES:
+                    raise
+                metrics.inc('grocery_http_busy_retries_total', (('route', request.url_rule.rule),))
+                time.sleep(random.uniform(0, BUSY_RETRY_PAUSE))
+
+    return wrapper
 
 
 # ------------------------------------------------------------------------
 #       ROUTES
 # ------------------------------------------------------------------------
 
-@app.route('/login', methods=['POST'])
-def login():
+@bp.route('/login', methods=['POST'])
+@validate_body(LoginRequest)
+def login(body: LoginRequest):
     """
     Authenticate a user and initialize their session.
 
@@ -70,25 +268,23 @@ def login():
     - `200 OK` and JSON `{ success: True, username: str, currentListId: int | None }`
       on successful login.
     - `200 OK` and JSON `{ success: False, error: str }` if authentication fails.
+    - `400 Bad Request` and JSON `{ success: False, error: str }` if the request body is malformed.
 
     Raises:
     - None directly, but logs warnings for incorrect credentials and info on successful logins.
     """
-    logger.info("Login endpoint reached")
+    logger.debug("Login endpoint reached")
 
     # Get data from frontend request
-    data = request.get_json()
-    username = data.get('username')
-    password = data.get('password')
-    keep_logged_in = data.get('keepLoggedIn', False)
+    username = body.username
+    password = body.password
+    keep_logged_in = body.keep_logged_in
 
     # Query the database for the user and determine if login info is correct
-    with get_db_conn() as conn:
-        cursor = conn.cursor()
-        
-        user_info = cursor.execute('SELECT password_hash, user_id FROM users WHERE username = ?', (username,)).fetchone()
-        db_pw = user_info[0] if user_info else None
-        user_id = user_info[1] if user_info else None
+    with get_repo(readonly=True) as repo:
+        user_info = repo.users.get_credentials(username)
+        user_id = user_info[0] if user_info else None
+        db_pw = user_info[1] if user_info else None
 
         # If password does not exist in database for username, then user does not exist
         if db_pw is None:
@@ -124,24 +320,16 @@ def login():
         # NEEDS FIXING/REWRITING
         # ********
         # ------------------------------------
-        recent_list = cursor.execute('''
-            SELECT gl.list_id
-            FROM grocery_lists gl
-            JOIN grocery_list_users glu ON gl.list_id = glu.list_id
-            WHERE glu.user_id = ?
-            ORDER BY gl.update_date DESC
-            LIMIT 1
-        ''', (user_id,)).fetchone()
-        
-        current_list_id = recent_list[0] if recent_list else None
+        current_list_id = repo.lists.most_recent_for_user(user_id)
         session['current_list_id'] = current_list_id
     
     # If no list exists for user, currentListId will be null
     # Frontend should handle this case by prompting user to create a new list
     return jsonify({'success': True, 'username': username, 'currentListId': current_list_id}), 200
 
-@app.route('/register', methods=['POST'])
-def register():
+@bp.route('/register', methods=['POST'])
+@validate_body(RegisterRequest)
+def register(body: RegisterRequest):
     """
     Register a new user.
 
@@ -162,37 +350,38 @@ def register():
     - `200 OK` and JSON `{ success: True, username: str, currentListId: int | None }`
       on successful login.
     - `200 OK` and JSON `{ success: False, error: str }` if authentication fails.
+    - `400 Bad Request` and JSON `{ success: False, error: str }` if the request body is malformed.
 
     Raises:
     - None directly, but logs warnings for incorrect credentials and info on successful logins.
     """
-    logger.info("Register endpoint reached")
+    logger.debug("Register endpoint reached")
 
     # Get data from frontend
-    data = request.get_json()
-    username = data.get('username')
-    password = data.get('password')
+    username = body.username
+    password = body.password
 
     # Return error message if username or password do not exist
     if not username or not password:
         return jsonify({'success': False, 'error': 'Username and password are required'})
 
-    with get_db_conn() as conn:
+    # Hash the password before taking the writer, which is held for the whole block
+    hashed_pw = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt())
+
+    with get_repo() as repo:
         # Check if username already exists
-        cursor = conn.cursor()
-        existing_user = cursor.execute('SELECT user_id FROM users WHERE username = ?', (username,)).fetchone()
-        if existing_user:
+        if repo.users.get_id(username) is not None:
             return jsonify({'success': False, 'error': 'Username already exists'})
-
-        # Hash the password
-        hashed_pw = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt())
         
         # Insert new user into the database
-        cursor.execute('INSERT INTO users (username, password_hash) VALUES (?, ?)', (username, hashed_pw))
+        try:
+            repo.users.create(username, hashed_pw)
+        except IntegrityError:
+            return jsonify({'success': False, 'error': 'Username already exists'})
 
     return jsonify({'success': True, 'message': 'User registered successfully'}), 201
 
-@app.route('/logout', methods=['POST'])
+@bp.route('/logout', methods=['POST'])
 def logout():
     """
     Logs out user and clears their session.
@@ -209,7 +398,7 @@ def logout():
     session.clear() # Clear all session data
     return jsonify({"success": True, "message": "Logged out successfully"}), 200
 
-@app.route("/me", methods=["GET"])
+@bp.route("/me", methods=["GET"])
 def me():
     """
     Retrieve user and session information.
@@ -229,7 +418,7 @@ def me():
     else:
         return jsonify({"loggedIn": False}), 200
 
-@app.route("/get_theme", methods=["GET"])
+@bp.route("/get_theme", methods=["GET"])
 def get_theme():
     """
     Retrieve user theme information.
@@ -241,8 +430,9 @@ def get_theme():
     theme = session.get('theme', 'light')
     return jsonify({'success': True, 'theme': theme})
 
-@app.route("/set_theme", methods=['POST'])
-def set_theme():
+@bp.route("/set_theme", methods=['POST'])
+@validate_body(SetThemeRequest)
+def set_theme(body: SetThemeRequest):
     """
     Sets user theme in session.
     
@@ -250,14 +440,13 @@ def set_theme():
 
     ---
     Request JSON Parameters:
-    - `new_theme` (str): The user's new theme.
+    - `newTheme` (str): The user's new theme.
     
     Returns:
     - `200 OK` and JSON `{ success: True, theme: str }` if success setting theme.
     - `400 Bad Request` and JSON `{ success: False, error: str }` if error setting theme.
     """
-    data = request.get_json()
-    new_theme = data.get('newTheme')
+    new_theme = body.new_theme
     
     if new_theme not in ['light', 'dark']:
         return jsonify({'success': False, 'error': 'Invalid theme'}), 400
@@ -265,7 +454,7 @@ def set_theme():
     session['theme'] = new_theme
     return jsonify({'success': True, 'theme': new_theme})
 
-@app.route('/get_notifications', methods=['GET'])
+@bp.route('/get_notifications', methods=['GET'])
 def get_notifications():
     """
     Retrieve user's notifications.
@@ -280,29 +469,15 @@ def get_notifications():
     
     user_id = session['user_id']
     
-    with get_db_conn() as conn:
-        cursor = conn.cursor()
-        
-        # Get user's notifications
-        notifications = get_user_notifications(cursor, user_id)
-    
-    # Construct list of dicts of notifications
-    notifications_list = [{
-        'id': n[0],
-        'icon': n[1],
-        'message': n[2],
-        'actionable': bool(n[3]),
-        'action_type': n[4],
-        'requested_list_id': n[5],
-        'unread': bool(n[6]),
-        'created_at': n[7],
-        'data': n[8]
-    } for n in notifications]
+    with get_repo(readonly=True) as repo:
+        notifications_list = load_notifications(repo, user_id)
     
     return jsonify({'success': True, 'notifications': notifications_list})
 
-@app.route('/mark_notifications_as_read', methods=['PUT'])
-def mark_notifications_as_read():
+@bp.route('/mark_notifications_as_read', methods=['PUT'])
+@validate_body(NotificationIdsRequest)
+@idempotent
+def mark_notifications_as_read(body: NotificationIdsRequest):
     """
     Mark specified notifications as read.
     
@@ -310,37 +485,33 @@ def mark_notifications_as_read():
 
     ---
     Request JSON Parameters:
-    - `notification_ids` (list[int]): list of notification IDs to mark as read.
+    - `notificationIds` (list[int]): list of notification IDs to mark as read.
     
     Returns:
     - `200 OK` and JSON `{ success: True, message: str }` on success.
+    - `400 Bad Request` and JSON `{ success: False, error: str }` if the request body is malformed.
     - `500 Internal Server Error` and JSON `{ success: False, error: str }` 
         if database error occurs.
     
     Raises:
     - None directly, but returns error message if database operation fails.
     """
-    logger.info("Mark notifications as read endpoint reached")
+    logger.debug("Mark notifications as read endpoint reached")
     
-    data = request.get_json()
-    notification_ids = data.get('notificationIds', [])
+    notification_ids = body.notification_ids
     
-    with get_db_conn() as conn:
-        cursor = conn.cursor()
+    with get_repo(notifications_only=True) as repo:
         try:
-            for n_id in notification_ids: 
-                cursor.execute('''
-                    UPDATE notifications
-                    SET unread = ?
-                    WHERE id = ?               
-                ''', (0, n_id))
+            repo.notifications.mark_read(notification_ids)
         except Exception as e:
             return jsonify({'success': False, 'error': f'Error marking notification as read: {e}'}), 500
     
     return jsonify({'success': True, 'message': 'Notifications successfully marked as read!'}), 200
 
-@app.route('/delete_notifications', methods=['POST'])
-def delete_notifications():
+@bp.route('/delete_notifications', methods=['POST'])
+@validate_body(NotificationIdsRequest)
+@idempotent
+def delete_notifications(body: NotificationIdsRequest):
     """
     Delete specified notifications from the database.
     
@@ -353,31 +524,26 @@ def delete_notifications():
 
     Returns:
     - `200 OK` and JSON `{ success: True, message: str }` on successful deletion.
+    - `400 Bad Request` and JSON `{ success: False, error: str }` if the request body is malformed.
     - `500 Internal Server Error` and JSON `{ success: False, error: str }` if a database error occurs.
 
     Raises:
     - None directly, but returns an error message if a database operation fails.
     """
-    logger.info("Delete notifications endpoint reached")
+    logger.debug("Delete notifications endpoint reached")
     
-    data = request.get_json()
-    notification_ids = data.get('notificationIds', [])
+    notification_ids = body.notification_ids
     
-    with get_db_conn() as conn:
-        cursor = conn.cursor()
+    with get_repo(notifications_only=True) as repo:
         try:
-            for n_id in notification_ids:
-                cursor.execute('''
-                    DELETE FROM notifications
-                    WHERE id = ?     
-                ''', (n_id,))
+            repo.notifications.delete(notification_ids)
         except Exception as e:
-            logger.error(f"Error deleting notification: {e}")
+            logger.error("Error deleting notification: %s", e)
             return jsonify({'success': False, 'error': f'Error deleting notification: {e}'}), 500
             
     return jsonify({'success': True, 'message': 'Deleted notifications successfully!'}), 200
 
-@app.route('/categories', methods=['GET'])
+@bp.route('/categories', methods=['GET'])
 def get_categories():
     """
     Retrieve grocery list item categories.
@@ -390,17 +556,16 @@ def get_categories():
     - `500 Internal Server Error` and JSON `{ success: False, error: str }` on database failure.
     """
     # Retrieve categories from database
-    with get_db_conn() as conn:
-        cursor = conn.cursor()
+    with get_repo(readonly=True) as repo:
         try:
-            categories = cursor.execute('SELECT name, category_id FROM categories').fetchall()
+            categories = repo.items.categories()
         except Exception as e:
             return jsonify({'success': False, 'error': f'Error retrieving categories: {e}'}), 500
     
     categories_list = [{'name': c[0], 'category_id': c[1]} for c in categories]
     return jsonify({'success': True, 'categories': categories_list}), 200
 
-@app.route('/dashboard/lists', methods=['GET'])
+@bp.route('/dashboard/lists', methods=['GET'])
 def get_user_lists():
     """
     Retrieve all grocery lists associated with the logged-in user.
@@ -428,42 +593,25 @@ def get_user_lists():
     Raises:
     - None directly, but returns an error message for authentication or database failures.
     """
-    logger.info("Get user lists endpoint reached")
+    logger.debug("Get user lists endpoint reached")
     
     if 'user_id' not in session:
         return jsonify({'success': False, 'error': 'User not logged in'}), 401
     
     user_id = session['user_id']
     
-    with get_db_conn() as conn:
-        cursor = conn.cursor()
+    with get_repo(readonly=True) as repo:
         try:
             # Retrieve list ID, list name, user's role, and update date of all user's lists
-            lists = cursor.execute('''
-                SELECT gl.list_id, gl.name, glu.role, gl.update_date
-                FROM grocery_lists gl
-                JOIN grocery_list_users glu ON gl.list_id = glu.list_id
-                WHERE glu.user_id = ?
-                ORDER BY gl.update_date DESC
-            ''', (user_id,)).fetchall()
+            lists = repo.lists.for_user(user_id)
             
             list_ids = [l[0] for l in lists]
             
+            other_users_map = {}
             if list_ids:
-                other_users_map = {}
-                placeholders = ', '.join(['?'] * len(list_ids))
-
-                other_users_query = f'''
-                    SELECT glu.list_id, glu.user_id, u.username, glu.role
-                    FROM grocery_list_users glu
-                    JOIN users u ON glu.user_id = u.user_id
-                    WHERE glu.list_id IN ({placeholders})
-                    AND glu.user_id != ?
-                '''
-                
                 # Get list of (list_id, user_id, username, role) for all other users for every list the
                 # logged in user has access to
-                other_users_rows = conn.execute(other_users_query, (*list_ids, user_id)).fetchall()
+                other_users_rows = repo.memberships.other_members_of_lists(list_ids, user_id)
 
                 for list_id, user_id, username, role in other_users_rows:
                     user_data = {'user_id': user_id, 'username': username, 'role': role.capitalize()}
@@ -471,7 +619,7 @@ def get_user_lists():
                         other_users_map[list_id] = []
                     other_users_map[list_id].append(user_data)
         except Exception as e:
-            logger.error(f"Error retrieving lists: {e}")
+            logger.error("Error retrieving lists: %s", e)
             return jsonify({'success': False, 'error': f'Error retrieving lists: {e}'}), 500
     
     # Construct list to send to frontend with list info
@@ -490,7 +638,94 @@ def get_user_lists():
         
     return jsonify({'success': True, 'lists': lists_info})
 
-@app.route('/list/get_list_data', methods=['GET'])
+@bp.route('/dashboard/shopping_view', methods=['GET'])
+def get_shopping_view():
+    """
+    Retrieve a consolidated shopping view across several of the user's grocery lists.
+
+    Items from the selected lists are combined into one entry per item, with 
+    quantities summed and the contributing lists recorded, grouped by category.  
+    The aggregation is computed by `repo.items.totals_for_lists()`, a single grouped query on SQLite.
+
+    The response carries an `ETag` derived from the versions of the included lists, 
+    so clients can revalidate with `If-None-Match` and receive `304 Not Modified` 
+    without the aggregation query being run.
+
+    ---
+    Query Parameters:
+    - `list_ids` (str, optional): Comma-separated list IDs to include.  
+      Defaults to all of the user's lists. IDs the user cannot access are ignored.
+
+    Returns:
+    - `200 OK` and JSON:
+        {
+            "success": True,
+            "lists": [ { "id": int, "name": str, "version": int }, ... ],
+            "categories": [
+                {
+                    "category": str,
+                    "items": [
+                        {
+                            "item_id": int,
+                            "name": str,
+                            "quantity": int,
+                            "lists": [ { "list_id": int, "quantity": int }, ... ]
+                        }, ...
+                    ]
+                }, ...
+            ]
+        }
+    - `304 Not Modified` if the client's cached copy is still current.
+    - `400 Bad Request` and JSON `{ success: False, error: str }` if `list_ids` is malformed.
+    - `401 Unauthorized` and JSON `{ success: False, error: str }` if the user is not logged in.
+    - `500 Internal Server Error` and JSON `{ success: False, error: str }` if a database error occurs.
+    """
+    logger.debug("Get shopping view endpoint reached")
+    
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'error': 'User not logged in'}), 401
+    
+    requested_ids = parse_id_list(request.args.get('list_ids'))
+    if requested_ids is False:
+        return jsonify({'success': False, 'error': 'list_ids must be a comma-separated list of integers'}), 400
+    
+    user_id = session['user_id']
+    
+    with get_repo(readonly=True) as repo:
+        try:
+            # Read versions and items from the same snapshot so the ETag matches the payload
+            repo.snapshot()
+            
+            lists = repo.lists.versions_for_user(user_id, requested_ids)
+            
+            etag = hashlib.sha1(f"{user_id}|{[(l[0], l[2]) for l in lists]}".encode('utf-8')).hexdigest()
+            if request.if_none_match.contains_weak(etag):
+                return '', 304, {'ETag': f'W/"{etag}"', 'Cache-Control': 'private, no-cache'}
+            
+            # One row per item: category, item, total quantity, and (list_id, quantity) pairs
+            rows = repo.items.totals_for_lists([l[0] for l in lists])
+        except Exception as e:
+            logger.error("Error retrieving shopping view: %s", e)
+            return jsonify({'success': False, 'error': f'Error retrieving shopping view: {e}'}), 500
+    
+    # Rows are ordered by category, so each category's items are contiguous
+    categories_list = []
+    for category, item_id, name, quantity, provenance in rows:
+        if not categories_list or categories_list[-1]['category'] != category:
+            categories_list.append({'category': category, 'items': []})
+        
+        item_lists = [{'list_id': pair_list_id, 'quantity': pair_quantity} for pair_list_id, pair_quantity in provenance]
+        
+        categories_list[-1]['items'].append({'item_id': item_id, 'name': name, 'quantity': quantity, 'lists': item_lists})
+    
+    lists_info = [{'id': l[0], 'name': l[1], 'version': l[2]} for l in lists]
+    
+    response = jsonify({'success': True, 'lists': lists_info, 'categories': categories_list})
+    response.headers['ETag'] = f'W/"{etag}"'
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+@bp.route('/list/get_list_data', methods=['GET'])
 def get_list_data():
     """
     Retrieve all data for a specific grocery list.
@@ -516,7 +751,7 @@ def get_list_data():
     Raises:
     - None directly, but may return structured error JSON on database or access errors.
     """
-    logger.info("Get List Data endpoint reached")
+    logger.debug("Get List Data endpoint reached")
     
     # Get list ID from request
     list_id = request.args.get('list_id', type=int)
@@ -524,53 +759,98 @@ def get_list_data():
     if list_id is None:
         return jsonify({'success': False, 'error': 'list_id parameter is required'}), 400
     
-    with get_db_conn() as conn:
-        cursor = conn.cursor()
+    with get_repo(readonly=True) as repo:
+        payload, status = load_list_data(repo, list_id, session['user_id'])
+    
+    return jsonify(payload), status
+
+@bp.route('/list/get_lists_data', methods=['GET'])
+def get_lists_data():
+    """
+    Retrieve data for several grocery lists in one request.
+
+    This is the batch form of `/list/get_list_data`, intended for dashboard previews 
+    and clients pre-fetching lists for offline use. Access to all requested lists is 
+    checked with one query, and items and users of all accessible lists are each 
+    fetched with one query, regardless of the number of lists.
+
+    Lists the user cannot access (or that do not exist) do not fail the request; 
+    their IDs are returned in `denied` instead.
+
+    ---
+    Query Parameters:
+    - `ids` (str, required): Comma-separated IDs of the lists to retrieve, at most `MAX_BATCH_LISTS`.
+
+    Returns:
+    - `200 OK` and JSON:
+        {
+            "success": True,
+            "lists": [
+                {
+                    "listId": int,
+                    "userRole": str,
+                    "items": [ { "name": str, "category": str, "quantity": int, "item_id": int }, ... ],
+                    "listName": str,
+                    "modified": str,
+                    "otherUsers": [ { "user_id": int, "username": str, "role": str }, ... ]
+                }, ...
+            ],
+            "denied": [ int, ... ]
+        }
+    - `400 Bad Request` and JSON `{ success: False, error: str }` if `ids` is missing, malformed or too long.
+    - `401 Unauthorized` and JSON `{ success: False, error: str }` if the user is not logged in.
+    - `500 Internal Server Error` and JSON `{ success: False, error: str }` if a database error occurs.
+    """
+    logger.debug("Get Lists Data endpoint reached")
+    
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'error': 'User not logged in'}), 401
+    
+    requested_ids = parse_id_list(request.args.get('ids'))
+    if not requested_ids:
+        return jsonify({'success': False, 'error': 'ids must be a comma-separated list of integers'}), 400
+    if len(requested_ids) > MAX_BATCH_LISTS:
+        return jsonify({'success': False, 'error': f'At most {MAX_BATCH_LISTS} lists can be requested at once'}), 400
+    
+    user_id = session['user_id']
+    
+    with get_repo(readonly=True) as repo:
         try:
-            # Get user's role in list
-            user_role = cursor.execute('''
-                SELECT role
-                FROM grocery_list_users
-                WHERE list_id = ? 
-                AND user_id = ?                               
-            ''', (list_id, session['user_id'])).fetchone()
-            
-            if not user_role:
-                return jsonify({'success': False, 'error': 'You do not have access to this list!'}), 403
+            # Check access to every requested list at once
+            accessible = repo.lists.accessible(user_id, requested_ids)
             
-            # Get all (item name, category name, item quantity, item ID) groups for specified list
-            items = cursor.execute('''
-                SELECT i.name, c.name AS category, gli.quantity, i.item_id
-                FROM grocery_list_items gli
-                JOIN items i ON gli.item_id = i.item_id
-                JOIN categories c ON i.category_id = c.category_id
-                WHERE gli.list_id = ?
-            ''', (list_id,)).fetchall()
-
-            list_info = cursor.execute('SELECT name, update_date FROM grocery_lists WHERE list_id = ?', (list_id,)).fetchone()
-            list_name = list_info[0] if list_info else ''
-            modified = list_info[1] if list_info else None
+            lists_map = {
+                l[0]: {'listId': l[0], 'userRole': l[1].capitalize(), 'items': [], 'listName': l[2], 'modified': l[3], 'otherUsers': []}
+                for l in accessible
+            }
             
-            # Get other users and their roles of the specified list
-            list_users = cursor.execute('''
-                SELECT u.user_id, u.username, glu.role
-                FROM grocery_list_users glu
-                JOIN users u ON glu.user_id = u.user_id
-                WHERE glu.list_id = ?
-                AND u.user_id != ?
-            ''', (list_id, session['user_id'])).fetchall()
+            list_users = []
+            if lists_map:
+                # Get items of all accessible lists, grouped by list
+                list_items = repo.items.on_lists(list(lists_map))
+                
+                # Get other users of all accessible lists
+                list_users = repo.memberships.other_members_of_lists(list(lists_map), user_id)
+                
+                items_lists = build_items_lists(repo, [(i[1], i[2]) for i in list_items])
+                for (list_id, _, _), item in zip(list_items, items_lists):
+                    if item is not None:
+                        lists_map[list_id]['items'].append(item)
         except Exception as e:
-            logger.error(f"Error retrieving list data: {e}")
-            return jsonify({'success': False, 'error': f'Error retrieving list data: {e}'}), 500
-
-        other_users = [{'user_id': user[0], 'username': user[1], 'role': user[2].capitalize()} for user in list_users]
+            logger.error("Error retrieving lists data: %s", e)
+            return jsonify({'success': False, 'error': f'Error retrieving lists data: {e}'}), 500
     
-    items_list = [{'name': item[0], 'category': item[1], 'quantity': item[2], 'item_id': item[3]} for item in items]
-
-    return jsonify({'success': True, 'userRole': user_role[0].capitalize(), 'items': items_list, 'listName': list_name, 'modified': modified, 'otherUsers': other_users})
+    for list_id, other_user_id, username, role in list_users:
+        lists_map[list_id]['otherUsers'].append({'user_id': other_user_id, 'username': username, 'role': role.capitalize()})
+    
+    lists_data = [lists_map[list_id] for list_id in requested_ids if list_id in lists_map]
+    denied = [list_id for list_id in requested_ids if list_id not in lists_map]
+    
+    return jsonify({'success': True, 'lists': lists_data, 'denied': denied})
 
-@app.route('/dashboard/create_list', methods=['POST'])
-def create_list():
+@bp.route('/dashboard/create_list', methods=['POST'])
+@validate_body(CreateListRequest)
+def create_list(body: CreateListRequest):
     """
     Create a new grocery list for the logged-in user.
 
@@ -585,48 +865,47 @@ def create_list():
       Each object should include:
         - `user_id` (int): The invited user's ID.  
         - `role` (str): The role of the invited user in the list (e.g., `"editor"`, `"viewer"`).
-    - 'items' (list[dict], optiioonal): A list of items to add to the new list.
+    - `items` (list[dict], optional): A list of items to add to the new list.  
+      Each object should include:
+        - `item_id` (int): The item's ID.  
+        - `quantity` (int, optional): The amount of the item. Defaults to `1`.
 
     Returns:
     - `201 Created` and JSON `{ success: True, listId: int }` on success.
+    - `400 Bad Request` and JSON `{ success: False, error: str }` if the request body is malformed.
     - `401 Unauthorized` and JSON `{ success: False, error: str }` if the user is not logged in.
     - `500 Internal Server Error` and JSON `{ success: False, error: str }` if a database or unexpected error occurs.
 
     Raises:
     - None directly, but returns error messages for authentication or database failures.
     """
-    logger.info("Create list endpoint reached")
+    logger.debug("Create list endpoint reached")
     
     if 'user_id' not in session:
         return jsonify({'success': False, 'error': 'User not logged in'}), 401
     
     # Get data from frontend
-    data = request.get_json()
-    list_name = data.get('listName', 'New List')
-    other_users = data.get('otherUsers', [])
-    items = data.get('items', [])
+    list_name = body.list_name
+    other_users = body.other_users
+    items = body.items
     
     user_id = session['user_id']
     
-    with get_db_conn() as conn:
-        cursor = conn.cursor()
-        
+    with get_repo() as repo:
         try:
-            # Insert new list into grocery_lists table
-            cursor.execute('INSERT INTO grocery_lists (name, creation_date, update_date) VALUES (?, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)', (list_name,))
-            list_id = cursor.lastrowid
+            # Create the new list
+            list_id = repo.lists.create(list_name)
             
-            # Add current user to grocery_list_users table
-            cursor.execute('INSERT INTO grocery_list_users (list_id, user_id, role) VALUES (?, ?, ?)', (list_id, user_id, 'owner'))
+            # Add current user to the list as its owner
+            repo.memberships.add(list_id, user_id, 'owner')
             
             # Add items to list
-            for i in items:
-                cursor.execute('INSERT INTO grocery_list_items (list_id, item_id, quantity) VALUES (?, ?, ?)', (list_id, i.get('item_id'), i.get('quantity')))
+            repo.items.add_many_to_list(list_id, [(i.item_id, i.quantity) for i in items])
             
             # Create invite notifications for added users
-            user_ids = [user['user_id'] for user in other_users]
+            user_ids = [user.user_id for user in other_users]
             create_notifications_for_users(
-                cur=cursor,
+                repo=repo,
                 user_ids=user_ids,
                 message=f"{session['username']} invites you to grocery list '{list_name}'.",
                 icon=NotificationType.INVITE.value,
@@ -634,16 +913,132 @@ def create_list():
                 action_type=ActionableNotificationType.JOIN_LIST_REQUEST.value,
                 requested_list_id=list_id,
                 unread=True,
-                data={'user_roles': [user['role'] for user in other_users]}
+                data={'user_roles': [user.role for user in other_users]}
             )
         except Exception as e:
-            logger.error(f"Error creating new list: {e}")
+            logger.error("Error creating new list: %s", e)
             return jsonify({'success': False, 'error': 'Error creating new list'}), 500
     
     return jsonify({'success': True, 'listId': list_id}), 201
 
-@app.route('/dashboard/delete_list', methods=['POST'])
-def delete_list():
+@bp.route('/dashboard/clone_list', methods=['POST'])
+@validate_body(CloneListRequest)
+def clone_list(body: CloneListRequest):
+    """
+    Create a new grocery list or template by copying an existing list or template.
+
+    This endpoint covers three cases:
+    - Cloning a list into a new list (e.g. recreating a weekly list).
+    - Saving a list as a reusable template (`asTemplate` set to `True`).
+    - Instantiating a new list from a saved template.
+
+    Items (and optionally members) are copied inside a single transaction, with 
+    `INSERT ... SELECT` statements on SQLite, so a 300-item list is copied with one statement.  
+    The user becomes the owner of the copy. Copied members keep their roles, except 
+    that the source list's owner becomes an admin, and are notified of the new list.
+
+    ---
+    Request JSON Parameters:
+    - `sourceListId` (int): The ID of the list or template to copy.
+    - `listName` (str, optional): The name of the copy. Defaults to the source list's name.
+    - `resetQuantities` (bool, optional): Whether to reset all item quantities to 1. Defaults to `False`.
+    - `includeMembers` (bool, optional): Whether to copy the source list's other users. 
+      Ignored when saving a template. Defaults to `False`.
+    - `asTemplate` (bool, optional): Whether to save the copy as a template. Defaults to `False`.
+
+    Returns:
+    - `201 Created` and JSON `{ success: True, listId: int, isTemplate: bool }` on success.
+    - `400 Bad Request` and JSON `{ success: False, error: str }` if the source list ID is missing or the request body is malformed.
+    - `401 Unauthorized` and JSON `{ success: False, error: str }` if the user is not logged in.
+    - `403 Forbidden` and JSON `{ success: False, error: str }` if the user does not have access to the source list.
+    - `500 Internal Server Error` and JSON `{ success: False, error: str }` if a database or unexpected error occurs.
+
+    Raises:
+    - None directly, but returns error messages for authentication or database failures.
+    """
+    logger.debug("Clone list endpoint reached")
+    
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'error': 'User not logged in'}), 401
+    
+    source_list_id = body.source_list_id
+    list_name = body.list_name
+    reset_quantities = body.reset_quantities
+    as_template = body.as_template
+    include_members = body.include_members and not as_template
+    
+    user_id = session['user_id']
+    
+    with get_repo() as repo:
+        try:
+            if not repo.memberships.get_role(source_list_id, user_id):
+                return jsonify({'success': False, 'error': 'User does not have access to this list'}), 403
+            
+            if not list_name:
+                list_name = repo.lists.get_name(source_list_id)
+            
+            # Create the new list or template, owned by the current user
+            list_id = repo.lists.create(list_name, as_template)
+            repo.memberships.add(list_id, user_id, 'owner')
+            
+            # Copy all items
+            repo.items.copy_list(source_list_id, list_id, reset_quantities)
+            
+            if include_members:
+                # Copy all other users
+                repo.memberships.copy(source_list_id, list_id, user_id)
+                
+                create_notifications_for_users_of_list(
+                    repo=repo,
+                    list_id=list_id,
+                    creator_user_id=user_id,
+                    message=f"{session['username']} added you to new grocery list '{list_name}'.",
+                    icon=NotificationType.INVITE.value
+                )
+        except Exception as e:
+            logger.error("Error cloning list with ID %s: %s", source_list_id, e)
+            return jsonify({'success': False, 'error': 'Error cloning list'}), 500
+    
+    return jsonify({'success': True, 'listId': list_id, 'isTemplate': as_template}), 201
+
+@bp.route('/dashboard/templates', methods=['GET'])
+def get_user_templates():
+    """
+    Retrieve all list templates saved by the logged-in user.
+
+    Templates are created with `/dashboard/clone_list` and instantiated by passing 
+    their ID as `sourceListId` to the same endpoint.
+
+    ---
+    Returns:
+    - `200 OK` and JSON `{ success: True, templates: list[dict] }` on success.
+        Each template dictionary includes:
+        - `id` (int): The template's list ID.
+        - `name` (str): The template name.
+        - `item_count` (int): The number of items in the template.
+        - `last_updated` (str): Timestamp of the last modification.
+    - `401 Unauthorized` and JSON `{ success: False, error: str }` if the user is not logged in.
+    - `500 Internal Server Error` and JSON `{ success: False, error: str }` if a database error occurs.
+    """
+    logger.debug("Get user templates endpoint reached")
+    
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'error': 'User not logged in'}), 401
+    
+    with get_repo(readonly=True) as repo:
+        try:
+            templates = repo.lists.templates_for_user(session['user_id'])
+        except Exception as e:
+            logger.error("Error retrieving templates: %s", e)
+            return jsonify({'success': False, 'error': f'Error retrieving templates: {e}'}), 500
+    
+    templates_list = [{'id': t[0], 'name': t[1], 'item_count': t[3], 'last_updated': t[2]} for t in templates]
+    return jsonify({'success': True, 'templates': templates_list})
+
+@bp.route('/dashboard/delete_list', methods=['POST'])
+@validate_body(DeleteListRequest)
+@idempotent
+def delete_list(body: DeleteListRequest):
     """
     Deletes a specified grocery list.
 
@@ -657,7 +1052,7 @@ def delete_list():
 
     Returns:
     - `200 OK` and JSON `{ success: True }` on successful deletion.
-    - `400 Bad Request` and JSON `{ success: False, error: str }` if the list ID is missing.
+    - `400 Bad Request` and JSON `{ success: False, error: str }` if the list ID is missing or the request body is malformed.
     - `401 Unauthorized` and JSON `{ success: False, error: str }` if the user is not logged in.
     - `403 Forbidden` and JSON `{ success: False, error: str }` if the user does not have access to the list.
     - `500 Internal Server Error` and JSON `{ success: False, error: str }` if a database or unexpected error occurs.
@@ -665,57 +1060,50 @@ def delete_list():
     Raises:
     - None directly, but returns error messages for authentication or database failures.
     """
-    logger.info("Delete list endpoint reached")
+    logger.debug("Delete list endpoint reached")
     
     if 'user_id' not in session:
         return jsonify({'success': False, 'error': 'User not logged in'}), 401
     
-    data = request.get_json()
-    list_id = data.get('listId')
-    
-    if list_id is None:
-        return jsonify({'success': False, 'error': 'listId parameter is required'}), 400
+    list_id = body.list_id
     
     user_id = session['user_id']
     
-    with get_db_conn() as conn:
-        cursor = conn.cursor()
-        
+    with get_repo() as repo:
         try:
             # Check if the user has access to the list
-            access_check = cursor.execute('SELECT 1 FROM grocery_list_users WHERE list_id = ? AND user_id = ?', (list_id, user_id)).fetchone()
-            if not access_check:
+            if not repo.memberships.get_role(list_id, user_id):
                 return jsonify({'success': False, 'error': 'User does not have access to this list'}), 403
             
             # Retrieve list name
-            list_name = cursor.execute('SELECT name FROM grocery_lists WHERE list_id = ?', (list_id,)).fetchone()[0]
+            list_name = repo.lists.get_name(list_id)
         
             # Get other users of list
-            other_users = cursor.execute('SELECT user_id FROM grocery_list_users WHERE list_id = ? AND user_id != ?', (list_id, user_id)).fetchall()
-            other_user_ids = [u[0] for u in other_users]
+            other_user_ids = repo.memberships.other_member_ids(list_id, user_id)
             
             # Send notifications to other users that the list has been deleted
             create_notifications_for_users(
-                cur=cursor,
+                repo=repo,
                 user_ids=other_user_ids,
                 message=f"{session['username']} has deleted grocery list {list_name}.",
                 icon=NotificationType.DELETE.value,
             )
             
-            # Delete items associated with the list
-            cursor.execute('DELETE FROM grocery_list_items WHERE list_id = ?', (list_id,))
-            # Delete user associations with the list
-            cursor.execute('DELETE FROM grocery_list_users WHERE list_id = ?', (list_id,))
-            # Delete the list itself
-            cursor.execute('DELETE FROM grocery_lists WHERE list_id = ?', (list_id,))
+            # Soft-delete the list. Its items, users and notifications are
+            # removed later in small batches by the background list purger.
+            repo.lists.soft_delete(list_id)
         except Exception as e:
-            logger.error(f"Error deleting list with ID {list_id}: {e}")
+            logger.error("Error deleting list with ID %s: %s", list_id, e)
             return jsonify({'success': False, 'error': f'Error deleting list: {e}'}), 500
     
+    list_purger.wake()
+    
     return jsonify({'success': True}), 200
 
-@app.route('/dashboard/edit_list', methods=['PUT'])
-def edit_list():
+@bp.route('/dashboard/edit_list', methods=['PUT'])
+@validate_body(EditListRequest)
+@idempotent
+def edit_list(body: EditListRequest):
     """
     Edits a specified grocery list.
 
@@ -734,7 +1122,7 @@ def edit_list():
 
     Returns:
     - `200 OK` and JSON `{ success: True, message: str }` on successful edit.
-    - `400 Bad Request` and JSON `{ success: False, error: str }` if the list ID or name is missing.
+    - `400 Bad Request` and JSON `{ success: False, error: str }` if the list ID or name is missing or the request body is malformed.
     - `401 Unauthorized` and JSON `{ success: False, error: str }` if the user is not logged in.
     - `403 Forbidden` and JSON `{ success: False, error: str }` if the user does not have access to the list.
     - `500 Internal Server Error` and JSON `{ success: False, error: str }` if a database or unexpected error occurs.
@@ -742,57 +1130,45 @@ def edit_list():
     Raises:
     - None directly, but returns error messages for authentication or database failures.
     """
-    logger.info("Edit list endpoint")
+    logger.debug("Edit list endpoint")
     
     if 'user_id' not in session:
         return jsonify({'success': False, 'error': 'User not logged in'}), 401
     
-    data = request.get_json()
-    list_id = data.get('listId')
-    list_name = data.get('listName')
-    list_other_users = data.get('otherUsers', [])
+    list_id = body.list_id
+    list_name = body.list_name
+    list_other_users = body.other_users
     
     if not list_id or not list_name:
         return jsonify({'success': False, 'error': 'Missing list ID or name'}), 400
     
-    with get_db_conn() as conn:
-        cursor = conn.cursor()
-        
+    with get_repo() as repo:
         try:
             # Check if the user has access to the list
-            access_check = cursor.execute('SELECT 1 FROM grocery_list_users WHERE list_id = ? AND user_id = ?', (list_id, session['user_id'])).fetchone()
-            if not access_check:
+            if not repo.memberships.get_role(list_id, session['user_id']):
                 return jsonify({'success': False, 'error': 'User does not have access to this list'}), 403
             
             # Retrieve old list name
-            old_name = cursor.execute('SELECT name FROM grocery_lists WHERE list_id = ?', (list_id,)).fetchone()[0]
+            old_name = repo.lists.get_name(list_id)
             
-            # Update list name in DB table
-            cursor.execute('''
-                UPDATE grocery_lists 
-                SET name = ?, update_date = CURRENT_TIMESTAMP
-                WHERE list_id = ?
-            ''', (list_name, list_id))
+            # Update list name
+            repo.lists.rename(list_id, list_name)
             
             if old_name != list_name:
                 # Notify other users of list name change
                 create_notifications_for_users(
-                    cur=cursor,
-                    user_ids=[u['user_id'] for u in list_other_users],
+                    repo=repo,
+                    user_ids=[u.user_id for u in list_other_users],
                     message=f"{session['username']} changed the name of grocery list from '{old_name}' to '{list_name}'.",
                     icon=NotificationType.EDIT.value
                 )
             
             # Retrieve old list of users of list
-            old_other_users = cursor.execute('''
-                SELECT user_id, role
-                FROM grocery_list_users
-                WHERE list_id = ? AND user_id != ?
-            ''', (list_id, session.get('user_id'))).fetchall()
+            old_other_users = repo.memberships.other_members(list_id, session.get('user_id'))
             
             # Determine which users were added and which were removed
             old_users_dict = {u[0]: u[1].lower() for u in old_other_users}
-            new_users_dict = {u.get('user_id'): u.get('role').lower() for u in list_other_users}
+            new_users_dict = {u.user_id: u.role.lower() for u in list_other_users}
 
             added_user_ids = [u_id for u_id in new_users_dict if u_id not in old_users_dict]
             removed_user_ids = [u_id for u_id in old_users_dict if u_id not in new_users_dict]
@@ -806,7 +1182,7 @@ def edit_list():
             
             # Send notifications to users that were added
             create_notifications_for_users(
-                cur=cursor,
+                repo=repo,
                 user_ids=added_user_ids,
                 message=f"{session['username']} invites you to grocery list '{list_name}'.",
                 icon=NotificationType.INVITE.value,
@@ -817,7 +1193,7 @@ def edit_list():
             
             # Send notifications to users that were removed
             create_notifications_for_users(
-                cur=cursor,
+                repo=repo,
                 user_ids=removed_user_ids,
                 message=f"{session['username']} removed you from grocery list '{list_name}'.",
                 icon=NotificationType.DELETE.value
@@ -825,33 +1201,27 @@ def edit_list():
             
             # Remove users from list
             for user_id in removed_user_ids:
-                cursor.execute('''
-                    DELETE FROM grocery_list_users
-                    WHERE list_id = ? AND user_id = ?
-                ''', (list_id, user_id))
+                repo.memberships.remove(list_id, user_id)
             
             # Send notifications to users whose roles were updated, and
             # update their roles in the database
             for user_id, (old_role, new_role) in changed_roles.items():
                 create_notification(
-                    cur=cursor,
+                    repo=repo,
                     user_id=user_id,
                     message=f"{session['username']} changed your role from '{old_role.capitalize()}' to '{new_role.capitalize()}' in grocery list '{list_name}'.",
                     icon=NotificationType.EDIT.value
                 )
-                cursor.execute('''
-                UPDATE grocery_list_users
-                SET role = ?
-                WHERE user_id = ? AND list_id = ?            
-                ''', (new_role, user_id, list_id))
+                repo.memberships.set_role(list_id, user_id, new_role)
         except Exception as e:
-            logger.error(f"Error editing list with ID {list_id}: {e}")
+            logger.error("Error editing list with ID %s: %s", list_id, e)
             return jsonify({'success': False, 'error': f'Error editing list: {e}'}), 500
     
     return jsonify({'success': True, 'message': 'Successfully updated list!'})
 
-@app.route('/list/add_item', methods=['POST'])
-def add_item():
+@bp.route('/list/add_item', methods=['POST'])
+@validate_body(AddItemRequest)
+def add_item(body: AddItemRequest):
     """
     Add an item to an existing grocery list.
 
@@ -862,13 +1232,13 @@ def add_item():
       Each item object should include:
         - `name` (str): The name of the item.  
         - `category` (str): The category of the item.
-        - 'quantity' (int): The amount of the item.
-        - 'id' (int): The item's database ID, if applicable
-            > If 'id' is None, then a new item is created in the database.
+        - `quantity` (int, optional): The amount of the item. Defaults to `1`.
+        - `id` (int | None, optional): The item's database ID, if applicable
+            > If `id` is None, then a new item is created in the database.
 
     Returns:
     - `200 OK` and JSON `{ success: True, item_id: int }` on success.
-    - `400 Bad Request` and JSON `{ success: False, error: str }` if the list name or category are missing.
+    - `400 Bad Request` and JSON `{ success: False, error: str }` if the item name or category are missing, the category does not exist, or the request body is malformed.
     - `401 Unauthorized` and JSON `{ success: False, error: str }` if the user is not logged in.
     - `403 Forbidden` and JSON `{ success: False, error: str }` if the user does not have access to the list.
     - `500 Internal Server Error` and JSON `{ success: False, error: str }` if a database or unexpected error occurs.
@@ -879,72 +1249,63 @@ def add_item():
     if 'user_id' not in session:
         return jsonify({'success': False, 'error': 'User not logged in'}), 401
     
-    data = request.get_json()
-    
-    list_id = data.get('listId')
-    item = data.get('item')
+    list_id = body.list_id
+    item = body.item
     
-    if not item.get('name') or not item.get('category'):
+    if not item.name or not item.category:
         return jsonify({'success': False, 'error': 'Item name and category are required'}), 400
     
-    with get_db_conn() as conn:
-        cursor = conn.cursor()
-        
-        access_check = cursor.execute('SELECT 1 FROM grocery_list_users WHERE list_id = ? AND user_id = ?', (list_id, session['user_id'])).fetchone()
-        if not access_check:
+    with get_repo() as repo:
+        context = repo.lists.context(list_id, session['user_id'])
+        if context is None:
             return jsonify({'success': False, 'error': 'User does not have access to this list'}), 403
         
-        list_name = cursor.execute('SELECT name FROM grocery_lists WHERE list_id = ?', (list_id,)).fetchone()[0]
-        
-        category_id = cursor.execute('SELECT category_id FROM categories WHERE name = ?', (item.get('category'),)).fetchone()
+        category_id = repo.items.category_id(item.category)
+        if category_id is None:
+            return jsonify({'success': False, 'error': 'Category does not exist'}), 400
         
-        item_id = item.get('id')
+        item_id = item.id
         if item_id is None:
             # Check if an item with the same name already exists
-            existing_item = cursor.execute(
-                'SELECT item_id FROM items WHERE name = ? AND category_id = ?',
-                (item.get('name'), category_id[0])
-            ).fetchone()
+            existing_item_id = repo.items.find(item.name, category_id)
             
-            if existing_item:
+            if existing_item_id is not None:
                 # Use the existing item_id
-                item_id = existing_item[0]
+                item_id = existing_item_id
             else:
                 # Insert new item since it doesn't exist
-                cursor.execute(
-                    'INSERT INTO items (name, category_id) VALUES (?, ?)',
-                    (item.get('name'), category_id[0])
-                )
-                item_id = cursor.execute('SELECT last_insert_rowid()').fetchone()[0]
+                item_id = repo.items.create(item.name, category_id)
         
-        # Insert item into grocery_list_items table
+        # Add item to list
         try:
-            if update_list_modified_date(cursor, list_id):
-                cursor.execute('INSERT INTO grocery_list_items (list_id, item_id, quantity) VALUES (?, ?, ?)', (list_id, item_id, item.get('quantity', 1)))
-                logger.info(f"Item {item.get('name')} added successfully")
+            if update_list_modified_date(repo, list_id):
+                repo.items.add_to_list(list_id, item_id, item.quantity)
+                logger.info("Item %s added successfully", item.name)
                 
                 # Send notification to all uusers that are a part of the list, other than the user that added the item
                 create_notifications_for_users_of_list(
-                    cur=cursor,
+                    repo=repo,
                     list_id=list_id,
                     creator_user_id=session['user_id'],
-                    message=f"{session['username']} added '{item.get('name')}' to list '{list_name}'.",
-                    icon=NotificationType.DEFAULT.value
+                    message=f"{session['username']} added '{item.name}' to list '{context.name}'.",
+                    icon=NotificationType.DEFAULT.value,
+                    member_ids=context.member_ids
                 )
                 
                 
             else:
                 return jsonify({'success': False, 'error': 'Error modifying database'})
-        except sqlite3.IntegrityError as e:
+        except IntegrityError as e:
             return jsonify({'success': False, 'error': 'Item already exists in the list'}), 400
         except Exception as e:
-            logger.error(f"Error adding item to list {list_id}: {e}")
+            logger.error("Error adding item to list %s: %s", list_id, e)
             return jsonify({'success': False, 'error': f'Error adding item: {e}'}), 500
         
     return jsonify({'success': True, 'item_id': item_id}), 200
 
-@app.route('/list/edit_item', methods=['POST'])
-def edit_item():
+@bp.route('/list/edit_item', methods=['POST'])
+@validate_body(EditItemRequest)
+def edit_item(body: EditItemRequest):
     """
     Edit an item from an existing grocery list.
 
@@ -960,14 +1321,14 @@ def edit_item():
       Each item object should include:
         - `name` (str): The name of the item.  
         - `category` (str): The category of the item.
-        - 'quantity' (int): The amount of the item.
-        - 'id' (int): The item's database ID, if applicable
+        - `quantity` (int): The amount of the item.
+        - `id` (int): The item's database ID, if applicable
     - `newItem` (dict): The new data of the item.  
       Each item object should include:
         - `name` (str): The name of the item.  
         - `category` (str): The category of the item.
-        - 'quantity' (int): The amount of the item.
-        - 'id' (int): The item's database ID, if applicable
+        - `quantity` (int): The amount of the item.
+        - `id` (int): The item's database ID, if applicable
 
     Returns:
     - `200 OK` and JSON `{ success: True, message: str }` on success.
@@ -975,6 +1336,7 @@ def edit_item():
         > No changes are detected between old and new data
         > The list ID changes
         > The category name in the newItem data does not correspond to an existing entry in the categories DB table.
+        > The request body is malformed
     - `401 Unauthorized` and JSON `{ success: False, error: str }` if the user is not logged in.
     - `403 Forbidden` and JSON `{ success: False, error: str }` if the user does not have access to the list.
     - `500 Internal Server Error` and JSON `{ success: False, error: str }` if a database or unexpected error occurs.
@@ -985,97 +1347,87 @@ def edit_item():
     if 'user_id' not in session:
         return jsonify({'success': False, 'error': 'User not logged in'}), 401
     
-    data = request.get_json()
-    
-    list_id = data.get('listId')
-    old_item_data = data.get('oldItem')
-    new_item_data = data.get('newItem')
+    list_id = body.list_id
+    old_item_data = body.old_item
+    new_item_data = body.new_item
     
     # Determine which keys are differing
-    differing_value_keys = [k for k in old_item_data if old_item_data[k] != new_item_data[k]]
+    differing_value_keys = [f.name for f in fields(ItemData) if getattr(old_item_data, f.name) != getattr(new_item_data, f.name)]
     
     if not differing_value_keys:
         return jsonify({'success': False, 'error': 'No changes detected.'}), 400
     
-    with get_db_conn() as conn:
-        cursor = conn.cursor()
-        
-        access_check = cursor.execute('SELECT 1 FROM grocery_list_users WHERE list_id = ? AND user_id = ?', (list_id, session['user_id'])).fetchone()
-        if not access_check:
+    with get_repo() as repo:
+        context = repo.lists.context(list_id, session['user_id'])
+        if context is None:
             return jsonify({'success': False, 'error': 'User does not have access to this list'}), 403
         
-        list_name = cursor.execute('SELECT name FROM grocery_lists WHERE list_id = ?', (list_id,)).fetchone()[0]
-        
         try:
             if 'id' in differing_value_keys:
                 return jsonify({'success': False, 'error': "The item ID was changed, this shouldn't be possible..."}), 400
-            elif update_list_modified_date(cursor, list_id):
+            elif update_list_modified_date(repo, list_id):
                 if 'quantity' in differing_value_keys:
                     # Update 'quantity' value for corresponding item in list
-                    cursor.execute('''
-                        UPDATE grocery_list_items
-                        SET quantity = ?
-                        WHERE list_id = ? AND item_id = ?
-                    ''', (new_item_data.get('quantity'), list_id, old_item_data.get('id')))
+                    repo.items.set_quantity(list_id, old_item_data.id, new_item_data.quantity)
                     
                     # Send notification to all other users that are a part of the list
                     create_notifications_for_users_of_list(
-                        cur=cursor,
+                        repo=repo,
                         list_id=list_id,
                         creator_user_id=session['user_id'],
-                        message=f"{session['username']} updated the quantity of '{old_item_data.get('name')}' to {new_item_data.get('quantity')}.",
-                        icon=NotificationType.EDIT.value
+                        message=f"{session['username']} updated the quantity of '{old_item_data.name}' to {new_item_data.quantity}.",
+                        icon=NotificationType.EDIT.value,
+                        member_ids=context.member_ids
                     )
                     
                     return jsonify({'success': True, 'message': 'Quantity updated successfully'})
                 
                 if 'category' in differing_value_keys or 'name' in differing_value_keys:
                     
-                    category_id = cursor.execute('SELECT category_id FROM categories WHERE name = ?', (new_item_data.get('category'),)).fetchone()[0]
+                    category_id = repo.items.category_id(new_item_data.category)
                     if category_id is None:
                         return jsonify({'success': False, 'error': 'Category does not exist'}), 400
                     
                     # Check if an item exists with the new item name and category
-                    exists = cursor.execute('SELECT item_id FROM items WHERE name = ? AND category_id = ?', (new_item_data.get('name'), category_id)).fetchone()
+                    new_item_id = repo.items.find(new_item_data.name, category_id)
 
-                    if exists is None:
+                    if new_item_id is None:
                         # If not, create new item
-                        cursor.execute('INSERT INTO items (name, category_id) VALUES (?, ?)', (new_item_data.get('name'), category_id))
-                        new_item_id = cursor.execute('SELECT last_insert_rowid()').fetchone()[0]
-                    else:
-                        # Otherwise, retrieve item id of existing item
-                        new_item_id = exists[0]
+                        new_item_id = repo.items.create(new_item_data.name, category_id)
                     
                     # Remove old item from list
-                    cursor.execute('DELETE FROM grocery_list_items WHERE list_id = ? AND item_id = ?', (list_id, old_item_data.get('id'),))
+                    repo.items.remove_from_list(list_id, old_item_data.id)
                     
                     # Add new item to list
-                    cursor.execute('INSERT INTO grocery_list_items (list_id, item_id, quantity) VALUES (?, ?, ?)', (list_id, new_item_id, new_item_data.get('quantity', 1)))
+                    repo.items.add_to_list(list_id, new_item_id, new_item_data.quantity)
                     
                     # Determine format of notification message based on what was changed
                     if 'category' in differing_value_keys and 'name' in differing_value_keys:
-                        change_desc = f"name of '{old_item_data.get('name')}' to '{new_item_data.get('name')}' and category to '{new_item_data.get('category')}'"
+                        change_desc = f"name of '{old_item_data.name}' to '{new_item_data.name}' and category to '{new_item_data.category}'"
                     elif 'category' in differing_value_keys:
-                        change_desc = f"category of '{old_item_data.get('name')}' to '{new_item_data.get('category')}'"
+                        change_desc = f"category of '{old_item_data.name}' to '{new_item_data.category}'"
                     else:
-                        change_desc = f"name of '{old_item_data.get('name')}' to '{new_item_data.get('name')}'"
+                        change_desc = f"name of '{old_item_data.name}' to '{new_item_data.name}'"
                         
                     create_notifications_for_users_of_list(
-                        cur=cursor,
+                        repo=repo,
                         list_id=list_id,
                         creator_user_id=session['user_id'],
-                        message=f"{session['username']} updated the {change_desc} in list '{list_name}'.",
-                        icon=NotificationType.EDIT.value
+                        message=f"{session['username']} updated the {change_desc} in list '{context.name}'.",
+                        icon=NotificationType.EDIT.value,
+                        member_ids=context.member_ids
                     )
             
         except Exception as e:
-            logger.error(f"Error editing item in list {list_id}: {e}")
+            logger.error("Error editing item in list %s: %s", list_id, e)
             return jsonify({'success': False, 'error': f'Error editing item: {e}'}), 500
         
     return jsonify({'success': True, 'message': 'Item updated successfully'}), 200
 
-@app.route('/list/delete_item', methods=['POST'])
-def delete_item():
+@bp.route('/list/delete_item', methods=['POST'])
+@validate_body(DeleteItemRequest)
+@idempotent
+def delete_item(body: DeleteItemRequest):
     """
     Delete an item from an existing grocery list.
 
@@ -1086,9 +1438,10 @@ def delete_item():
 
     Returns:
     - `200 OK` and JSON `{ success: True }` on success.
-    - `400 Bad Request` and JSON `{ success: False, error: str }` if no item ID is provided.
+    - `400 Bad Request` and JSON `{ success: False, error: str }` if no item ID is provided or the request body is malformed.
     - `401 Unauthorized` and JSON `{ success: False, error: str }` if the user is not logged in.
     - `403 Forbidden` and JSON `{ success: False, error: str }` if the user does not have access to the list.
+    - `404 Not Found` and JSON `{ success: False, error: str }` if the item does not exist.
     - `500 Internal Server Error` and JSON `{ success: False, error: str }` if a database or unexpected error occurs.
 
     Raises:
@@ -1097,47 +1450,48 @@ def delete_item():
     if 'user_id' not in session:
         return jsonify({'success': False, 'error': 'User not logged in'}), 401
     
-    data = request.get_json()
-    list_id = data.get('currentListId')
-    item_id = data.get('itemId')
+    list_id = body.list_id
+    item_id = body.item_id
     
-    if not item_id:
-        return jsonify({'success': False, 'error': 'Item ID is required'}), 400
-    
-    with get_db_conn() as conn:
-        cursor = conn.cursor()
-        
+    with get_repo() as repo:
         try:
-            access_check = cursor.execute('SELECT 1 FROM grocery_list_users WHERE list_id = ? AND user_id = ?', (list_id, session['user_id'])).fetchone()
-            if not access_check:
+            context = repo.lists.context(list_id, session['user_id'])
+            if context is None:
                 return jsonify({'success': False, 'error': 'User does not have access to this list'}), 403
             
-            list_name = cursor.execute('SELECT name FROM grocery_lists WHERE list_id = ?', (list_id,)).fetchone()[0]
+            # The item's name usually comes from the catalog without a query. The catalog
+            # is not refreshed here, since this unit of work sees uncommitted rows.
+            item = item_catalog.peek(item_id)
+            item_name = item[0] if item else repo.items.get_name(item_id)
+            if item_name is None:
+                return jsonify({'success': False, 'error': 'Item does not exist'}), 404
         
-            if update_list_modified_date(cursor, list_id):
-                # Delete item from grocery_list_items
-                cursor.execute('DELETE FROM grocery_list_items WHERE list_id = ? AND item_id = ?', (list_id, item_id))
+            if update_list_modified_date(repo, list_id):
+                # Delete item from list
+                repo.items.remove_from_list(list_id, item_id)
                 
                 # Create notification for other users of list
-                item_name = cursor.execute('SELECT name FROM items WHERE item_id = ?', (item_id,)).fetchone()[0]
                 create_notifications_for_users_of_list(
-                    cur=cursor,
+                    repo=repo,
                     list_id=list_id,
                     creator_user_id=session['user_id'],
-                    message=f"{session['username']} deleted '{item_name}' from list '{list_name}'.",
-                    icon=NotificationType.DELETE.value
+                    message=f"{session['username']} deleted '{item_name}' from list '{context.name}'.",
+                    icon=NotificationType.DELETE.value,
+                    member_ids=context.member_ids
                 )
                 
-                logger.info(f"Item with ID {item_id} deleted successfully")
+                logger.info("Item with ID %s deleted successfully", item_id)
                 
         except Exception as e:
-            logger.error(f"Error deleting item in list {list_id}: {e}")
+            logger.error("Error deleting item in list %s: %s", list_id, e)
             return jsonify({'success': False, 'error': f'Error deleting item: {e}'}), 500
         
     return jsonify({'success': True}), 200
 
-@app.route('/list/add_user_to_list', methods=['POST'])
-def add_user_to_list():
+@bp.route('/list/add_user_to_list', methods=['POST'])
+@validate_body(AddUserToListRequest)
+@idempotent
+def add_user_to_list(body: AddUserToListRequest):
     """
     Adds a user to an existing grocery list.
     
@@ -1149,12 +1503,14 @@ def add_user_to_list():
     Request JSON Parameters:
     - `currentListId` (int): The list's ID.
     - `username` (str): The user's username.
-    - `notif_data` (dict): A dictionary primarily for retrieving the new user's role in the list.
+    - `data` (dict | str, optional): The invitation notification's data, primarily for retrieving
+      the new user's role in the list. May be passed as the notification's JSON string.
 
     Returns:
     - `200 OK` and JSON `{ success: True, message: str }` on success.
-    - `400 Bad Request` and JSON `{ success: False, error: str }` if list ID or username are missing.
+    - `400 Bad Request` and JSON `{ success: False, error: str }` if list ID or username are missing or the request body is malformed.
     - `401 Unauthorized` and JSON `{ success: False, error: str }` if the user is not logged in.
+    - `404 Not Found` and JSON `{ success: False, error: str }` if the user does not exist.
     - `500 Internal Server Error` and JSON `{ success: False, error: str }` if a database or unexpected error occurs.
 
     Raises:
@@ -1163,31 +1519,31 @@ def add_user_to_list():
     if 'user_id' not in session:
         return jsonify({'success': False, 'error': 'User not logged in.'}), 401
     
-    data = request.get_json()
-    list_id = data.get('currentListId')
-    username = data.get('username')
-    notif_data = json.loads(data.get('data', {}))
+    list_id = body.list_id
+    username = body.username
+    notif_data = body.data or {}
     
     if not list_id or not username:
         return jsonify({'success': False, 'error': 'List ID and username are required.'}), 400
     
-    with get_db_conn() as conn:
-        cursor = conn.cursor()
-        
+    with get_repo() as repo:
         try:
-            user_id = cursor.execute('SELECT user_id FROM users WHERE username = ?', (username,)).fetchone()[0]
+            user_id = repo.users.get_id(username)
+            if user_id is None:
+                return jsonify({'success': False, 'error': f'User {username} does not exist.'}), 404
             role = notif_data.get('user_role', 'viewer').lower()
-            cursor.execute('''
-                INSERT OR IGNORE INTO grocery_list_users (list_id, user_id, role) VALUES (?, ?, ?)
-            ''', (list_id, user_id, role))
+            # Invitations to lists deleted since they were sent are ignored
+            repo.memberships.accept_invite(list_id, user_id, role)
         except Exception as e:
-            logger.error(f"Error adding user {username} to list {list_id}: {e}")
+            logger.error("Error adding user %s to list %s: %s", username, list_id, e)
             return jsonify({'success': False, 'error': f'Error adding user: {e}'}), 500
     
     return jsonify({'success': True, 'message': f'Successfully added user {username} to list with id {list_id}'}), 200
 
-@app.route('/list/manage_users_of_list', methods=['POST'])
-def manage_users_of_list():
+@bp.route('/list/manage_users_of_list', methods=['POST'])
+@validate_body(ManageUsersRequest)
+@idempotent
+def manage_users_of_list(body: ManageUsersRequest):
     """
     Updates the list of existing users attached to an existing grocery list.
 
@@ -1201,8 +1557,9 @@ def manage_users_of_list():
 
     Returns:
     - `200 OK` and JSON `{ success: True, message: str }` on success.
-    - `400 Bad Request` and JSON `{ success: False, error: str }` if list ID is missing.
+    - `400 Bad Request` and JSON `{ success: False, error: str }` if list ID is missing or the request body is malformed.
     - `401 Unauthorized` and JSON `{ success: False, error: str }` if the user is not logged in.
+    - `404 Not Found` and JSON `{ success: False, error: str }` if the list does not exist or was deleted.
     - `500 Internal Server Error` and JSON `{ success: False, error: str }` if a database or unexpected error occurs.
 
     Raises:
@@ -1211,35 +1568,26 @@ def manage_users_of_list():
     if 'user_id' not in session:
         return jsonify({'success': False, 'error': 'User not logged in.'}), 401
     
-    data = request.get_json()
-    list_id = data.get('currentListId')
-    other_users = data.get('otherUsers', [])
+    list_id = body.list_id
+    other_users = body.other_users
     
-    with get_db_conn() as conn:
-        cursor = conn.cursor()
-        
+    with get_repo() as repo:
         if not list_id:
             return jsonify({'success': False, 'error': 'List ID is required.'}), 400
         
         try:
-            list_name = cursor.execute('''
-                SELECT name
-                FROM grocery_lists
-                WHERE list_id = ?                           
-            ''', (list_id,)).fetchone()[0]
+            list_name = repo.lists.get_name(list_id)
+            if list_name is None:
+                return jsonify({'success': False, 'error': 'List does not exist.'}), 404
             
-            old_other_users = cursor.execute('''
-                SELECT user_id, role
-                FROM grocery_list_users
-                WHERE list_id = ? AND user_id != ?
-            ''', (list_id, session.get('user_id'))).fetchall()
+            old_other_users = repo.memberships.other_members(list_id, session.get('user_id'))
             
             # `old_other_users` is list of (user_id, role) tuples
-            # `other_users` is list of {'user_id': ..., 'username': ..., 'role': ...} dicts
+            # `other_users` is list of `ListUser` objects
             
             # Determiine which users were added/removed, and which users had roles changed
             old_users_dict = {u[0]: u[1].lower() for u in old_other_users}
-            new_users_dict = {u['user_id']: u['role'].lower() for u in other_users}
+            new_users_dict = {u.user_id: u.role.lower() for u in other_users}
 
             added_user_ids = [u_id for u_id in new_users_dict if u_id not in old_users_dict]
             removed_user_ids = [u_id for u_id in old_users_dict if u_id not in new_users_dict]
@@ -1251,7 +1599,7 @@ def manage_users_of_list():
             
             # Send notifications to users added to list
             create_notifications_for_users(
-                cur=cursor,
+                repo=repo,
                 user_ids=added_user_ids,
                 message=f"{session['username']} invites you to grocery list '{list_name}'.",
                 icon=NotificationType.INVITE.value,
@@ -1262,7 +1610,7 @@ def manage_users_of_list():
             
             # Send notifications to users removed from list
             create_notifications_for_users(
-                cur=cursor,
+                repo=repo,
                 user_ids=removed_user_ids,
                 message=f"{session['username']} removed you from grocery list '{list_name}'.",
                 icon=NotificationType.DELETE.value
@@ -1270,31 +1618,24 @@ def manage_users_of_list():
             
             # Delete removed users from list
             for user_id in removed_user_ids:
-                cursor.execute('''
-                    DELETE FROM grocery_list_users
-                    WHERE list_id = ? AND user_id = ?
-                ''', (list_id, user_id))
+                repo.memberships.remove(list_id, user_id)
             
             # Handle any users whose roles were changed
             for user_id, (old_role, new_role) in changed_roles.items():
                 create_notification(
-                    cur=cursor,
+                    repo=repo,
                     user_id=user_id,
                     message=f"{session['username']} changed your role from '{old_role.capitalize()}' to '{new_role.capitalize()}' in grocery list '{list_name}'.",
                     icon=NotificationType.EDIT.value
                 )
-                cursor.execute('''
-                UPDATE grocery_list_users
-                SET role = ?
-                WHERE user_id = ? AND list_id = ?            
-                ''', (new_role, user_id, list_id))
+                repo.memberships.set_role(list_id, user_id, new_role)
         except Exception as e:
-            logger.error(f"Error managing users in list {list_id}: {e}")
+            logger.error("Error managing users in list %s: %s", list_id, e)
             return jsonify({'success': False, 'error': f'Error managing users: {e}'}), 500
     
     return jsonify({'success': True, 'message': f'Successfully added users to list with id {list_id}'}), 200
 
-@app.route('/list/get_item_suggestions', methods=['GET'])
+@bp.route('/list/get_item_suggestions', methods=['GET'])
 def get_item_suggestions():
     """
     Retrieves suggestions of existing items based on an input query.
@@ -1313,24 +1654,12 @@ def get_item_suggestions():
 
     query = request.args.get('query', '').lower()
     
-    with get_db_conn() as conn:
-        cursor = conn.cursor()
-        
-        items = cursor.execute(
-            '''
-            SELECT item_id, name, category_id
-            FROM items
-            WHERE LOWER(name) LIKE ? 
-            AND LOWER(name) != ?
-            ''',
-            (f'%{query}%', query)
-        ).fetchall()
-        
-        items_list = [{'item_id': item[0], 'name': item[1], 'category_id': item[2]} for item in items]
-        logger.info(f"Item suggestions for query '{query}': {items_list}")
+    with get_repo(readonly=True) as repo:
+        items_list = load_item_suggestions(repo, query)
+    
     return jsonify({'success': True, 'items': items_list}), 200
 
-@app.route('/list/get_user_suggestions', methods=['GET'])
+@bp.route('/list/get_user_suggestions', methods=['GET'])
 def get_user_suggestions():
     """
     Retrieves suggestions of existing usernames based on an input query.
@@ -1349,41 +1678,217 @@ def get_user_suggestions():
 
     query = request.args.get('query', '').lower()
     
-    with get_db_conn() as conn:
-        cursor = conn.cursor()
-        users = cursor.execute(
-            '''
-            SELECT user_id, username
-            FROM users
-            WHERE username LIKE ?              -- starts with query
-            AND username != ? COLLATE NOCASE   -- exclude matches
-            ''',
-            (f'{query}%', session['username'])
-        ).fetchall()
-        
-        users_list = [{'user_id': user[0], 'username': user[1], 'role': "Viewer"} for user in users]
-        logger.info(f"User suggestions for query '{query}': {users_list}")
+    with get_repo(readonly=True) as repo:
+        users_list = load_user_suggestions(repo, query, session['username'])
         
     return jsonify({'success': True, 'users': users_list})
 
+@bp.route('/readyz', methods=['GET'])
+def readyz():
+    """
+    Report whether this worker is ready to serve traffic.
+
+    Intended for load balancer and orchestrator readiness probes. The worker is 
+    ready once the database is reachable, fully migrated, and the item catalog is loaded.
+
+    ---
+    Returns:
+    - `200 OK` and JSON `{ ready: True, pid: int }` if ready.
+    - `503 Service Unavailable` and JSON `{ ready: False, error: str }` otherwise.
+    """
+    try:
+        with get_repo(readonly=True) as repo:
+            pending_migrations = repo.pending_migrations()
+            item_catalog.ensure_loaded(repo.items)
+    except Exception as e:
+        logger.error("Readiness check failed: %s", e)
+        return jsonify({'ready': False, 'error': f'Database unavailable: {e}'}), 503
+    
+    if pending_migrations:
+        return jsonify({'ready': False, 'error': 'Database migrations pending'}), 503
+    
+    return jsonify({'ready': True, 'pid': os.getpid()}), 200
+
+@bp.route('/metrics', methods=['GET'])
+def get_metrics():
+    """
+    Expose request, SQL and item catalog metrics in the Prometheus text format.
+
+    Metrics cover only the worker process that serves the request.
+
+    ---
+    Returns:
+    - `200 OK` and the metrics as `text/plain; version=0.0.4`.
+    - `404 Not Found` if metrics are disabled.
+    """
+    if not current_app.config['METRICS_ENABLED']:
+        return jsonify({'success': False, 'error': 'Metrics are disabled'}), 404
+    
+    return Response(render_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+@bp.route('/debug/slow_queries', methods=['GET'])
+def get_slow_queries():
+    """
+    Report the slowest SQL statements captured by the query profiler in this worker.
+
+    Each statement includes its `EXPLAIN QUERY PLAN` steps, with `full_scan` set when 
+    a table is read without an index and `temp_btree` set when sorting or grouping 
+    needs a temporary B-tree. Bound parameters are reported by type only.
+
+    ---
+    Query Parameters:
+    - `limit` (int, optional): Maximum number of statements to return. Defaults to `20`.
+    - `order` (str, optional): `total_seconds`, `max_seconds` or `count`. Defaults to `total_seconds`.
 
-def update_list_modified_date(cur, list_id):
-    # Update modified date in grocery_lists table in database
+    Returns:
+    - `200 OK` and JSON `{ success: True, threshold_ms: float, queries: [...] }` on success.
+    - `400 Bad Request` and JSON `{ success: False, error: str }` if `order` is invalid.
+    - `404 Not Found` and JSON `{ success: False, error: str }` if the profiler is disabled.
+    """
+    if not current_app.config['QUERY_PROFILER']:
+        return jsonify({'success': False, 'error': 'Query profiler is disabled'}), 404
+    
+    limit = request.args.get('limit', 20, type=int)
+    order = request.args.get('order', 'total_seconds')
+    
     try:
-        cur.execute('''
-            UPDATE grocery_lists 
-            SET update_date = CURRENT_TIMESTAMP 
-            WHERE list_id = ?
-        ''', (list_id,))
+        queries = query_profiler.report(limit=limit, order_by=order)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    
+    return jsonify({'success': True, 'threshold_ms': query_profiler.threshold * 1000, 'queries': queries})
+
+
+# ------------------------------------------------------------------------
+#       READ HANDLERS
+# ------------------------------------------------------------------------
+# Data access behind the read-heavy routes, kept free of Flask request and 
+# session state so the same code serves both the WSGI views above and the 
+# async handlers in `asgi.py`. Each takes a read-only unit of work from `get_repo()`.
+
+def load_notifications(repo, user_id, after_id=None):
+    """
+    Return a user's notifications as a list of dicts, optionally only those newer than `after_id`.
+    """
+    notifications = get_user_notifications(repo, user_id, after_id=after_id)
+    
+    # Construct list of dicts of notifications
+    return [{
+        'id': n[0],
+        'icon': n[1],
+        'message': n[2],
+        'actionable': bool(n[3]),
+        'action_type': n[4],
+        'requested_list_id': n[5],
+        'unread': bool(n[6]),
+        'created_at': n[7],
+        'data': n[8]
+    } for n in notifications]
+
+def load_list_data(repo, list_id, user_id):
+    """
+    Return the `(payload, status)` response of `/list/get_list_data` for a user.
+    """
+    try:
+        # Get user's role in list
+        user_role = repo.memberships.get_role(list_id, user_id)
+        
+        if not user_role:
+            return {'success': False, 'error': 'You do not have access to this list!'}, 403
+        
+        # Get all (item ID, item quantity) pairs for specified list.
+        # Item and category names are resolved from the in-process catalog.
+        list_items = repo.items.on_list(list_id)
+        items_list = [i for i in build_items_lists(repo, list_items) if i is not None]
+
+        list_info = repo.lists.get_info(list_id)
+        list_name = list_info[0] if list_info else ''
+        modified = list_info[1] if list_info else None
         
-        logger.info("List modification date updated successfully.")
+        # Get other users and their roles of the specified list
+        list_users = repo.memberships.other_members_of_lists([list_id], user_id)
     except Exception as e:
+        logger.error("Error retrieving list data: %s", e)
+        return {'success': False, 'error': f'Error retrieving list data: {e}'}, 500
+
+    other_users = [{'user_id': user[1], 'username': user[2], 'role': user[3].capitalize()} for user in list_users]
+    
+    return {'success': True, 'userRole': user_role.capitalize(), 'items': items_list, 'listName': list_name, 'modified': modified, 'otherUsers': other_users}, 200
+
+def load_item_suggestions(repo, query):
+    """
+    Return items whose name contains the lowercase `query`, as a list of dicts.
+    """
+    # Matched against the in-process catalog instead of scanning `items` with LIKE
+    items = item_catalog.search(repo.items, query)
+    
+    items_list = [{'item_id': item[0], 'name': item[1], 'category_id': item[2]} for item in items]
+    logger.debug("Item suggestions for query %r: %d items", query, len(items_list))
+    return items_list
+
+def load_user_suggestions(repo, query, username):
+    """
+    Return users whose name starts with `query`, excluding `username`, as a list of dicts.
+    """
+    users = repo.users.search(query, username)
+    
+    users_list = [{'user_id': user[0], 'username': user[1], 'role': "Viewer"} for user in users]
+    logger.debug("User suggestions for query %r: %d users", query, len(users_list))
+    return users_list
+
+
+# ------------------------------------------------------------------------
+#       HELPERS
+# ------------------------------------------------------------------------
+
+def build_items_lists(repo, list_items):
+    """
+    Build item dicts for `(item_id, quantity)` rows using the in-process item catalog.
+
+    Returns one entry per row, in order. Entries are None for items without a known 
+    category, which would have been dropped by a join on `categories`.
+    """
+    entries = item_catalog.get_many(repo.items, [i[0] for i in list_items])
+    
+    items_list = []
+    for (item_id, quantity), entry in zip(list_items, entries):
+        category = item_catalog.category_name(repo.items, entry[1]) if entry else None
+        if category is None:
+            items_list.append(None)
+        else:
+            items_list.append({'name': entry[0], 'category': category, 'quantity': quantity, 'item_id': item_id})
+    
+    return items_list
+
+def parse_id_list(value):
+    """
+    Parse a comma-separated string of IDs, such as a `list_ids` query parameter.
+
+    Returns None if `value` is empty, False if it is malformed, and otherwise a 
+    list of unique integer IDs in their original order.
+    """
+    if not value:
+        return None
+    
+    try:
+        ids = [int(part) for part in value.split(',') if part.strip()]
+    except ValueError:
         return False
     
-    return True
+    return list(dict.fromkeys(ids))
 
-def get_db_conn():
-    return sqlite3.connect('grocery.db')
+def update_list_modified_date(repo, list_id):
+    # Update modified date of the list, and bump the list version used to 
+    # validate cached views of the list
+    try:
+        repo.lists.touch(list_id)
+        
+        logger.debug("List modification date updated successfully.")
+    except Exception as e:
+        return False
+    
+    return True
 
 if __name__ == '__main__':
-    app.run(debug=True)
\ No newline at end of file
+    # Development server only; use `serve.py` in production
+    create_app().run(debug=True)
\ No newline at end of file
@@ -0,0 +1,309 @@
+"""
+ASGI entry point that serves I/O-bound read endpoints asynchronously.
+
+    uvicorn asgi:app --workers 4
+    python serve.py --server uvicorn --workers 4
+
+The following routes are handled natively on the event loop:
+    - GET /get_notifications         (also supports long-polling, see `get_notifications`)
+    - GET /list/get_list_data
+    - GET /list/get_item_suggestions
+    - GET /list/get_user_suggestions
+
+Their database work runs on a small dedicated thread pool (`GROCERY_DB_THREADS`),
+so a request waiting on a SQLite lock, or an idle long-poll connection, holds a
+coroutine instead of an OS thread. All other routes are forwarded to the Flask app
+through asgiref's WSGI adapter, unchanged, running on a pool of `GROCERY_THREADS` threads.
+"""
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import ContextVar
+import os
+import time
+from urllib.parse import parse_qs
+
+from asgiref.sync import SyncToAsync
+from asgiref.wsgi import WsgiToAsgi, WsgiToAsgiInstance
+from itsdangerous import BadSignature
+
+from app import (
+    create_app,
+    load_item_suggestions,
+    load_list_data,
+    load_notifications,
+    load_user_suggestions
+)
+from catalog import item_catalog
+from compression import compress_body
+from logger import logger
+from metrics import request_finished, request_started, reset_sql_stats, sql_stats
+from repository import get_repo
+
+
+# ----------------------------------------------
+#   CONSTANTS
+# ----------------------------------------------
+
+# Threads available for database work in each process
+DB_THREADS = int(os.getenv('GROCERY_DB_THREADS', 4))
+
+# Threads running the forwarded Flask routes in each process
+WSGI_THREADS = int(os.getenv('GROCERY_THREADS', 4))
+
+# Longest time (seconds) a notifications long-poll request may wait
+LONG_POLL_MAX_WAIT = 30.0
+
+# Seconds between database checks while a long-poll request waits
+LONG_POLL_INTERVAL = 1.0
+
+
+# ----------------------------------------------
+#    DATABASE EXECUTOR
+# ----------------------------------------------
+
+db_executor = ThreadPoolExecutor(max_workers=DB_THREADS, thread_name_prefix='db')
+
+wsgi_executor = ThreadPoolExecutor(max_workers=WSGI_THREADS, thread_name_prefix='wsgi')
+
+# SQL statement count and seconds of the request handled by the current task
+request_sql_totals = ContextVar('request_sql_totals', default=None)
+
+async def run_db(fn, *args):
+    """
+    Run `fn(repo, *args)` in its own read-only unit of work on the database thread pool.
+
+    Args:
+        fn (Callable): A read handler from `app.py` taking a `UnitOfWork` as its first argument.
+        *args: Remaining arguments for `fn`.
+
+    Returns:
+        The return value of `fn`.
+    """
+    totals = request_sql_totals.get()
+
+    def work():
+        reset_sql_stats()
+        try:
+            with get_repo(readonly=True) as repo:
+                return fn(repo, *args)
+        finally:
+            if totals is not None:
+                count, seconds = sql_stats()
+                totals[0] += count
+                totals[1] += seconds
+
+    return await asyncio.get_running_loop().run_in_executor(db_executor, work)
+
+
+# ----------------------------------------------
+#    HANDLERS
+# ----------------------------------------------
+
+class AsyncRequest:
+    """
+    Minimal view of an ASGI HTTP request: query arguments and the decoded Flask session.
+    """
+
+    def __init__(self, scope: dict, session: dict):
+        self.scope = scope
+        self.session = session
+        self.args = {k: v[-1] for k, v in parse_qs(scope.get('query_string', b'').decode('latin-1')).items()}
+
+    def arg(self, name: str, default=None, type=str):
+        """
+        Return a query argument converted with `type`, or `default` if it is missing or invalid.
+        """
+        try:
+            return type(self.args[name])
+        except (KeyError, ValueError):
+            return default
+
+async def get_notifications(request: AsyncRequest) -> tuple[int, dict]:
+    """
+    Async variant of `/get_notifications`.
+
+    With the optional query parameters `after_id` (int) and `wait` (seconds, at most
+    `LONG_POLL_MAX_WAIT`), the request long-polls: it returns as soon as notifications
+    newer than `after_id` exist, or with an empty list once `wait` seconds have passed.
+    """
+    if 'user_id' not in request.session:
+        return 401, {'success': False, 'error': 'User not logged in'}
+
+    user_id = request.session['user_id']
+    after_id = request.arg('after_id', type=int)
+    wait = min(max(request.arg('wait', 0.0, type=float), 0.0), LONG_POLL_MAX_WAIT)
+
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + wait
+    while True:
+        notifications_list = await run_db(load_notifications, user_id, after_id)
+        if notifications_list or after_id is None or loop.time() >= deadline:
+            break
+        await asyncio.sleep(min(LONG_POLL_INTERVAL, deadline - loop.time()))
+
+    return 200, {'success': True, 'notifications': notifications_list}
+
+async def get_list_data(request: AsyncRequest) -> tuple[int, dict]:
+    """
+    Async variant of `/list/get_list_data`.
+    """
+    if 'user_id' not in request.session:
+        return 401, {'success': False, 'error': 'User not logged in'}
+
+    list_id = request.arg('list_id', type=int)
+    if list_id is None:
+        return 400, {'success': False, 'error': 'list_id parameter is required'}
+
+    payload, status = await run_db(load_list_data, list_id, request.session['user_id'])
+    return status, payload
+
+async def get_item_suggestions(request: AsyncRequest) -> tuple[int, dict]:
+    """
+    Async variant of `/list/get_item_suggestions`.
+    """
+    query = request.arg('query', '').lower()
+    items_list = await run_db(load_item_suggestions, query)
+    return 200, {'success': True, 'items': items_list}
+
+async def get_user_suggestions(request: AsyncRequest) -> tuple[int, dict]:
+    """
+    Async variant of `/list/get_user_suggestions`.
+    """
+    if 'username' not in request.session:
+        return 401, {'success': False, 'error': 'User not logged in'}
+
+    query = request.arg('query', '').lower()
+    users_list = await run_db(load_user_suggestions, query, request.session['username'])
+    return 200, {'success': True, 'users': users_list}
+
+# Routes served natively, by path. Only GET requests are handled here.
+ASYNC_ROUTES = {
+    '/get_notifications': get_notifications,
+    '/list/get_list_data': get_list_data,
+    '/list/get_item_suggestions': get_item_suggestions,
+    '/list/get_user_suggestions': get_user_suggestions,
+}
+
+
+# ----------------------------------------------
+#    ASGI APPLICATION
+# ----------------------------------------------
+
+class WsgiInstance(WsgiToAsgiInstance):
+    """
+    asgiref's per-request WSGI adapter, running the Flask app on `wsgi_executor`.
+
+    The stock adapter runs every request on one shared thread-sensitive thread, which
+    serializes the forwarded routes and, under uvicorn, fails every request after the
+    first on a keep-alive connection ("CurrentThreadExecutor already quit or is broken").
+    """
+
+    run_wsgi_app = SyncToAsync(
+        WsgiToAsgiInstance.__dict__['run_wsgi_app'].func,
+        thread_sensitive=False,
+        executor=wsgi_executor
+    )
+
+class WsgiAdapter(WsgiToAsgi):
+    """
+    `WsgiToAsgi` creating a `WsgiInstance` per request.
+    """
+
+    async def __call__(self, scope, receive, send):
+        await WsgiInstance(self.wsgi_application, self.duplicate_header_limit)(scope, receive, send)
+
+class AsyncApp:
+    """
+    ASGI application dispatching to the async handlers or, for all other routes, the Flask app.
+    """
+
+    def __init__(self, flask_app):
+        self.flask_app = flask_app
+        self.wsgi = WsgiAdapter(flask_app)
+        self.session_serializer = flask_app.session_interface.get_signing_serializer(flask_app)
+        self.session_max_age = int(flask_app.permanent_session_lifetime.total_seconds())
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+            return
+
+        handler = ASYNC_ROUTES.get(scope['path']) if scope['type'] == 'http' and scope['method'] == 'GET' else None
+        if handler is None:
+            await self.wsgi(scope, receive, send)
+            return
+
+        headers = {k.decode('latin-1').lower(): v.decode('latin-1') for k, v in scope['headers']}
+        request = AsyncRequest(scope, self._load_session(headers))
+
+        start = time.perf_counter()
+        request_started()
+        totals = [0, 0.0]
+        request_sql_totals.set(totals)
+        status = 500
+        try:
+            try:
+                status, payload = await handler(request)
+            except Exception as e:
+                logger.error("Error handling %s: %s", scope['path'], e)
+                status, payload = 500, {'success': False, 'error': f'Error handling request: {e}'}
+
+            await self._send_json(send, headers, status, payload)
+        finally:
+            request_finished(scope['path'], 'GET', status, time.perf_counter() - start, totals[0], totals[1])
+
+    def _load_session(self, headers: dict) -> dict:
+        # Decodes the Flask session cookie, mirroring SecureCookieSessionInterface
+        cookie_name = self.flask_app.config['SESSION_COOKIE_NAME']
+        for cookie in headers.get('cookie', '').split(';'):
+            name, _, value = cookie.strip().partition('=')
+            if name == cookie_name and value:
+                try:
+                    return self.session_serializer.loads(value, max_age=self.session_max_age)
+                except BadSignature:
+                    return {}
+        return {}
+
+    async def _send_json(self, send, headers: dict, status: int, payload: dict):
+        body, encoding = compress_body(
+            self.flask_app.json.dumps(payload).encode('utf-8'),
+            'application/json',
+            headers.get('accept-encoding'),
+            self.flask_app.config
+        )
+        response_headers = [
+            (b'content-type', b'application/json'),
+            (b'content-length', str(len(body)).encode('latin-1')),
+            (b'vary', b'Accept-Encoding'),
+        ]
+        if encoding is not None:
+            response_headers.append((b'content-encoding', encoding.encode('latin-1')))
+
+        # Matches flask-cors with `supports_credentials=True`
+        origin = headers.get('origin')
+        if origin:
+            response_headers += [
+                (b'access-control-allow-origin', origin.encode('latin-1')),
+                (b'access-control-allow-credentials', b'true'),
+                (b'vary', b'Origin'),
+            ]
+
+        await send({'type': 'http.response.start', 'status': status, 'headers': response_headers})
+        await send({'type': 'http.response.body', 'body': body})
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                # Warm up the item catalog before accepting requests
+                await run_db(lambda repo: item_catalog.ensure_loaded(repo.items))
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                db_executor.shutdown(wait=True)
+                wsgi_executor.shutdown(wait=True)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+
+app = AsyncApp(create_app())
@@ -0,0 +1,557 @@
+"""
+Module for taking online backups of the application database, and restoring them.
+
+Copying `grocery.db` while the app runs can capture a torn file (or miss the WAL),
+and stopping the app for a full copy takes it down. Backups instead go through
+SQLite's online backup API:
+    1. A connection opens a read transaction on the database, pinning one snapshot.
+       In WAL mode readers never block writers, so requests keep committing, and the
+       copy stays consistent (the backup is not restarted by their writes).
+    2. The snapshot is copied `pages_per_step` pages at a time into a new file, with a
+       pause after each step, so the copy never monopolises the disk.
+    3. The copy is switched out of WAL mode, checked with `PRAGMA quick_check`,
+       optionally gzipped, and only then renamed to its final name. Unfinished
+       snapshots never carry a snapshot's name.
+
+Snapshots are named `grocery-YYYYMMDD-HHMMSS.db` (or `.db.gz`, UTC) in `BACKUP_DIR`.
+When notifications are kept in their own database (`db.NOTIFICATIONS_DB_PATH`), it is
+copied in the same read transaction to `grocery-YYYYMMDD-HHMMSS.notifications.db`, and
+restored along with the snapshot. So are list partitions (`db.LIST_PARTITIONS`), to
+`grocery-YYYYMMDD-HHMMSS.p0.db`, `.p1.db`, ...
+The `BackupScheduler` thread takes one every `interval` seconds and keeps the
+newest `keep`. Several worker processes may run it: a lock file and the age of the
+newest snapshot keep them from taking duplicates.
+
+Usage (from the `server` directory):
+    python backup.py create
+    python backup.py list
+    python backup.py restore backups/grocery-20250101-030000.db.gz
+
+Stop the server before restoring; running workers keep in-process caches (such as
+the item catalog) of the data being replaced.
+"""
+
+import argparse
+from contextlib import ExitStack, contextmanager
+from datetime import datetime, timezone
+import gzip
+import os
+from pathlib import Path
+import re
+import shutil
+import sqlite3
+import sys
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - not available on Windows
+    fcntl = None
+
+import db
+from logger import get_logger
+from metrics import metrics
+
+logger = get_logger('backup')
+
+
+# ----------------------------------------------
+#   CONSTANTS
+# ----------------------------------------------
+
+# Directory holding the snapshots
+BACKUP_DIR = os.getenv('GROCERY_BACKUP_DIR', 'backups')
+
+# Seconds between scheduled snapshots; 0 disables the scheduler
+BACKUP_INTERVAL = float(os.getenv('GROCERY_BACKUP_INTERVAL_MINUTES', 0)) * 60
+
+# Scheduled snapshots kept; older ones are deleted after each new snapshot
+BACKUP_KEEP = int(os.getenv('GROCERY_BACKUP_KEEP', 7))
+
+# Whether snapshots are gzipped
+BACKUP_COMPRESS = os.getenv('GROCERY_BACKUP_COMPRESS', '1') != '0'
+
+# Database pages copied per backup step (4 MiB with the default 4 KiB pages)
+BACKUP_PAGES_PER_STEP = int(os.getenv('GROCERY_BACKUP_PAGES_PER_STEP', 1024))
+
+# Seconds to sleep between backup steps
+BACKUP_STEP_PAUSE = float(os.getenv('GROCERY_BACKUP_STEP_PAUSE_MS', 10)) / 1000
+
+# Prefix of scheduled snapshots, which retention applies to
+SNAPSHOT_PREFIX = 'grocery'
+
+# Prefix of the copies of the database taken before a restore, which are never deleted
+PRE_RESTORE_PREFIX = 'pre-restore'
+
+# Marks the copy of the separate notifications database belonging to a snapshot
+NOTIFICATIONS_MARKER = '.notifications'
+
+# Marks the copy of a list partition belonging to a snapshot, like the partition files themselves
+PARTITION_MARKER = re.compile(r'\.p\d+$')
+
+# Upper bounds (seconds) of the backup duration histogram buckets
+BACKUP_BUCKETS = (1.0, 5.0, 15.0, 30.0, 60.0, 120.0, 300.0, 600.0, 1800.0)
+
+# Bytes read and written at a time when compressing or decompressing snapshots
+COPY_CHUNK_SIZE = 1 << 20
+
+
+# ----------------------------------------------
+#    EXCEPTIONS
+# ----------------------------------------------
+
+class BackupError(Exception):
+    """
+    Raised when a snapshot cannot be taken, fails its integrity check, or cannot be restored.
+    """
+
+
+# ----------------------------------------------
+#    FUNCTIONS
+# ----------------------------------------------
+
+def create_snapshot(
+    directory: str = BACKUP_DIR,
+    prefix: str = SNAPSHOT_PREFIX,
+    compress: bool = BACKUP_COMPRESS,
+    pages_per_step: int = BACKUP_PAGES_PER_STEP,
+    step_pause: float = BACKUP_STEP_PAUSE,
+    stop: threading.Event | None = None
+) -> Path:
+    """
+    Take a consistent snapshot of the application database while it stays in use.
+
+    Args:
+        directory (str, optional): Directory to write the snapshot to. Created if missing.
+        prefix (str, optional): Start of the snapshot's file name.
+        compress (bool, optional): Whether to gzip the snapshot.
+        pages_per_step (int, optional): Pages copied before each pause.
+        step_pause (float, optional): Seconds to sleep between steps.
+        stop (threading.Event, optional): Aborts the backup when set.
+
+    Returns:
+        Path: The snapshot file of the application database.
+
+    Raises:
+        BackupError: If the backup was aborted or the copy failed its integrity check.
+        sqlite3.Error: If the database could not be read or the copy written.
+    """
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    path = _snapshot_path(directory, prefix, compress)
+
+    # Final file of each attached database's snapshot
+    files = {'main': path}
+    if db.NOTIFICATIONS_DB_PATH:
+        files[db.NOTIFICATIONS_SCHEMA] = notifications_snapshot(path)
+    for partition in range(db.LIST_PARTITIONS):
+        files[f'partition{partition}'] = partition_snapshot(path, partition)
+    copies = {schema: directory / (file.name.removesuffix('.gz') + '.tmp') for schema, file in files.items()}
+    partials = {schema: file.with_name(file.name + '.partial') for schema, file in files.items()}
+
+    start = time.perf_counter()
+    try:
+        pages = _copy_databases(copies, pages_per_step, step_pause, stop)
+        for schema, copy in copies.items():
+            _verify(copy)
+            if compress:
+                with open(copy, 'rb') as source, gzip.open(partials[schema], 'wb', compresslevel=6) as target:
+                    shutil.copyfileobj(source, target, COPY_CHUNK_SIZE)
+                copy.unlink()
+            else:
+                copy.replace(partials[schema])
+
+        # The companion copies first, so a listed snapshot is always complete
+        for schema in reversed(files):
+            partials[schema].replace(files[schema])
+    except BaseException:
+        metrics.inc('grocery_backups_total', (('result', 'error'),))
+        for leftover in (*copies.values(), *partials.values()):
+            leftover.unlink(missing_ok=True)
+        raise
+
+    seconds = time.perf_counter() - start
+    metrics.inc('grocery_backups_total', (('result', 'ok'),))
+    metrics.observe('grocery_backup_seconds', (), seconds, BACKUP_BUCKETS)
+    logger.info("Backed up %s pages to %s (%s bytes) in %.1fs", pages, path, path.stat().st_size, seconds)
+    return path
+
+def list_snapshots(directory: str = BACKUP_DIR, prefix: str = SNAPSHOT_PREFIX) -> list[Path]:
+    """
+    Return the finished snapshots in `directory` whose name starts with `prefix`, newest first.
+    """
+    directory = Path(directory)
+    if not directory.is_dir():
+        return []
+
+    snapshots = [
+        path for pattern in (f'{prefix}-*.db', f'{prefix}-*.db.gz')
+        for path in directory.glob(pattern)
+        if not _is_companion(path)
+    ]
+    # Timestamped names sort chronologically, whether compressed or not
+    return sorted(snapshots, key=lambda path: path.name.removesuffix('.gz').removesuffix('.db'), reverse=True)
+
+def prune_snapshots(directory: str = BACKUP_DIR, keep: int = BACKUP_KEEP, prefix: str = SNAPSHOT_PREFIX) -> list[Path]:
+    """
+    Delete all but the newest `keep` snapshots whose name starts with `prefix`.
+
+    Returns:
+        list[Path]: The deleted snapshots.
+    """
+    removed = list_snapshots(directory, prefix)[max(keep, 1):]
+    for path in removed:
+        path.unlink(missing_ok=True)
+        notifications_snapshot(path).unlink(missing_ok=True)
+        for partition in range(db.MAX_LIST_PARTITIONS):
+            partition_snapshot(path, partition).unlink(missing_ok=True)
+        logger.info("Deleted old snapshot %s", path)
+    return removed
+
+def notifications_snapshot(snapshot: Path) -> Path:
+    """
+    Return the path of the copy of the separate notifications database belonging to a snapshot.
+    """
+    return _companion(snapshot, NOTIFICATIONS_MARKER)
+
+def partition_snapshot(snapshot: Path, partition: int) -> Path:
+    """
+    Return the path of the copy of list partition `partition` belonging to a snapshot.
+    """
+    return _companion(snapshot, f'.p{partition}')
+
+def _companion(snapshot: Path, marker: str) -> Path:
+    stem = snapshot.name.removesuffix('.gz').removesuffix('.db')
+    return snapshot.with_name(stem + marker + snapshot.name[len(stem):])
+
+def _is_companion(path: Path) -> bool:
+    stem = path.name.removesuffix('.gz').removesuffix('.db')
+    return stem.endswith(NOTIFICATIONS_MARKER) or PARTITION_MARKER.search(stem) is not None
+
+def restore_snapshot(snapshot: str, keep_current: bool = True, directory: str = BACKUP_DIR) -> Path | None:
+    """
+    Replace the contents of the application database with a snapshot.
+
+    The snapshot is checked first, and written through the backup API rather than by
+    replacing the file, so the database's WAL and shared-memory files stay consistent.
+    With a separate notifications database or list partitions, the snapshot's copies
+    of them are restored too.
+
+    Args:
+        snapshot (str): Path to a `.db` or `.db.gz` snapshot.
+        keep_current (bool, optional): Whether to snapshot the current database into
+            `directory` first, as `pre-restore-*.db.gz`. Defaults to True.
+        directory (str, optional): Directory for the copy of the current database.
+
+    Returns:
+        Path | None: The copy of the current database, if one was taken.
+
+    Raises:
+        BackupError: If the snapshot is missing, fails its integrity check, or its list
+            partitions do not match the configured ones.
+    """
+    snapshot = Path(snapshot)
+    if not snapshot.is_file():
+        raise BackupError(f"Snapshot {snapshot} does not exist")
+
+    snapshots = {'main': snapshot}
+    if notifications_snapshot(snapshot).is_file():
+        if db.NOTIFICATIONS_DB_PATH:
+            snapshots['notifications'] = notifications_snapshot(snapshot)
+        else:
+            logger.warning("Not restoring %s: no separate notifications database is configured", notifications_snapshot(snapshot))
+    elif db.NOTIFICATIONS_DB_PATH:
+        logger.warning("%s has no copy of the notifications database; keeping the current notifications", snapshot)
+    for partition in range(db.LIST_PARTITIONS):
+        if not partition_snapshot(snapshot, partition).is_file():
+            raise BackupError(f"{snapshot} has no copy of list partition {partition}")
+        snapshots[f'partition{partition}'] = partition_snapshot(snapshot, partition)
+    if not db.LIST_PARTITIONS and partition_snapshot(snapshot, 0).is_file():
+        raise BackupError(f"{snapshot} has partitioned lists, but no list partitions are configured")
+
+    with ExitStack() as stack:
+        sources = {database: stack.enter_context(_opened_snapshot(path)) for database, path in snapshots.items()}
+        for path in sources.values():
+            _verify(path)
+
+        current = None
+        if keep_current and os.path.exists(db.DB_PATH):
+            current = create_snapshot(directory, PRE_RESTORE_PREFIX, compress=True, step_pause=0)
+
+        for database, path in sources.items():
+            source = sqlite3.connect(path)
+            target = db.connect(database=database)
+            try:
+                source.backup(target)
+                # Snapshots are stored out of WAL mode
+                db.enable_wal(target)
+                target.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+            finally:
+                target.close()
+                source.close()
+            logger.info("Restored %s into %s", snapshots[database], db.database_path(database))
+
+    return current
+
+def _copy_databases(copies: dict[str, Path], pages_per_step: int, step_pause: float, stop: threading.Event | None) -> int:
+    """
+    Copy each attached database (`'main'`, `db.NOTIFICATIONS_SCHEMA` or `'partition{i}'`)
+    to its path, and return the pages copied.
+    """
+    source = db.connect(shared=True)
+    copied = 0
+    try:
+        if db.NOTIFICATIONS_SCHEMA in copies:
+            db.attach_notifications(source)
+        for partition in range(db.LIST_PARTITIONS):
+            source.execute(f'ATTACH DATABASE ? AS partition{partition}', (db.partition_path(partition),))
+
+        # Pin one snapshot of every file for the whole copy; other connections' writes
+        # would otherwise restart the backup at every step
+        source.execute('BEGIN')
+        for schema in copies:
+            source.execute(f'SELECT COUNT(*) FROM {schema}.sqlite_master').fetchone()
+
+        def pause(status, remaining, total):
+            if stop is not None and stop.wait(step_pause):
+                raise BackupError("Backup aborted")
+            if stop is None and step_pause > 0:
+                time.sleep(step_pause)
+
+        for schema, path in copies.items():
+            target = sqlite3.connect(path)
+            try:
+                source.backup(target, pages=max(pages_per_step, 1), progress=pause, name=schema)
+                # The snapshot is a single self-contained file
+                target.execute('PRAGMA journal_mode = DELETE')
+                copied += target.execute('PRAGMA page_count').fetchone()[0]
+            finally:
+                target.close()
+
+        source.execute('COMMIT')
+    finally:
+        source.close()
+    return copied
+
+def _verify(path: Path):
+    conn = sqlite3.connect(f'{path.absolute().as_uri()}?mode=ro', uri=True)
+    try:
+        result = conn.execute('PRAGMA quick_check').fetchone()[0]
+    except sqlite3.DatabaseError as e:
+        raise BackupError(f"{path} is not a valid database: {e}") from e
+    finally:
+        conn.close()
+    if result != 'ok':
+        raise BackupError(f"{path} failed its integrity check: {result}")
+
+@contextmanager
+def _opened_snapshot(snapshot: Path):
+    """
+    Yield the path of an uncompressed copy of a snapshot, decompressing it next to the database if needed.
+    """
+    if snapshot.suffix != '.gz':
+        yield snapshot
+        return
+
+    path = Path(db.DB_PATH).absolute().with_name(snapshot.name.removesuffix('.gz') + '.tmp')
+    try:
+        with gzip.open(snapshot, 'rb') as source, open(path, 'wb') as target:
+            shutil.copyfileobj(source, target, COPY_CHUNK_SIZE)
+        yield path
+    except (OSError, EOFError) as e:
+        raise BackupError(f"Could not decompress {snapshot}: {e}") from e
+    finally:
+        path.unlink(missing_ok=True)
+
+def _snapshot_path(directory: Path, prefix: str, compress: bool) -> Path:
+    stamp = datetime.now(timezone.utc).strftime('%Y%m%d-%H%M%S')
+    suffix = '.db.gz' if compress else '.db'
+    # Unique whatever the suffix, so compressed and uncompressed snapshots sort together
+    name = f'{prefix}-{stamp}'
+    counter = 1
+    while (directory / f'{name}.db').exists() or (directory / f'{name}.db.gz').exists():
+        name = f'{prefix}-{stamp}-{counter}'
+        counter += 1
+    return directory / f'{name}{suffix}'
+
+
+# ----------------------------------------------
+#    CLASSES
+# ----------------------------------------------
+
+class BackupScheduler:
+    """
+    Background thread taking a snapshot every `interval` seconds and deleting old ones.
+
+    A snapshot is due when the newest one in `directory` is older than `interval`,
+    so restarts do not reset the schedule. Processes sharing `directory` take turns
+    through a lock file; whichever holds it takes the snapshot and the others see it
+    is no longer due.
+
+    Args:
+        interval (float): Seconds between snapshots.
+        directory (str): Directory holding the snapshots.
+        keep (int): Snapshots kept.
+        compress (bool): Whether to gzip snapshots.
+    """
+
+    def __init__(
+        self,
+        interval: float = BACKUP_INTERVAL,
+        directory: str = BACKUP_DIR,
+        keep: int = BACKUP_KEEP,
+        compress: bool = BACKUP_COMPRESS
+    ):
+        self.interval = interval
+        self.directory = directory
+        self.keep = keep
+        self.compress = compress
+
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def start(self):
+        """
+        Start the scheduler thread if it is not already running.
+        """
+        if self._thread and self._thread.is_alive():
+            return
+
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='backup-scheduler', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float | None = None):
+        """
+        Signal the scheduler thread to stop, aborting a backup in progress, and wait for it to exit.
+        """
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+
+    def seconds_until_due(self) -> float:
+        """
+        Return the seconds until the next snapshot is due, or 0 if it is due now.
+        """
+        snapshots = list_snapshots(self.directory)
+        if not snapshots:
+            return 0.0
+        try:
+            age = time.time() - snapshots[0].stat().st_mtime
+        except FileNotFoundError:
+            return 0.0
+        return max(self.interval - age, 0.0)
+
+    def run_once(self) -> Path | None:
+        """
+        Take a snapshot and prune old ones, if one is due and no other process is taking one.
+
+        Returns:
+            Path | None: The new snapshot, or None if none was taken.
+        """
+        with self._lock() as acquired:
+            if not acquired or self.seconds_until_due() > 0:
+                return None
+
+            # Left behind by a process that stopped in the middle of a backup
+            for pattern in ('*.tmp', '*.tmp-journal', '*.partial'):
+                for leftover in Path(self.directory).glob(pattern):
+                    leftover.unlink(missing_ok=True)
+
+            path = create_snapshot(self.directory, compress=self.compress, stop=self._stop)
+            prune_snapshots(self.directory, self.keep)
+            return path
+
+    @contextmanager
+    def _lock(self):
+        if fcntl is None:
+            yield True
+            return
+
+        Path(self.directory).mkdir(parents=True, exist_ok=True)
+        with open(Path(self.directory) / '.backup.lock', 'w') as lock:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                yield False
+                return
+            try:
+                yield True
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.run_once()
+            except (BackupError, sqlite3.Error, OSError) as e:
+                logger.error("Scheduled backup failed: %s", e)
+
+            # Check again once due; a minute at most, since another process may have taken it
+            self._stop.wait(min(max(self.seconds_until_due(), 1.0), 60.0))
+
+
+# Shared scheduler for the server process
+backup_scheduler = BackupScheduler()
+
+
+# ----------------------------------------------
+#    MAIN
+# ----------------------------------------------
+
+def main():
+    parser = argparse.ArgumentParser(description="Take, list and restore online backups of the grocery database.")
+    parser.add_argument('--db', default=db.DB_PATH, help="path of the application database")
+    parser.add_argument('--notifications-db', default=db.NOTIFICATIONS_DB_PATH, help="path of the separate notifications database, if any")
+    parser.add_argument('--partitions', type=int, default=db.LIST_PARTITIONS, help="number of list partitions, if any")
+    parser.add_argument('--dir', default=BACKUP_DIR, help="directory holding the snapshots")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    create = commands.add_parser('create', help="take a snapshot now, then delete old ones")
+    create.add_argument('--no-compress', action='store_true', help="write an uncompressed .db file")
+    create.add_argument('--keep', type=int, default=BACKUP_KEEP, help="snapshots to keep")
+    create.add_argument('--pages-per-step', type=int, default=BACKUP_PAGES_PER_STEP, help="pages copied per step")
+    create.add_argument('--step-pause-ms', type=float, default=BACKUP_STEP_PAUSE * 1000, help="pause between steps")
+
+    commands.add_parser('list', help="list snapshots, newest first")
+
+    restore = commands.add_parser('restore', help="replace the database with a snapshot (stop the server first)")
+    restore.add_argument('snapshot', help="path of the .db or .db.gz snapshot")
+    restore.add_argument('--no-keep-current', action='store_true', help="do not snapshot the current database first")
+    restore.add_argument('--yes', action='store_true', help="do not ask for confirmation")
+
+    options = parser.parse_args()
+    db.configure(options.db, options.notifications_db, options.partitions)
+
+    try:
+        if options.command == 'create':
+            path = create_snapshot(
+                options.dir,
+                compress=not options.no_compress,
+                pages_per_step=options.pages_per_step,
+                step_pause=options.step_pause_ms / 1000
+            )
+            print(path)
+            for removed in prune_snapshots(options.dir, options.keep):
+                print(f"deleted {removed}")
+
+        elif options.command == 'list':
+            for path in list_snapshots(options.dir) + list_snapshots(options.dir, PRE_RESTORE_PREFIX):
+                print(f"{path}\t{path.stat().st_size}")
+
+        elif options.command == 'restore':
+            if not options.yes:
+                answer = input(f"Replace {options.db} with {options.snapshot}? Stop the server first. [y/N] ")
+                if answer.strip().lower() != 'y':
+                    sys.exit(1)
+            current = restore_snapshot(options.snapshot, not options.no_keep_current, options.dir)
+            if current:
+                print(f"previous database saved to {current}")
+            print(f"restored {options.snapshot} into {options.db}")
+
+    except BackupError as e:
+        sys.exit(f"error: {e}")
+
+if __name__ == '__main__':
+    main()
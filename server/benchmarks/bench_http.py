@@ -0,0 +1,472 @@
+"""
+End-to-end load benchmark for the HTTP API.
+
+Replays scripted user sessions against the real routes and reports throughput and
+latency percentiles per route. Each session:
+    dashboard -> open list -> item suggestions -> add item -> edit item
+    -> delete item -> poll notifications
+Virtual users log in before their first session, or before every session with `--relogin`.
+
+Targets:
+    - `testclient`: an in-process app from `create_app()`, driven through Flask's test
+      client. No network or server overhead; useful for profiling route code. With
+      `--backend memory`, the app runs on the in-memory data store loaded from `--db`,
+      removing database I/O as well.
+    - `server`: a running server at `--url`, driven over HTTP with keep-alive connections.
+      With `--start-server`, `serve.py` is started on a free port for the duration of the run.
+
+Results can be saved as JSON baselines and compared between commits.
+
+Usage (from the `server` directory):
+    python generate_large_dataset.py --out grocery_bench.db --scale 0.01
+    python benchmarks/bench_http.py run --db grocery_bench.db --concurrency 8 --duration 20 --save before.json
+    python benchmarks/bench_http.py run --target server --start-server gunicorn --db grocery_bench.db --save after.json
+    python benchmarks/bench_http.py compare before.json after.json
+
+Users log in as `--username-format` (default `user{:07d}`, matching
+`generate_large_dataset.py`) with `--password`; virtual user `n` logs in as user `n + 1`.
+For the development database, pass `--username-format A --password a`.
+"""
+
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+import http.client
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import threading
+import time
+from urllib.parse import urlsplit
+
+SERVER_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, SERVER_DIR)
+
+
+# ----------------------------------------------
+#   CONSTANTS
+# ----------------------------------------------
+
+# Percentiles reported for every route
+PERCENTILES = (50, 95, 99)
+
+# Relative change in p95 latency or throughput reported as a regression by `compare`
+DEFAULT_REGRESSION_THRESHOLD = 0.10
+
+# Sequential requests on one keep-alive connection timed before a run against a started server
+LATENCY_CHECK_REQUESTS = 20
+
+# Median latency of those requests above which the server is stalling on every response,
+# e.g. by waiting out Nagle's algorithm against delayed ACKs (about 40 ms) without TCP_NODELAY
+LATENCY_CHECK_LIMIT = 0.02
+
+
+# ----------------------------------------------
+#    CLIENTS
+# ----------------------------------------------
+
+class TestClient:
+    """
+    Drives an in-process app through Flask's test client.
+    """
+
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def request(self, method: str, path: str, body: dict | None = None) -> tuple[int, dict | None]:
+        response = self.client.open(path, method=method, json=body)
+        return response.status_code, response.get_json(silent=True)
+
+class HttpClient:
+    """
+    Drives a running server over a keep-alive HTTP connection, keeping the session cookie.
+    """
+
+    def __init__(self, url: str):
+        parts = urlsplit(url)
+        self.host, self.port = parts.hostname, parts.port or 80
+        self.connection = http.client.HTTPConnection(self.host, self.port, timeout=60)
+        self.cookie = None
+
+    def request(self, method: str, path: str, body: dict | None = None) -> tuple[int, dict | None]:
+        headers = {'Accept': 'application/json'}
+        payload = None
+        if body is not None:
+            payload = json.dumps(body).encode('utf-8')
+            headers['Content-Type'] = 'application/json'
+        if self.cookie:
+            headers['Cookie'] = self.cookie
+
+        try:
+            self.connection.request(method, path, body=payload, headers=headers)
+            response = self.connection.getresponse()
+        except (ConnectionError, http.client.HTTPException):
+            # The server closed the keep-alive connection; retry once on a new one
+            self.connection.close()
+            self.connection = http.client.HTTPConnection(self.host, self.port, timeout=60)
+            self.connection.request(method, path, body=payload, headers=headers)
+            response = self.connection.getresponse()
+
+        data = response.read()
+        set_cookie = response.getheader('Set-Cookie')
+        if set_cookie:
+            self.cookie = set_cookie.split(';', 1)[0]
+
+        try:
+            return response.status, json.loads(data) if data else None
+        except ValueError:
+            return response.status, None
+
+
+# ----------------------------------------------
+#    SESSIONS
+# ----------------------------------------------
+
+class Recorder:
+    """
+    Collects latencies per route. Each worker thread appends to its own lists.
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+        self._all = []
+        self._lock = threading.Lock()
+
+    def _samples(self) -> dict:
+        try:
+            return self._local.samples
+        except AttributeError:
+            samples = self._local.samples = {}
+            with self._lock:
+                self._all.append(samples)
+            return samples
+
+    def record(self, route: str, seconds: float, ok: bool):
+        latencies, errors = self._samples().setdefault(route, ([], [0]))
+        latencies.append(seconds)
+        if not ok:
+            errors[0] += 1
+
+    def merged(self) -> dict[str, tuple[list[float], int]]:
+        merged = {}
+        for samples in self._all:
+            for route, (latencies, errors) in samples.items():
+                all_latencies, all_errors = merged.get(route, ([], 0))
+                merged[route] = (all_latencies + latencies, all_errors + errors[0])
+        return merged
+
+def timed(recorder: Recorder, client, route: str, method: str, path: str, body: dict | None = None,
+          expected: tuple = (200, 201)) -> dict | None:
+    start = time.perf_counter()
+    status, data = client.request(method, path, body)
+    recorder.record(route, time.perf_counter() - start, status in expected)
+    return data if status in expected else None
+
+def login(client, recorder: Recorder, username: str, password: str) -> bool:
+    return timed(recorder, client, 'POST /login', 'POST', '/login', {'username': username, 'password': password}) is not None
+
+def run_session(client, recorder: Recorder, vu: int):
+    """
+    Replay one scripted user session on a logged-in client.
+    """
+    dashboard = timed(recorder, client, 'GET /dashboard/lists', 'GET', '/dashboard/lists') or {}
+    editable = [l for l in dashboard.get('lists', []) if l.get('role', '').lower() in ('owner', 'admin', 'editor')]
+    if not editable:
+        created = timed(recorder, client, 'POST /dashboard/create_list', 'POST', '/dashboard/create_list', {'listName': f'Bench {vu}'})
+        if created is None:
+            return
+        list_id = created['listId']
+    else:
+        list_id = editable[vu % len(editable)]['id']
+
+    timed(recorder, client, 'GET /list/get_list_data', 'GET', f'/list/get_list_data?list_id={list_id}')
+    timed(recorder, client, 'GET /list/get_item_suggestions', 'GET', '/list/get_item_suggestions?query=mi')
+
+    item = {'name': f'bench item {vu}', 'category': 'dairy', 'quantity': 1, 'id': None}
+    added = timed(recorder, client, 'POST /list/add_item', 'POST', '/list/add_item', {'listId': list_id, 'item': item})
+    if added is not None:
+        item['id'] = added['item_id']
+        timed(recorder, client, 'POST /list/edit_item', 'POST', '/list/edit_item',
+              {'listId': list_id, 'oldItem': item, 'newItem': {**item, 'quantity': 2}})
+        timed(recorder, client, 'POST /list/delete_item', 'POST', '/list/delete_item',
+              {'currentListId': list_id, 'itemId': item['id']})
+
+    timed(recorder, client, 'GET /get_notifications', 'GET', '/get_notifications')
+
+def run_load(make_client, options: argparse.Namespace) -> tuple[Recorder, float]:
+    """
+    Run sessions on `options.concurrency` threads until the duration or session count is reached.
+
+    Returns:
+        tuple[Recorder, float]: The recorded samples and the wall-clock time of the run.
+    """
+    recorder = Recorder()
+    deadline = time.perf_counter() + options.duration
+    counter = iter(range(options.sessions or sys.maxsize))
+    counter_lock = threading.Lock()
+
+    def worker(vu: int):
+        client = make_client()
+        username = options.username_format.format(vu % options.user_count + 1)
+        logged_in = False
+        while time.perf_counter() < deadline:
+            with counter_lock:
+                if next(counter, None) is None:
+                    return
+            # Logging in is dominated by bcrypt, so by default each virtual user logs in
+            # once and keeps its session cookie, like a returning browser
+            if not logged_in or options.relogin:
+                logged_in = login(client, recorder, username, options.password)
+                if not logged_in:
+                    continue
+            run_session(client, recorder, vu)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=options.concurrency) as executor:
+        for future in [executor.submit(worker, vu) for vu in range(options.concurrency)]:
+            future.result()
+
+    return recorder, time.perf_counter() - start
+
+
+# ----------------------------------------------
+#    RESULTS
+# ----------------------------------------------
+
+def percentile(sorted_values: list[float], p: float) -> float:
+    """
+    Nearest-rank percentile of an already sorted list.
+    """
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, int(round(p / 100 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[rank]
+
+def summarize(recorder: Recorder, elapsed: float, options: argparse.Namespace) -> dict:
+    routes = {}
+    total_requests = total_errors = 0
+    for route, (latencies, errors) in sorted(recorder.merged().items()):
+        latencies.sort()
+        routes[route] = {
+            'requests': len(latencies),
+            'errors': errors,
+            'throughput_rps': len(latencies) / elapsed,
+            'mean_ms': sum(latencies) / len(latencies) * 1000,
+            **{f'p{p}_ms': percentile(latencies, p) * 1000 for p in PERCENTILES},
+            'max_ms': latencies[-1] * 1000,
+        }
+        total_requests += len(latencies)
+        total_errors += errors
+
+    return {
+        'meta': {
+            'commit': git_commit(),
+            'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'target': options.target,
+            'server': options.start_server,
+            'backend': options.backend if options.target == 'testclient' else None,
+            'url': options.url if options.target == 'server' else None,
+            'db': options.db,
+            'concurrency': options.concurrency,
+            'relogin': options.relogin,
+            'duration_s': elapsed,
+            'python': platform.python_version(),
+            'cpus': os.cpu_count(),
+        },
+        'total': {'requests': total_requests, 'errors': total_errors, 'throughput_rps': total_requests / elapsed},
+        'routes': routes,
+    }
+
+def print_summary(result: dict):
+    header = f"{'route':<34} {'reqs':>7} {'errs':>5} {'rps':>8} {'mean':>8} " + ' '.join(f"{'p' + str(p):>8}" for p in PERCENTILES)
+    print(header)
+    print('-' * len(header))
+    for route, stats in result['routes'].items():
+        print(f"{route:<34} {stats['requests']:>7} {stats['errors']:>5} {stats['throughput_rps']:>8.1f} {stats['mean_ms']:>8.2f} "
+              + ' '.join(f"{stats[f'p{p}_ms']:>8.2f}" for p in PERCENTILES))
+    total = result['total']
+    print(f"\n{total['requests']} requests, {total['errors']} errors, {total['throughput_rps']:.1f} req/s "
+          f"over {result['meta']['duration_s']:.1f}s (latencies in ms)")
+
+def compare(baseline: dict, current: dict, threshold: float) -> bool:
+    """
+    Print per-route changes between two results.
+
+    Returns:
+        bool: Whether any route regressed by more than `threshold` in p95 latency or throughput.
+    """
+    regressed = False
+    print(f"baseline: {baseline['meta'].get('commit')}  current: {current['meta'].get('commit')}")
+    for key in ('target', 'server', 'backend', 'db', 'concurrency', 'relogin', 'cpus'):
+        if baseline['meta'].get(key) != current['meta'].get(key):
+            print(f"warning: runs differ in {key}: {baseline['meta'].get(key)!r} vs {current['meta'].get(key)!r}")
+    print(f"{'route':<34} {'p95 base':>9} {'p95 now':>9} {'change':>8} {'rps base':>9} {'rps now':>9} {'change':>8}")
+    for route in sorted(set(baseline['routes']) | set(current['routes'])):
+        before, after = baseline['routes'].get(route), current['routes'].get(route)
+        if before is None or after is None:
+            print(f"{route:<34} {'only in ' + ('current' if before is None else 'baseline'):>9}")
+            continue
+
+        p95_change = after['p95_ms'] / before['p95_ms'] - 1 if before['p95_ms'] else 0.0
+        rps_change = after['throughput_rps'] / before['throughput_rps'] - 1 if before['throughput_rps'] else 0.0
+        flag = ''
+        if p95_change > threshold or rps_change < -threshold:
+            regressed = True
+            flag = '  REGRESSION'
+        print(f"{route:<34} {before['p95_ms']:>9.2f} {after['p95_ms']:>9.2f} {p95_change:>+8.1%} "
+              f"{before['throughput_rps']:>9.1f} {after['throughput_rps']:>9.1f} {rps_change:>+8.1%}{flag}")
+
+    return regressed
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=SERVER_DIR, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+# ----------------------------------------------
+#    TARGETS
+# ----------------------------------------------
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+def start_server(options: argparse.Namespace) -> subprocess.Popen:
+    """
+    Start `serve.py` on a free local port and wait until `/readyz` succeeds.
+    """
+    port = free_port()
+    options.url = f'http://127.0.0.1:{port}'
+    env = {**os.environ, 'GROCERY_DB_PATH': os.path.abspath(options.db), 'FLASK_SECRET_KEY': os.getenv('FLASK_SECRET_KEY', 'bench')}
+    process = subprocess.Popen(
+        [sys.executable, 'serve.py', '--server', options.start_server, '--bind', f'127.0.0.1:{port}',
+         '--workers', str(options.workers), '--threads', str(options.threads)],
+        cwd=SERVER_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        if process.poll() is not None:
+            sys.exit(f"serve.py exited with code {process.returncode}")
+        try:
+            if HttpClient(options.url).request('GET', '/readyz')[0] == 200:
+                return process
+        except OSError:
+            pass
+        time.sleep(0.25)
+
+    process.terminate()
+    sys.exit("Server did not become ready within 60 seconds")
+
+def check_latency(url: str):
+    """
+    Time sequential `GET /categories` requests on one keep-alive connection, and exit if
+    their median latency is above `LATENCY_CHECK_LIMIT`.
+
+    A route this cheap answers in a few milliseconds; a median far above that is a
+    per-response stall in the server, which would otherwise skew every result of the run.
+    """
+    client = HttpClient(url)
+    latencies = []
+    for _ in range(LATENCY_CHECK_REQUESTS + 1):
+        start = time.perf_counter()
+        client.request('GET', '/categories')
+        latencies.append(time.perf_counter() - start)
+
+    # The first request opens the connection
+    median = percentile(sorted(latencies[1:]), 50)
+    if median > LATENCY_CHECK_LIMIT:
+        raise SystemExit(
+            f"Sequential keep-alive requests take {median * 1000:.1f} ms (median), above "
+            f"{LATENCY_CHECK_LIMIT * 1000:.0f} ms; the server stalls on every response"
+        )
+    print(f"Keep-alive latency check: {median * 1000:.1f} ms median")
+
+def run(options: argparse.Namespace):
+    server = None
+    if options.target == 'testclient':
+        os.environ.setdefault('FLASK_SECRET_KEY', 'bench')
+        from app import create_app
+
+        app = create_app({'DATABASE': options.db, 'DATA_BACKEND': options.backend, 'START_LIST_PURGER': False})
+        make_client = lambda: TestClient(app)
+    else:
+        if options.start_server:
+            server = start_server(options)
+            try:
+                check_latency(options.url)
+            except SystemExit:
+                server.terminate()
+                raise
+        make_client = lambda: HttpClient(options.url)
+
+    try:
+        if options.warmup:
+            warmup_options = argparse.Namespace(**{**vars(options), 'duration': options.warmup, 'sessions': None})
+            run_load(make_client, warmup_options)
+
+        recorder, elapsed = run_load(make_client, options)
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait(timeout=30)
+
+    result = summarize(recorder, elapsed, options)
+    print_summary(result)
+
+    if options.save:
+        with open(options.save, 'w') as f:
+            json.dump(result, f, indent=2)
+        print(f"Saved results to {options.save}")
+
+def main():
+    parser = argparse.ArgumentParser(description="HTTP load benchmark for the grocery API.")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = commands.add_parser('run', help="run the benchmark")
+    run_parser.add_argument('--target', choices=['testclient', 'server'], default='testclient')
+    run_parser.add_argument('--backend', choices=['sqlite', 'memory'], default='sqlite', help="data backend (target 'testclient')")
+    run_parser.add_argument('--url', default='http://127.0.0.1:5000', help="server URL (target 'server')")
+    run_parser.add_argument('--start-server', choices=['gunicorn', 'waitress', 'uvicorn'], help="start serve.py for the run (target 'server')")
+    run_parser.add_argument('--workers', type=int, default=2, help="server worker processes, with --start-server")
+    run_parser.add_argument('--threads', type=int, default=8, help="threads per server worker, with --start-server")
+    run_parser.add_argument('--db', default='grocery.db', help="database used by the test client or started server")
+    run_parser.add_argument('--concurrency', type=int, default=4, help="concurrent virtual users")
+    run_parser.add_argument('--duration', type=float, default=10.0, help="seconds to run")
+    run_parser.add_argument('--sessions', type=int, help="stop after this many sessions in total")
+    run_parser.add_argument('--warmup', type=float, default=2.0, help="seconds of unrecorded warm-up")
+    run_parser.add_argument('--username-format', default='user{:07d}')
+    run_parser.add_argument('--user-count', type=int, default=1000, help="distinct users logged in as")
+    run_parser.add_argument('--password', default='password')
+    run_parser.add_argument('--relogin', action='store_true', help="log in again before every session")
+    run_parser.add_argument('--save', help="write results as JSON to this path")
+
+    compare_parser = commands.add_parser('compare', help="compare two saved results")
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('current')
+    compare_parser.add_argument('--threshold', type=float, default=DEFAULT_REGRESSION_THRESHOLD,
+                                help="relative change reported as a regression (default 0.10)")
+    compare_parser.add_argument('--fail-on-regression', action='store_true', help="exit with status 1 on regressions")
+
+    options = parser.parse_args()
+    if options.command == 'run':
+        if options.start_server:
+            options.target = 'server'
+        run(options)
+    else:
+        with open(options.baseline) as f:
+            baseline = json.load(f)
+        with open(options.current) as f:
+            current = json.load(f)
+        if compare(baseline, current, options.threshold) and options.fail_on_regression:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
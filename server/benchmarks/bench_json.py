@@ -0,0 +1,123 @@
+"""
+Benchmark comparing the stdlib and orjson Flask JSON providers on realistic payloads.
+
+Payloads mirror the shapes returned by `/list/get_list_data`, `/dashboard/lists`,
+`/list/get_item_suggestions` and `/get_notifications`. Each case is timed for both
+`dumps()` and a full `response()` (what `jsonify` calls).
+
+Usage (from the `server` directory):
+    python benchmarks/bench_json.py
+    python benchmarks/bench_json.py --repeat 7 --number 200
+"""
+
+import argparse
+import os
+import random
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+
+from json_provider import OrjsonProvider, orjson
+
+
+# ----------------------------------------------
+#    PAYLOADS
+# ----------------------------------------------
+
+CATEGORIES = [
+    'dairy', 'meat', 'fish/seafood', 'fruits', 'vegetables', 'canned/pantry', 'bread/bakery',
+    'pasta/grains', 'deli', 'condiments/spices', 'snacks', 'beverages', 'baking', 'frozen',
+    'prepared foods', 'personal care', 'cleaning/household items', 'pet care'
+]
+
+def list_data_payload(rng: random.Random, n_items: int = 300) -> dict:
+    return {
+        'success': True,
+        'userRole': 'Owner',
+        'items': [
+            {'name': f'item {i} ' + rng.choice(['organic', 'large', 'family size', '']), 'category': rng.choice(CATEGORIES),
+             'quantity': rng.randint(1, 12), 'item_id': rng.randint(1, 1_000_000)}
+            for i in range(n_items)
+        ],
+        'listName': 'Weekly groceries',
+        'modified': '2025-01-01 12:00:00',
+        'otherUsers': [{'user_id': i, 'username': f'user{i}', 'role': 'Editor'} for i in range(5)],
+    }
+
+def dashboard_payload(rng: random.Random, n_lists: int = 50) -> dict:
+    return {
+        'success': True,
+        'lists': [
+            {'id': i, 'name': f'List {i}', 'type': 'shared', 'role': 'Owner', 'last_updated': '2025-01-01 12:00:00',
+             'other_users': [{'user_id': j, 'username': f'user{j}', 'role': 'Viewer'} for j in range(rng.randint(0, 6))]}
+            for i in range(n_lists)
+        ],
+    }
+
+def suggestions_payload(rng: random.Random, n_items: int = 500) -> dict:
+    return {
+        'success': True,
+        'items': [{'item_id': i, 'name': f'item {i}', 'category_id': rng.randint(1, len(CATEGORIES))} for i in range(n_items)],
+    }
+
+def notifications_payload(rng: random.Random, n_notifications: int = 50) -> dict:
+    return {
+        'success': True,
+        'notifications': [
+            {'id': i, 'icon': 'edit', 'message': f"user{i} updated the quantity of 'milk' to {rng.randint(1, 9)}.",
+             'actionable': False, 'action_type': None, 'requested_list_id': None, 'unread': bool(i % 2),
+             'created_at': '2025-01-01 12:00:00', 'data': None}
+            for i in range(n_notifications)
+        ],
+    }
+
+
+# ----------------------------------------------
+#    BENCHMARK
+# ----------------------------------------------
+
+def bench(fn, repeat: int, number: int) -> float:
+    """
+    Return the best time per call, in microseconds.
+    """
+    return min(timeit.repeat(fn, repeat=repeat, number=number)) / number * 1e6
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare stdlib and orjson JSON providers.")
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--number', type=int, default=100)
+    parser.add_argument('--seed', type=int, default=0)
+    options = parser.parse_args()
+
+    if orjson is None:
+        sys.exit("orjson is not installed; nothing to compare against.")
+
+    rng = random.Random(options.seed)
+    cases = {
+        'get_list_data (300 items)': list_data_payload(rng),
+        'dashboard/lists (50 lists)': dashboard_payload(rng),
+        'item suggestions (500)': suggestions_payload(rng),
+        'get_notifications (50)': notifications_payload(rng),
+    }
+
+    app = Flask(__name__)
+    providers = {'stdlib': DefaultJSONProvider(app), 'orjson': OrjsonProvider(app)}
+
+    print(f"{'payload':<30} {'op':<9} {'stdlib us':>10} {'orjson us':>10} {'speedup':>8}")
+    with app.app_context():
+        for name, payload in cases.items():
+            for op in ('dumps', 'response'):
+                timings = {
+                    key: bench(lambda p=provider: getattr(p, op)(payload), options.repeat, options.number)
+                    for key, provider in providers.items()
+                }
+                print(f"{name:<30} {op:<9} {timings['stdlib']:>10.1f} {timings['orjson']:>10.1f} "
+                      f"{timings['stdlib'] / timings['orjson']:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,271 @@
+"""
+Micro-benchmarks for the notification helpers and the data-access helpers every write uses.
+
+Each helper is timed against in-memory and on-disk SQLite databases, at several
+`notifications` table sizes and, for `create_notifications_for_users_of_list()`,
+several recipient counts. Besides time per call, each case records the SQL statements
+executed per call (through `db.add_statement_observer()`), the memory still held after
+the calls (retained growth, not total bytes allocated), and the peak traced memory during
+them (through `tracemalloc`).
+
+Calls run inside an open transaction that is rolled back after every round, so the
+table sizes stay fixed and commit cost is not included.
+
+Usage (from the `server` directory):
+    python benchmarks/bench_notifications.py
+    python benchmarks/bench_notifications.py --table-sizes 0,100000,1000000 --recipients 1,10,100,1000
+    python benchmarks/bench_notifications.py --backends disk --save notifications.json
+"""
+
+import argparse
+import json
+import os
+import random
+import shutil
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import db
+from generate_large_dataset import create_schema
+from notifications import (
+    NotificationType,
+    create_notification,
+    create_notifications_for_users_of_list,
+    get_notifications,
+)
+from app import update_list_modified_date
+from sqlite_repository import SqliteUnitOfWork
+
+
+# ----------------------------------------------
+#    CONSTANTS
+# ----------------------------------------------
+
+# User receiving a tenth of all notifications, read by the `get_notifications` cases
+HOT_USER_ID = 1
+
+# Users that are not members of any benchmark list
+BACKGROUND_USERS = 1000
+
+
+# ----------------------------------------------
+#    FIXTURES
+# ----------------------------------------------
+
+def build_template(path: str, table_size: int, recipients: list[int], seed: int = 0) -> dict[int, int]:
+    """
+    Create a database at `path` with `table_size` notifications and one list per
+    recipient count, owned by `HOT_USER_ID`.
+
+    Returns:
+        dict[int, int]: The list ID for each recipient count.
+    """
+    create_schema(path)
+    rng = random.Random(seed)
+    n_users = max(recipients) + 1 + BACKGROUND_USERS
+
+    conn = sqlite3.connect(path)
+    try:
+        with conn:
+            conn.executemany(
+                'INSERT INTO users (user_id, username, password_hash) VALUES (?, ?, ?)',
+                ((i, f'user{i:07d}', 'x') for i in range(1, n_users + 1))
+            )
+
+            list_ids = {}
+            for count in recipients:
+                list_id = conn.execute(
+                    "INSERT INTO grocery_lists (name) VALUES (?)", (f'{count} recipients',)
+                ).lastrowid
+                conn.executemany(
+                    'INSERT INTO grocery_list_users (list_id, user_id, role) VALUES (?, ?, ?)',
+                    [(list_id, HOT_USER_ID, 'owner')] + [(list_id, user_id, 'editor') for user_id in range(2, count + 2)]
+                )
+                list_ids[count] = list_id
+
+            conn.executemany(
+                '''
+                INSERT INTO notifications (user_id, icon, message, unread, created_at)
+                VALUES (?, 'edit', ?, ?, (strftime('%s', '2025-01-01') - ?) * 1000)
+                ''',
+                (
+                    (
+                        HOT_USER_ID if rng.random() < 0.1 else rng.randint(2, n_users),
+                        f'User "user{rng.randint(1, n_users):07d}" edited list "Weekly groceries".',
+                        rng.random() < 0.3,
+                        rng.randint(0, 365 * 86400),
+                    )
+                    for _ in range(table_size)
+                )
+            )
+        conn.execute('ANALYZE')
+    finally:
+        conn.close()
+
+    return list_ids
+
+def open_backend(backend: str, template: str, workdir: str) -> sqlite3.Connection:
+    """
+    Open an instrumented connection to a copy of `template`, in memory or on disk.
+    """
+    if backend == 'memory':
+        conn = sqlite3.connect(':memory:', factory=db.InstrumentedConnection)
+        source = sqlite3.connect(template)
+        try:
+            source.backup(conn)
+        finally:
+            source.close()
+        return conn
+
+    path = os.path.join(workdir, 'bench.db')
+    shutil.copyfile(template, path)
+    return sqlite3.connect(path, factory=db.InstrumentedConnection)
+
+
+# ----------------------------------------------
+#    MEASUREMENT
+# ----------------------------------------------
+
+class StatementCounter:
+    """
+    Statement observer counting statements while `active`.
+    """
+
+    def __init__(self):
+        self.active = False
+        self.count = 0
+
+    def __call__(self, sql, parameters, seconds, conn):
+        if self.active:
+            self.count += 1
+
+statement_counter = StatementCounter()
+db.add_statement_observer(statement_counter)
+
+def measure(conn: sqlite3.Connection, func, number: int, repeat: int) -> dict:
+    """
+    Time `func(repo)` and record its statements and memory use.
+
+    `tracemalloc` only sees blocks still allocated when a snapshot is taken, so memory
+    allocated and freed within the calls is not counted in `retained_bytes`; the peak
+    bounds the transient use instead.
+
+    Returns:
+        dict: Per-call `min_us`, `median_us`, `statements` and `retained_bytes`, and
+            `peak_bytes`, the peak traced memory above the baseline over all `number` calls.
+    """
+    repo = SqliteUnitOfWork(conn)
+    cur = repo.cur
+    rounds = []
+    for _ in range(repeat):
+        cur.execute('BEGIN')
+        start = time.perf_counter()
+        for _ in range(number):
+            func(repo)
+        rounds.append((time.perf_counter() - start) / number)
+        conn.rollback()
+
+    # Statements and allocations are measured in a separate round, as tracing slows calls down
+    cur.execute('BEGIN')
+    statement_counter.count = 0
+    statement_counter.active = True
+    tracemalloc.start()
+    try:
+        before = tracemalloc.take_snapshot()
+        tracemalloc.reset_peak()
+        baseline = tracemalloc.get_traced_memory()[0]
+        for _ in range(number):
+            func(repo)
+        peak = tracemalloc.get_traced_memory()[1] - baseline
+        after = tracemalloc.take_snapshot()
+    finally:
+        tracemalloc.stop()
+        statement_counter.active = False
+        conn.rollback()
+
+    # Sum of growth per allocation site, i.e. memory allocated and still held after the
+    # calls, leaving out the memory of the `before` snapshot itself
+    ignore = [tracemalloc.Filter(False, tracemalloc.__file__)]
+    after, before = after.filter_traces(ignore), before.filter_traces(ignore)
+    retained = sum(max(stat.size_diff, 0) for stat in after.compare_to(before, 'lineno'))
+
+    return {
+        'min_us': min(rounds) * 1e6,
+        'median_us': statistics.median(rounds) * 1e6,
+        'statements': statement_counter.count / number,
+        'retained_bytes': retained / number,
+        'peak_bytes': peak,
+    }
+
+def cases(list_ids: dict[int, int]):
+    """
+    Yield `(name, recipients, func)` for every benchmarked call.
+    """
+    message = 'User "user0000001" edited list "Weekly groceries".'
+    first_list = next(iter(list_ids.values()))
+
+    yield 'create_notification', 1, lambda repo: create_notification(repo, 2, message, NotificationType.EDIT.value)
+    for recipients, list_id in list_ids.items():
+        yield 'create_notifications_for_users_of_list', recipients, lambda repo, list_id=list_id: create_notifications_for_users_of_list(
+            repo, list_id, HOT_USER_ID, message, NotificationType.EDIT.value
+        )
+    yield 'get_notifications', None, lambda repo: get_notifications(repo, HOT_USER_ID)
+    yield 'update_list_modified_date', None, lambda repo: update_list_modified_date(repo, first_list)
+
+
+# ----------------------------------------------
+#    MAIN
+# ----------------------------------------------
+
+def parse_ints(value: str) -> list[int]:
+    return [int(part) for part in value.split(',') if part.strip()]
+
+def main():
+    parser = argparse.ArgumentParser(description="Micro-benchmarks for the notification and data-access helpers.")
+    parser.add_argument('--backends', default='memory,disk', help="comma-separated: memory, disk")
+    parser.add_argument('--table-sizes', type=parse_ints, default=[0, 100_000], help="notifications table sizes, e.g. 0,100000")
+    parser.add_argument('--recipients', type=parse_ints, default=[1, 10, 100], help="list member counts, e.g. 1,10,100")
+    parser.add_argument('--number', type=int, default=100, help="calls per round")
+    parser.add_argument('--repeat', type=int, default=5, help="timed rounds per case")
+    parser.add_argument('--save', help="write results as JSON to this path")
+    options = parser.parse_args()
+
+    backends = [backend.strip() for backend in options.backends.split(',') if backend.strip()]
+    for backend in backends:
+        if backend not in ('memory', 'disk'):
+            parser.error(f"unknown backend: {backend}")
+
+    results = []
+    print(f"{'case':<40} {'backend':<7} {'rows':>8} {'recips':>6} {'min us':>9} {'median us':>10} {'stmts':>6} {'retain B':>9} {'peak B':>9}")
+    with tempfile.TemporaryDirectory() as workdir:
+        for table_size in options.table_sizes:
+            template = os.path.join(workdir, f'template_{table_size}.db')
+            list_ids = build_template(template, table_size, options.recipients)
+
+            for backend in backends:
+                conn = open_backend(backend, template, workdir)
+                try:
+                    for name, recipients, func in cases(list_ids):
+                        result = {'case': name, 'backend': backend, 'table_size': table_size, 'recipients': recipients,
+                                  **measure(conn, func, options.number, options.repeat)}
+                        results.append(result)
+                        print(f"{name:<40} {backend:<7} {table_size:>8} {recipients if recipients is not None else '-':>6} "
+                              f"{result['min_us']:>9.1f} {result['median_us']:>10.1f} {result['statements']:>6.1f} "
+                              f"{result['retained_bytes']:>9.0f} {result['peak_bytes']:>9}")
+                finally:
+                    conn.close()
+
+    if options.save:
+        with open(options.save, 'w') as f:
+            json.dump({'number': options.number, 'repeat': options.repeat, 'results': results}, f, indent=2)
+        print(f"Saved results to {options.save}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,278 @@
+"""
+Module for the in-process item catalog.
+
+The catalog keeps a compact copy of the `items` and `categories` tables so that
+routes can resolve item IDs to names and categories without joining on every request.
+"""
+
+from array import array
+import sys
+import threading
+
+from logger import get_logger
+from repository import ItemRepository
+
+logger = get_logger('catalog')
+
+
+# ----------------------------------------------
+#   CONSTANTS
+# ----------------------------------------------
+
+# Category slot value used for items with no category (category IDs start at 1)
+NO_CATEGORY = 0
+
+
+# ----------------------------------------------
+#    CLASSES
+# ----------------------------------------------
+
+class ItemCatalog:
+    """
+    Array-backed, interned lookup table of item ID -> (name, category_id).
+
+    Item IDs are dense AUTOINCREMENT keys, so they are used directly as indexes
+    into two parallel arrays:
+        - `_names`: list of interned item names (None for IDs that do not exist)
+        - `_categories`: `array('i')` of category IDs (`NO_CATEGORY` if unset)
+
+    Interning means items sharing a name (e.g. "milk" in two categories) share one
+    string object, and the category column costs 4 bytes per item.
+
+    The catalog is loaded lazily on first use. Items are never updated or deleted
+    in place (editing an item creates a new row), so the catalog only ever grows.
+    It only holds committed rows read from the database: lookups of unknown IDs pull
+    in rows inserted since, by this or any other process, via `refresh()`. Methods that
+    may read must therefore be given the repository of a read-only unit of work; a write
+    unit of work would show them rows its batch has not committed yet. Write paths use
+    `peek()`, which never reads.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._names: list[str | None] = []
+        self._categories = array('i')
+        self._category_names: dict[int, str] = {}
+        # Highest item ID read from the database; `refresh()` reads the rows above it
+        self._loaded_through = 0
+        self._count = 0
+        # Running size of the stored name strings, kept by `_store()` (see `size_bytes()`)
+        self._name_bytes = 0
+        self._loaded = False
+
+    def __len__(self) -> int:
+        return self._count
+
+    def ensure_loaded(self, items: ItemRepository):
+        """
+        Load the full catalog from the database if it has not been loaded yet.
+
+        Args:
+            items (ItemRepository): Repository used to read items and categories.
+        """
+        if self._loaded:
+            return
+
+        with self._lock:
+            if self._loaded:
+                return
+
+            self._category_names = self._read_categories(items)
+            self._store_rows(items.created_after(0))
+
+            self._loaded = True
+            logger.info("Item catalog loaded with %s items (%s bytes)", self._count, self.size_bytes())
+
+    def refresh(self, items: ItemRepository):
+        """
+        Pull in items inserted since the catalog was last loaded or refreshed.
+
+        This only reads rows with an ID above the highest one read so far, so it
+        is a single indexed range scan on the `items` primary key. SQLite allocates
+        IDs inside its one write transaction, so no row can later commit below it.
+
+        Args:
+            items (ItemRepository): Repository used to read items.
+        """
+        if not self._loaded:
+            self.ensure_loaded(items)
+            return
+
+        rows = items.created_after(self._loaded_through)
+
+        if rows:
+            with self._lock:
+                self._store_rows(rows)
+
+    def get(self, items: ItemRepository, item_id: int) -> tuple[str, int | None] | None:
+        """
+        Look up a single item.
+
+        Args:
+            items (ItemRepository): Repository used only if the catalog needs to be
+                loaded or refreshed.
+            item_id (int): ID of the item.
+
+        Returns:
+            tuple[str, int | None] | None: `(name, category_id)`, or None if the item does not exist.
+        """
+        self.ensure_loaded(items)
+
+        entry = self._entry(item_id)
+        if entry is None:
+            self.refresh(items)
+            entry = self._entry(item_id)
+
+        return entry
+
+    def peek(self, item_id: int) -> tuple[str, int | None] | None:
+        """
+        Look up a single item among those already loaded, without reading the database.
+
+        Args:
+            item_id (int): ID of the item.
+
+        Returns:
+            tuple[str, int | None] | None: `(name, category_id)`, or None if the item is
+                not loaded (yet).
+        """
+        return self._entry(item_id)
+
+    def get_many(self, items: ItemRepository, item_ids: list[int]) -> list[tuple[str, int | None] | None]:
+        """
+        Look up several items at once, refreshing the catalog at most once.
+
+        Args:
+            items (ItemRepository): Repository used only if the catalog needs to be
+                loaded or refreshed.
+            item_ids (list[int]): IDs of the items.
+
+        Returns:
+            list[tuple[str, int | None] | None]: One entry per ID, in the same order.
+        """
+        self.ensure_loaded(items)
+
+        entries = [self._entry(item_id) for item_id in item_ids]
+        if None in entries:
+            self.refresh(items)
+            entries = [entry or self._entry(item_id) for item_id, entry in zip(item_ids, entries)]
+
+        return entries
+
+    def category_name(self, items: ItemRepository, category_id: int | None) -> str | None:
+        """
+        Return the name of a category, or None if it is unknown.
+
+        Categories created since the catalog was loaded are read on their first lookup.
+
+        Args:
+            items (ItemRepository): Repository used only if the category is not known yet.
+            category_id (int | None): ID of the category.
+        """
+        if category_id is None:
+            return None
+
+        name = self._category_names.get(category_id)
+        if name is None:
+            self._category_names = self._read_categories(items)
+            name = self._category_names.get(category_id)
+
+        return name
+
+    def search(self, items: ItemRepository, query: str) -> list[tuple[int, str, int | None]]:
+        """
+        Find items whose name contains `query`, case-insensitively.
+
+        Items whose name matches `query` exactly are excluded, mirroring the
+        behavior of the item suggestions endpoint.
+
+        Args:
+            items (ItemRepository): Repository used to refresh the catalog.
+            query (str): Lowercase search string.
+
+        Returns:
+            list[tuple[int, str, int | None]]: Matching `(item_id, name, category_id)` tuples.
+        """
+        self.refresh(items)
+
+        names = self._names
+        categories = self._categories
+        matches = []
+        for item_id in range(len(names)):
+            name = names[item_id]
+            if name is None:
+                continue
+            lowered = name.lower()
+            if query in lowered and lowered != query:
+                category_id = categories[item_id]
+                matches.append((item_id, name, category_id if category_id != NO_CATEGORY else None))
+
+        return matches
+
+    def size_bytes(self) -> int:
+        """
+        Approximate memory used by the catalog, in bytes.
+
+        Counts the two backing arrays, the category map, and the name strings. Names
+        are summed as items are stored, so this takes constant time and is cheap enough
+        for every `/metrics` scrape; a name shared by several items (and interned once)
+        is counted once per item, so the total is an upper bound.
+        """
+        return (
+            sys.getsizeof(self._names)
+            + sys.getsizeof(self._categories)
+            + sys.getsizeof(self._category_names)
+            + self._name_bytes
+        )
+
+    def stats(self) -> dict:
+        """
+        Return catalog size metrics.
+        """
+        return {
+            'items': self._count,
+            'max_item_id': self._loaded_through,
+            'bytes': self.size_bytes(),
+        }
+
+    def _entry(self, item_id: int) -> tuple[str, int | None] | None:
+        if item_id is None or item_id < 0 or item_id >= len(self._names):
+            return None
+
+        name = self._names[item_id]
+        if name is None:
+            return None
+
+        category_id = self._categories[item_id]
+        return (name, category_id if category_id != NO_CATEGORY else None)
+
+    @staticmethod
+    def _read_categories(items: ItemRepository) -> dict[int, str]:
+        return {category_id: sys.intern(name) for name, category_id in items.categories()}
+
+    def _store_rows(self, rows: list[tuple[int, str, int | None]]):
+        # Caller must hold `self._lock`
+        for item_id, name, category_id in rows:
+            self._store(item_id, name, category_id)
+            self._loaded_through = max(self._loaded_through, item_id)
+
+    def _store(self, item_id: int, name: str, category_id: int | None):
+        # Caller must hold `self._lock`
+        if item_id >= len(self._names):
+            grow_by = item_id + 1 - len(self._names)
+            self._names.extend([None] * grow_by)
+            self._categories.extend([NO_CATEGORY] * grow_by)
+
+        previous = self._names[item_id]
+        if previous is None:
+            self._count += 1
+        else:
+            self._name_bytes -= sys.getsizeof(previous)
+
+        name = self._names[item_id] = sys.intern(name)
+        self._name_bytes += sys.getsizeof(name)
+        self._categories[item_id] = category_id if category_id is not None else NO_CATEGORY
+
+
+# Shared catalog for the server process
+item_catalog = ItemCatalog()
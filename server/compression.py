@@ -0,0 +1,175 @@
+"""
+Module for compressing HTTP responses.
+
+JSON responses such as list data, the dashboard and notifications are highly
+repetitive and shrink by 80-90% when compressed. `init_compression()` registers an
+`after_request` hook that compresses responses with brotli (when installed) or gzip,
+negotiated through the request's `Accept-Encoding` header.
+
+Responses are left untouched when they are:
+    - smaller than `COMPRESS_MIN_SIZE` bytes,
+    - not of a compressible content type,
+    - already encoded (`Content-Encoding` set),
+    - streamed or passed through directly (e.g. `send_file`).
+"""
+
+import gzip
+import os
+
+from flask import Flask, Response, current_app, request
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - depends on the environment
+    brotli = None
+
+
+# ----------------------------------------------
+#   CONSTANTS
+# ----------------------------------------------
+
+COMPRESSIBLE_MIMETYPES = {
+    'application/json',
+    'application/javascript',
+    'text/css',
+    'text/html',
+    'text/plain',
+    'text/xml',
+}
+
+# Preferred encodings, best first, for clients that accept several equally
+ENCODINGS = ('br', 'gzip') if brotli is not None else ('gzip',)
+
+
+# ----------------------------------------------
+#    FUNCTIONS
+# ----------------------------------------------
+
+def choose_encoding(accept_encoding: str | None) -> str | None:
+    """
+    Pick the best supported encoding from an `Accept-Encoding` header.
+
+    Args:
+        accept_encoding (str | None): The header value, e.g. `'gzip, deflate, br;q=0.9'`.
+
+    Returns:
+        str | None: `'br'`, `'gzip'`, or None if the client accepts neither.
+    """
+    if not accept_encoding:
+        return None
+
+    weights = {}
+    for part in accept_encoding.split(','):
+        name, _, params = part.strip().partition(';')
+        q = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        weights[name.strip().lower()] = q
+
+    wildcard = weights.get('*', 0.0)
+    best, best_q = None, 0.0
+    for encoding in ENCODINGS:
+        q = weights.get(encoding, wildcard)
+        if q > best_q:
+            best, best_q = encoding, q
+
+    return best
+
+def compress(data: bytes, encoding: str, gzip_level: int = 6, brotli_quality: int = 4) -> bytes:
+    """
+    Compress `data` with the given encoding.
+
+    Args:
+        data (bytes): The uncompressed body.
+        encoding (str): `'br'` or `'gzip'`.
+        gzip_level (int, optional): gzip compression level, 1-9. Defaults to `6`.
+        brotli_quality (int, optional): brotli quality, 0-11. Defaults to `4`,
+            which compresses better than gzip at a similar speed.
+
+    Returns:
+        bytes: The compressed body.
+    """
+    if encoding == 'br':
+        return brotli.compress(data, mode=brotli.MODE_TEXT, quality=brotli_quality)
+
+    # mtime=0 keeps the output deterministic for identical bodies
+    return gzip.compress(data, compresslevel=gzip_level, mtime=0)
+
+def compress_body(data: bytes, mimetype: str | None, accept_encoding: str | None, config) -> tuple[bytes, str | None]:
+    """
+    Compress a response body if it is eligible and the client supports it.
+
+    Shared by the Flask hook and the ASGI handlers in `asgi.py`.
+
+    Args:
+        data (bytes): The uncompressed body.
+        mimetype (str | None): The response's mimetype, without parameters.
+        accept_encoding (str | None): The request's `Accept-Encoding` header.
+        config (Mapping): App config holding the `COMPRESS_*` keys.
+
+    Returns:
+        tuple[bytes, str | None]: The (possibly) compressed body and its encoding,
+            or None if it was left uncompressed.
+    """
+    if not config['COMPRESS_ENABLED'] or mimetype not in COMPRESSIBLE_MIMETYPES or len(data) < config['COMPRESS_MIN_SIZE']:
+        return data, None
+
+    encoding = choose_encoding(accept_encoding)
+    if encoding is None:
+        return data, None
+
+    compressed = compress(data, encoding, config['COMPRESS_LEVEL'], config['COMPRESS_BROTLI_QUALITY'])
+    if len(compressed) >= len(data):
+        return data, None
+
+    return compressed, encoding
+
+def compress_response(response: Response) -> Response:
+    """
+    `after_request` hook compressing eligible responses in place.
+    """
+    if (
+        response.direct_passthrough
+        or response.is_streamed
+        or 'Content-Encoding' in response.headers
+        or response.status_code < 200
+        or response.status_code in (204, 206, 304)
+        or response.mimetype not in COMPRESSIBLE_MIMETYPES
+    ):
+        return response
+
+    # Caches must key compressible responses on the client's encodings
+    response.vary.add('Accept-Encoding')
+
+    data = response.get_data()
+    body, encoding = compress_body(data, response.mimetype, request.headers.get('Accept-Encoding'), current_app.config)
+    if encoding is not None:
+        response.set_data(body)
+        response.headers['Content-Encoding'] = encoding
+
+    return response
+
+def init_compression(app: Flask):
+    """
+    Set compression defaults on `app` and register the compression hook.
+
+    ---
+    Config Keys:
+    - `COMPRESS_ENABLED` (bool): Whether to compress responses. Defaults to `True`
+      unless `GROCERY_COMPRESS=0`.
+    - `COMPRESS_MIN_SIZE` (int): Smallest body, in bytes, worth compressing. Defaults to
+      `GROCERY_COMPRESS_MIN_SIZE` or `500`.
+    - `COMPRESS_LEVEL` (int): gzip level, 1-9. Defaults to `GROCERY_COMPRESS_LEVEL` or `6`.
+    - `COMPRESS_BROTLI_QUALITY` (int): brotli quality, 0-11. Defaults to
+      `GROCERY_COMPRESS_BROTLI_QUALITY` or `4`.
+    """
+    app.config.setdefault('COMPRESS_ENABLED', os.getenv('GROCERY_COMPRESS', '1') != '0')
+    app.config.setdefault('COMPRESS_MIN_SIZE', int(os.getenv('GROCERY_COMPRESS_MIN_SIZE', 500)))
+    app.config.setdefault('COMPRESS_LEVEL', int(os.getenv('GROCERY_COMPRESS_LEVEL', 6)))
+    app.config.setdefault('COMPRESS_BROTLI_QUALITY', int(os.getenv('GROCERY_COMPRESS_BROTLI_QUALITY', 4)))
+
+    app.after_request(compress_response)
@@ -0,0 +1,417 @@
+"""
+Module for opening SQLite database connections.
+
+Connections report every statement they execute, with its duration, to the
+functions registered with `add_statement_observer()` (see `metrics.py`).
+
+Writes go through the group-commit writers in `writer.py`: each write unit of work
+runs in a savepoint inside a `BEGIN IMMEDIATE` transaction shared with the other units
+of its batch, on a connection the writer opens with `connect()` and keeps open.
+Read-only units of work take a connection from
+`read_pool` instead: connections opened with `mode=ro` and `PRAGMA query_only`, each
+holding one read snapshot for the whole unit of work and releasing it as soon as the
+unit ends, so long-lived reads never hold back WAL checkpoints.
+
+Notifications can be kept in a separate database file (`NOTIFICATIONS_DB_PATH`), with
+its own WAL and write lock. Read-only connections attach it as `notifications_db`; as
+the application database then has no `notifications` table, queries reach it by its
+unqualified name. Writes to it go through their own connections (see
+`connect(database='notifications')`).
+
+List data can be hash-partitioned across several files (`LIST_PARTITIONS`, see
+`partitioned_repository.py`). Partition `i` is the database `'partition{i}'`, at
+`partition_path(i)`, with its own connections and read pool (`partition_pool(i)`).
+"""
+
+from contextlib import contextmanager
+import os
+from pathlib import Path
+import sqlite3
+import struct
+import threading
+import time
+
+
+# ----------------------------------------------
+#   CONSTANTS
+# ----------------------------------------------
+
+# Path to the SQLite database file
+DB_PATH = os.getenv("GROCERY_DB_PATH", "grocery.db")
+
+# Path to a separate SQLite file holding the notifications, or None to keep them in DB_PATH
+NOTIFICATIONS_DB_PATH = os.getenv("GROCERY_NOTIFICATIONS_DB_PATH") or None
+
+# Schema name the notifications database is attached under
+NOTIFICATIONS_SCHEMA = 'notifications_db'
+
+# Number of files the list tables are hash-partitioned across by list ID, or 0 to keep them in DB_PATH
+LIST_PARTITIONS = int(os.getenv("GROCERY_LIST_PARTITIONS", 0))
+
+# Most list partitions; backups attach every file to one connection, which allows ten
+MAX_LIST_PARTITIONS = 8
+
+# Seconds a connection waits on a locked database before raising "database is locked"
+BUSY_TIMEOUT = 5.0
+
+# Idle read-only connections kept open per process
+READ_POOL_SIZE = int(os.getenv("GROCERY_READ_POOL_SIZE", 8))
+
+# Functions called as `observer(sql, parameters, seconds, conn)` after each statement
+_statement_observers = []
+
+
+# ----------------------------------------------
+#    CLASSES
+# ----------------------------------------------
+
+class InstrumentedCursor(sqlite3.Cursor):
+    """
+    Cursor timing `execute()` and `executemany()` calls for the statement observers.
+
+    For queries, the measured time covers preparing the statement and stepping to the
+    first row; rows fetched afterwards are not included.
+    """
+
+    def execute(self, sql, parameters=()):
+        start = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            _notify(sql, parameters, time.perf_counter() - start, self.connection)
+
+    def executemany(self, sql, seq_of_parameters):
+        start = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            _notify(sql, None, time.perf_counter() - start, self.connection)
+
+class InstrumentedConnection(sqlite3.Connection):
+    """
+    Connection whose cursors, including those behind `Connection.execute()`, are `InstrumentedCursor`s.
+    """
+
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+class ReadPool:
+    """
+    Thread-safe pool of read-only connections.
+
+    Connections are opened on demand and at most `size` idle ones are kept. The pool is
+    per process: connections inherited through `fork()` are dropped, not reused.
+
+    Args:
+        size (int): Maximum number of idle connections kept open.
+        database (str, optional): The database read, `'main'` or a list partition
+            (see `connect_readonly()`). Defaults to `'main'`.
+    """
+
+    def __init__(self, size: int = READ_POOL_SIZE, database: str = 'main'):
+        self.size = size
+        self.database = database
+        self._lock = threading.Lock()
+        self._idle: list[sqlite3.Connection] = []
+        self._pid = os.getpid()
+        self._path = None
+
+        # Start times (perf_counter) of the snapshots currently held, by connection id
+        self._held: dict[int, float] = {}
+        self._opened = 0
+        self._snapshots = 0
+        self._snapshot_seconds = 0.0
+
+    @contextmanager
+    def snapshot(self):
+        """
+        Context manager yielding a read-only connection inside a read transaction.
+
+        Every query in the block sees the database as of the start of the block,
+        including the attached notifications database (`NOTIFICATIONS_SCHEMA`) if there
+        is one: both snapshots are taken together, by the first read. The transaction is
+        ended and the connection returned to the pool afterwards.
+        """
+        conn, attached = self._acquire()
+        key = id(conn)
+        start = time.perf_counter()
+        with self._lock:
+            self._held[key] = start
+
+        reusable = False
+        try:
+            conn.execute('BEGIN')
+            # A deferred transaction only takes its snapshot at the first read, and only
+            # of the schemas that read touches; one statement reading both starts both
+            if attached:
+                conn.execute(f'SELECT 1 FROM sqlite_master, {NOTIFICATIONS_SCHEMA}.sqlite_master LIMIT 1')
+            else:
+                conn.execute('SELECT 1 FROM sqlite_master LIMIT 1')
+            yield conn
+            reusable = True
+        finally:
+            try:
+                conn.rollback()
+            except sqlite3.Error:
+                reusable = False
+
+            with self._lock:
+                del self._held[key]
+                self._snapshots += 1
+                self._snapshot_seconds += time.perf_counter() - start
+                if reusable and len(self._idle) < self.size and self._pid == os.getpid() and self._path == self._paths():
+                    self._idle.append(conn)
+                    conn = None
+            if conn is not None:
+                conn.close()
+
+    def clear(self):
+        """
+        Close all idle connections, e.g. after the database path changed.
+        """
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
+
+    def stats(self) -> dict:
+        """
+        Return pool statistics.
+
+        Returns:
+            dict: `idle` and `in_use` connections, `opened` connections and `snapshots`
+                taken since startup, `snapshot_seconds` summed over them, and
+                `oldest_snapshot_seconds`, the age of the oldest snapshot still held.
+        """
+        now = time.perf_counter()
+        with self._lock:
+            return {
+                'idle': len(self._idle),
+                'in_use': len(self._held),
+                'opened': self._opened,
+                'snapshots': self._snapshots,
+                'snapshot_seconds': self._snapshot_seconds,
+                'oldest_snapshot_seconds': now - min(self._held.values()) if self._held else 0.0,
+            }
+
+    def _acquire(self) -> tuple[sqlite3.Connection, bool]:
+        # Returns the connection and whether it has the notifications database attached
+        with self._lock:
+            if self._pid != os.getpid():
+                # Connections must not be shared with the parent process; leave them to it
+                self._pid = os.getpid()
+                self._idle = []
+                self._held = {}
+            if self._path != self._paths():
+                stale, self._idle = self._idle, []
+                self._path = self._paths()
+            else:
+                stale = []
+            conn = self._idle.pop() if self._idle else None
+            if conn is None:
+                self._opened += 1
+            # Idle connections were all opened with the current paths
+            attached = self.database == 'main' and bool(self._path[1])
+
+        for old in stale:
+            old.close()
+        if conn is None:
+            conn = connect_readonly(self.database)
+            attached = self.database == 'main' and bool(NOTIFICATIONS_DB_PATH)
+        return conn, attached
+
+    def _paths(self) -> tuple[str, str | None]:
+        return database_path(self.database), NOTIFICATIONS_DB_PATH
+
+
+# ----------------------------------------------
+#    FUNCTIONS
+# ----------------------------------------------
+
+def configure(path: str, notifications_path: str | None = None, partitions: int = 0):
+    """
+    Set the paths of the database files used by all new connections.
+
+    Args:
+        path (str): Path to the SQLite database file.
+        notifications_path (str | None, optional): Path to a separate database file for
+            notifications, or None to keep them in `path`. Defaults to None.
+        partitions (int, optional): Number of files the list tables are partitioned
+            across (see `partition_path()`), or 0 to keep them in `path`. Defaults to 0.
+
+    Raises:
+        ValueError: If `partitions` is negative or above `MAX_LIST_PARTITIONS`.
+    """
+    global DB_PATH, NOTIFICATIONS_DB_PATH, LIST_PARTITIONS
+    if not 0 <= partitions <= MAX_LIST_PARTITIONS:
+        raise ValueError(f"List partitions must be between 0 and {MAX_LIST_PARTITIONS}, not {partitions}")
+
+    DB_PATH = path
+    NOTIFICATIONS_DB_PATH = notifications_path
+    LIST_PARTITIONS = partitions
+    read_pool.clear()
+    for pool in _partition_pools.values():
+        pool.clear()
+
+def partition_path(partition: int) -> str:
+    """
+    Return the path of the file holding list partition `partition`, next to `DB_PATH`
+    (`grocery.db` has partitions `grocery.p0.db`, `grocery.p1.db`, ...).
+    """
+    path = Path(DB_PATH)
+    return str(path.with_name(f'{path.stem}.p{partition}{path.suffix}'))
+
+def database_path(database: str = 'main') -> str:
+    """
+    Return the path of the file holding `database` (`'main'`, `'notifications'` or `'partition{i}'`).
+    """
+    if database == 'notifications' and NOTIFICATIONS_DB_PATH:
+        return NOTIFICATIONS_DB_PATH
+    if database.startswith('partition'):
+        return partition_path(int(database.removeprefix('partition')))
+    return DB_PATH
+
+def partition_pool(partition: int) -> 'ReadPool':
+    """
+    Return the process's read-only connection pool for list partition `partition`.
+    """
+    pool = _partition_pools.get(partition)
+    if pool is None:
+        with _partition_pools_lock:
+            pool = _partition_pools.setdefault(partition, ReadPool(database=f'partition{partition}'))
+    return pool
+
+def add_statement_observer(observer):
+    """
+    Register a function called after every statement executed on an application connection.
+
+    Args:
+        observer (Callable[[str, Any, float, sqlite3.Connection], None]): Called with the
+            SQL, its bound parameters (None for `executemany()`), the time taken, in seconds,
+            and the connection that executed it. It runs on the executing thread, so it must
+            be cheap and must not raise.
+    """
+    if observer not in _statement_observers:
+        _statement_observers.append(observer)
+
+def _notify(sql, parameters, seconds, conn):
+    for observer in _statement_observers:
+        observer(sql, parameters, seconds, conn)
+
+def connect(foreign_keys: bool = False, shared: bool = False, database: str = 'main') -> sqlite3.Connection:
+    """
+    Open a new connection to the application database.
+
+    Args:
+        foreign_keys (bool, optional): Whether to enable `PRAGMA foreign_keys`, which
+            makes `ON DELETE CASCADE` clauses take effect. Defaults to False.
+        shared (bool, optional): Whether the connection may be used from any thread (one
+            at a time). Shared connections are in autocommit mode; the caller begins and
+            ends transactions explicitly. Defaults to False.
+        database (str, optional): `'notifications'` to open the notifications database
+            instead, which is the application database unless `NOTIFICATIONS_DB_PATH` is
+            set, or `'partition{i}'` to open list partition `i`. Defaults to `'main'`.
+
+    Returns:
+        sqlite3.Connection: A new connection. The caller is responsible for closing it.
+    """
+    path = database_path(database)
+    if shared:
+        conn = sqlite3.connect(
+            path,
+            timeout=BUSY_TIMEOUT,
+            factory=InstrumentedConnection,
+            isolation_level=None,
+            check_same_thread=False
+        )
+    else:
+        conn = sqlite3.connect(path, timeout=BUSY_TIMEOUT, factory=InstrumentedConnection)
+    if foreign_keys:
+        conn.execute('PRAGMA foreign_keys = ON')
+    return conn
+
+def connect_readonly(database: str = 'main') -> sqlite3.Connection:
+    """
+    Open a new read-only connection to the application database.
+
+    The file is opened with `mode=ro` and `PRAGMA query_only`, so the connection can
+    never take the write lock. It may be used by one thread at a time, from any thread.
+    A separate notifications database is attached to connections to `'main'`, read-only as well.
+
+    Args:
+        database (str, optional): `'main'`, or `'partition{i}'` to open list partition `i`.
+            Defaults to `'main'`.
+
+    Returns:
+        sqlite3.Connection: A new connection in autocommit mode. The caller is responsible for closing it.
+    """
+    uri = Path(database_path(database)).absolute().as_uri() + '?mode=ro'
+    conn = sqlite3.connect(
+        uri,
+        uri=True,
+        timeout=BUSY_TIMEOUT,
+        factory=InstrumentedConnection,
+        isolation_level=None,
+        check_same_thread=False
+    )
+    conn.execute('PRAGMA query_only = ON')
+    if NOTIFICATIONS_DB_PATH and database == 'main':
+        attach_notifications(conn, readonly=True)
+    return conn
+
+def attach_notifications(conn: sqlite3.Connection, readonly: bool = False):
+    """
+    Attach the separate notifications database to `conn` as `NOTIFICATIONS_SCHEMA`.
+
+    Args:
+        conn (sqlite3.Connection): Connection to the application database. For `readonly`,
+            it must have been opened with `uri=True`.
+        readonly (bool, optional): Whether to attach the file with `mode=ro`. Defaults to False.
+    """
+    path = Path(NOTIFICATIONS_DB_PATH).absolute().as_uri() + '?mode=ro' if readonly else NOTIFICATIONS_DB_PATH
+    conn.execute(f'ATTACH DATABASE ? AS {NOTIFICATIONS_SCHEMA}', (path,))
+
+def enable_wal(conn: sqlite3.Connection):
+    """
+    Switch the database to write-ahead logging, if it is not already.
+
+    In WAL mode readers never block the writer or each other. The setting is stored
+    in the database file, so it only needs to be applied once.
+    """
+    if conn.execute('PRAGMA journal_mode').fetchone()[0].lower() != 'wal':
+        conn.execute('PRAGMA journal_mode = WAL')
+
+def wal_status(database: str = 'main') -> tuple[int, int] | None:
+    """
+    Read the WAL's progress from the header of its index (the `-shm` file), without
+    touching the database or taking any lock. Checkpoints are left to SQLite's
+    autocheckpoint on commit.
+
+    Args:
+        database (str, optional): Database to read, as in `connect()`. Defaults to `'main'`.
+
+    Returns:
+        tuple[int, int] | None: `(wal_frames, checkpointed_frames)`, the frames in the WAL
+            and those already copied into the database. None if no connection has the WAL
+            open, or the index is being written.
+    """
+    try:
+        with open(database_path(database) + '-shm', 'rb') as f:
+            header = f.read(100)
+    except OSError:
+        return None
+    if len(header) < 100:
+        return None
+
+    # Two copies of the index header, then the checkpoint info, all in native byte order
+    is_init, wal_frames = struct.unpack_from('=12xB3xI', header)
+    checkpointed, = struct.unpack_from('=I', header, 96)
+    if not is_init or header[:48] != header[48:96]:
+        return None
+    return wal_frames, checkpointed
+
+
+# Shared read-only connection pools for the server process
+read_pool = ReadPool()
+_partition_pools: dict[int, ReadPool] = {}
+_partition_pools_lock = threading.Lock()
@@ -0,0 +1,297 @@
+"""
+Helper script for generating a large synthetic database, for reproducing performance
+issues offline.
+
+The schema comes from `generate_tables.py` and is migrated to the current version.
+Data follows skewed, roughly realistic distributions:
+    - A few users own many lists, and most own one or two.
+    - Most lists are private, some are shared with a handful of users, and a few with many.
+      Popular collaborators appear on many lists.
+    - List sizes are log-normal (median ~20 items, capped at 300). A small set of
+      staple items appears on most lists.
+    - Notifications are concentrated on active users, and about a third are unread.
+
+Rows are bulk-loaded with `executemany` in large transactions. Every user shares one
+password hash, computed once. The same `--seed` always produces the same database.
+
+Usage (from the `server` directory):
+    python generate_large_dataset.py --out grocery_large.db
+    python generate_large_dataset.py --out grocery_small.db --scale 0.01 --seed 7
+
+Every generated user can log in with `--password` (default `password`). Usernames
+are `user0000001`, `user0000002`, ...
+"""
+
+import argparse
+from datetime import datetime, timedelta, timezone
+import itertools
+import json
+import math
+import os
+import random
+import sqlite3
+import subprocess
+import sys
+import time
+
+import bcrypt
+
+
+# ----------------------------------------------
+#   CONSTANTS
+# ----------------------------------------------
+
+# Row counts at `--scale 1`
+DEFAULT_USERS = 200_000
+DEFAULT_LISTS = 300_000
+DEFAULT_ITEMS = 1_000_000
+DEFAULT_NOTIFICATIONS = 3_000_000
+
+# Rows inserted per transaction
+DEFAULT_BATCH_SIZE = 50_000
+
+# Generated timestamps fall in the year before this date, independent of when the script runs
+END_DATE = datetime(2025, 1, 1, tzinfo=timezone.utc)
+
+MAX_ITEMS_PER_LIST = 300
+
+# Base item names per category, combined with qualifiers to produce distinct items
+CATEGORY_ITEMS = {
+    'dairy': ['milk', 'butter', 'yogurt', 'cheddar', 'eggs', 'cream cheese', 'sour cream', 'mozzarella'],
+    'meat': ['chicken breasts', 'ground beef', 'pork chops', 'bacon', 'sausages', 'steak', 'turkey'],
+    'fish/seafood': ['salmon', 'tuna', 'shrimp', 'cod', 'tilapia', 'crab'],
+    'fruits': ['apples', 'bananas', 'oranges', 'grapes', 'strawberries', 'blueberries', 'lemons'],
+    'vegetables': ['carrots', 'onions', 'potatoes', 'broccoli', 'spinach', 'tomatoes', 'peppers', 'lettuce'],
+    'canned/pantry': ['black beans', 'chickpeas', 'tomato sauce', 'soup', 'peanut butter', 'honey'],
+    'bread/bakery': ['bread', 'bagels', 'tortillas', 'croissants', 'muffins', 'buns'],
+    'pasta/grains': ['spaghetti', 'rice', 'oats', 'quinoa', 'penne', 'couscous'],
+    'deli': ['ham', 'salami', 'turkey slices', 'hummus', 'olives'],
+    'condiments/spices': ['ketchup', 'mustard', 'mayonnaise', 'salt', 'pepper', 'cinnamon', 'soy sauce'],
+    'snacks': ['chips', 'pretzels', 'crackers', 'popcorn', 'granola bars', 'cookies'],
+    'beverages': ['coffee', 'tea', 'orange juice', 'sparkling water', 'soda', 'lemonade'],
+    'baking': ['flour', 'sugar', 'baking soda', 'yeast', 'chocolate chips', 'vanilla extract'],
+    'frozen': ['frozen pizza', 'ice cream', 'frozen peas', 'frozen berries', 'waffles'],
+    'prepared foods': ['rotisserie chicken', 'salad kit', 'sushi', 'lasagna'],
+    'personal care': ['shampoo', 'toothpaste', 'soap', 'deodorant', 'lotion'],
+    'cleaning/household items': ['paper towels', 'dish soap', 'laundry detergent', 'trash bags', 'sponges'],
+    'pet care': ['dog food', 'cat food', 'cat litter', 'dog treats'],
+}
+
+QUALIFIERS = ['', 'organic', 'large', 'family size', 'low fat', 'store brand', 'fresh', 'value pack', 'mini', 'premium']
+
+LIST_NAMES = ['Weekly groceries', 'Costco run', 'Party supplies', 'BBQ', 'Dinner', 'Meal prep', 'Camping', 'Holiday baking', 'Household', 'Quick stop']
+
+ROLES = ['admin', 'editor', 'editor', 'viewer', 'viewer', 'viewer']
+
+NOTIFICATION_TEMPLATES = [
+    ('edit', "{user} updated the quantity of '{item}' to {quantity}."),
+    ('none', "{user} added '{item}' to list '{list}'."),
+    ('delete', "{user} deleted '{item}' from list '{list}'."),
+    ('edit', "{user} changed the name of grocery list from '{list}' to '{list} (old)'."),
+]
+
+
+# ----------------------------------------------
+#    FUNCTIONS
+# ----------------------------------------------
+
+def timestamp(rng: random.Random, days: int = 365) -> int:
+    """
+    Random timestamp within `days` before `END_DATE`, in milliseconds since the Unix epoch.
+    """
+    return int((END_DATE - timedelta(seconds=rng.randrange(days * 86400))).timestamp()) * 1000
+
+def skewed_index(rng: random.Random, n: int, skew: float = 3.0) -> int:
+    """
+    Random index in `[0, n)`, biased towards 0. Higher `skew` concentrates more mass on low indexes.
+    """
+    return int(n * rng.random() ** skew)
+
+def insert_batches(conn: sqlite3.Connection, sql: str, rows, batch_size: int, label: str) -> int:
+    """
+    Insert `rows` (any iterable) with `executemany`, committing every `batch_size` rows.
+
+    Returns:
+        int: The number of rows inserted.
+    """
+    total = 0
+    start = time.perf_counter()
+    rows = iter(rows)
+    while True:
+        batch = list(itertools.islice(rows, batch_size))
+        if not batch:
+            break
+        with conn:
+            conn.executemany(sql, batch)
+        total += len(batch)
+        print(f"  {label}: {total:,} rows ({total / (time.perf_counter() - start):,.0f} rows/s)", end='\r', flush=True)
+
+    print(f"  {label}: {total:,} rows in {time.perf_counter() - start:.1f}s{' ' * 20}")
+    return total
+
+def create_schema(path: str):
+    """
+    Create an empty database at `path` with the current schema and the default categories.
+    """
+    server_dir = os.path.dirname(os.path.abspath(__file__))
+    subprocess.run([sys.executable, os.path.join(server_dir, 'generate_tables.py'), path], check=True, stdout=subprocess.DEVNULL)
+
+    sys.path.insert(0, server_dir)
+    from migrations import apply_migrations
+
+    conn = sqlite3.connect(path)
+    try:
+        apply_migrations(conn)
+    finally:
+        conn.close()
+
+def generate_items(n_items: int, category_ids: dict[str, int]):
+    # Cycles through base names and qualifiers, then numbers the variants so that
+    # (name, category) pairs stay distinct at any scale
+    bases = [(name, category) for category, names in CATEGORY_ITEMS.items() for name in names]
+    combos = [(f"{q} {name}".strip(), category) for q in QUALIFIERS for name, category in bases]
+
+    for i in range(n_items):
+        name, category = combos[i % len(combos)]
+        variant = i // len(combos)
+        yield (f"{name} #{variant}" if variant else name, category_ids[category])
+
+def generate_lists(rng: random.Random, n_lists: int):
+    for _ in range(n_lists):
+        created = timestamp(rng)
+        updated = max(created, timestamp(rng, days=60))
+        yield (rng.choice(LIST_NAMES), created, updated)
+
+def generate_list_users(rng: random.Random, n_lists: int, n_users: int):
+    for list_id in range(1, n_lists + 1):
+        # A few heavy users own many lists
+        owner = skewed_index(rng, n_users, skew=2.0) + 1
+        yield (list_id, owner, 'owner')
+
+        # Pareto-distributed member counts: mostly 0, sometimes a few, rarely dozens
+        members = min(int(rng.paretovariate(1.6)) - 1, 50)
+        seen = {owner}
+        for _ in range(members):
+            # Popular collaborators appear on many lists
+            user_id = skewed_index(rng, n_users, skew=2.5) + 1
+            if user_id not in seen:
+                seen.add(user_id)
+                yield (list_id, user_id, rng.choice(ROLES))
+
+def generate_list_items(rng: random.Random, n_lists: int, n_items: int):
+    # Staple items (milk, eggs, bread, ...) are the low item IDs, picked far more often
+    for list_id in range(1, n_lists + 1):
+        count = min(int(rng.lognormvariate(math.log(20), 0.9)), MAX_ITEMS_PER_LIST, n_items)
+        chosen = set()
+        while len(chosen) < count:
+            chosen.add(skewed_index(rng, n_items, skew=4.0) + 1)
+        for item_id in chosen:
+            yield (list_id, item_id, 1 if rng.random() < 0.6 else rng.randint(2, 12))
+
+def generate_notifications(rng: random.Random, n_notifications: int, n_users: int, n_lists: int):
+    for _ in range(n_notifications):
+        user_id = skewed_index(rng, n_users, skew=2.0) + 1
+        actor = f"user{rng.randrange(1, n_users + 1):07d}"
+
+        if rng.random() < 0.05:
+            list_id = rng.randrange(1, n_lists + 1)
+            yield (
+                user_id, 'invite', f"{actor} invites you to grocery list '{rng.choice(LIST_NAMES)}'.",
+                1, 'join_list_request', list_id, int(rng.random() < 0.3), timestamp(rng, days=180),
+                json.dumps({'user_role': rng.choice(ROLES)})
+            )
+        else:
+            icon, template = rng.choice(NOTIFICATION_TEMPLATES)
+            message = template.format(
+                user=actor,
+                item=rng.choice(CATEGORY_ITEMS['dairy'] + CATEGORY_ITEMS['fruits'] + CATEGORY_ITEMS['snacks']),
+                list=rng.choice(LIST_NAMES),
+                quantity=rng.randint(1, 12)
+            )
+            yield (user_id, icon, message, 0, None, None, int(rng.random() < 0.3), timestamp(rng, days=180), None)
+
+def generate(path: str, seed: int, n_users: int, n_lists: int, n_items: int, n_notifications: int,
+             password: str, batch_size: int):
+    """
+    Create and fill a database at `path`.
+    """
+    rng = random.Random(seed)
+
+    print(f"Creating schema in {path}")
+    create_schema(path)
+
+    conn = sqlite3.connect(path)
+    # The file is disposable until generation finishes, so skip durability for speed
+    conn.execute('PRAGMA journal_mode = OFF')
+    conn.execute('PRAGMA synchronous = OFF')
+    conn.execute('PRAGMA cache_size = -262144')
+
+    try:
+        category_ids = dict((name, category_id) for category_id, name in conn.execute('SELECT category_id, name FROM categories'))
+
+        # bcrypt is deliberately slow, so every user shares a single hash
+        password_hash = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt())
+        insert_batches(conn, 'INSERT INTO users (username, password_hash) VALUES (?, ?)',
+                       ((f"user{i:07d}", password_hash) for i in range(1, n_users + 1)), batch_size, 'users')
+
+        insert_batches(conn, 'INSERT INTO items (name, category_id) VALUES (?, ?)',
+                       generate_items(n_items, category_ids), batch_size, 'items')
+
+        insert_batches(conn, 'INSERT INTO grocery_lists (name, creation_date, update_date) VALUES (?, ?, ?)',
+                       generate_lists(rng, n_lists), batch_size, 'grocery_lists')
+
+        insert_batches(conn, 'INSERT INTO grocery_list_users (list_id, user_id, role) VALUES (?, ?, ?)',
+                       generate_list_users(rng, n_lists, n_users), batch_size, 'grocery_list_users')
+
+        insert_batches(conn, 'INSERT INTO grocery_list_items (list_id, item_id, quantity) VALUES (?, ?, ?)',
+                       generate_list_items(rng, n_lists, n_items), batch_size, 'grocery_list_items')
+
+        insert_batches(conn, '''
+            INSERT INTO notifications (user_id, icon, message, actionable, action_type, requested_list_id, unread, created_at, data)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', generate_notifications(rng, n_notifications, n_users, n_lists), batch_size, 'notifications')
+
+        print("Analyzing tables")
+        conn.execute('ANALYZE')
+        conn.execute('PRAGMA journal_mode = DELETE')
+    finally:
+        conn.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a large synthetic grocery database.")
+    parser.add_argument('--out', default='grocery_large.db', help="path of the database to create")
+    parser.add_argument('--seed', type=int, default=0, help="random seed; the same seed produces the same data")
+    parser.add_argument('--scale', type=float, default=1.0, help="multiplier applied to all default row counts")
+    parser.add_argument('--users', type=int, help=f"number of users (default {DEFAULT_USERS:,} x scale)")
+    parser.add_argument('--lists', type=int, help=f"number of lists (default {DEFAULT_LISTS:,} x scale)")
+    parser.add_argument('--items', type=int, help=f"number of items (default {DEFAULT_ITEMS:,} x scale)")
+    parser.add_argument('--notifications', type=int, help=f"number of notifications (default {DEFAULT_NOTIFICATIONS:,} x scale)")
+    parser.add_argument('--password', default='password', help="password shared by all generated users")
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE, help="rows per transaction")
+    parser.add_argument('--force', action='store_true', help="overwrite the output file if it exists")
+    options = parser.parse_args()
+
+    if os.path.exists(options.out):
+        if not options.force:
+            sys.exit(f"{options.out} already exists; pass --force to overwrite it.")
+        os.remove(options.out)
+
+    def scaled(value, default):
+        return value if value is not None else max(1, int(default * options.scale))
+
+    start = time.perf_counter()
+    generate(
+        path=options.out,
+        seed=options.seed,
+        n_users=scaled(options.users, DEFAULT_USERS),
+        n_lists=scaled(options.lists, DEFAULT_LISTS),
+        n_items=scaled(options.items, DEFAULT_ITEMS),
+        n_notifications=scaled(options.notifications, DEFAULT_NOTIFICATIONS),
+        password=options.password,
+        batch_size=options.batch_size
+    )
+    print(f"Database generated successfully in {time.perf_counter() - start:.1f}s!")
+
+
+if __name__ == '__main__':
+    main()
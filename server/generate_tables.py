@@ -1,11 +1,15 @@
 """
 Helper script for generating the necessary SQLite database tables
+
+Usage:
+    python generate_tables.py [path]    # path defaults to grocery.db
 """
 import sqlite3
+import sys
 import bcrypt
 
 # 1. Connect to the database (creates the .db file if it doesn't exist)
-conn = sqlite3.connect('grocery.db')
+conn = sqlite3.connect(sys.argv[1] if len(sys.argv) > 1 else 'grocery.db')
 cursor = conn.cursor()
 
 # Users table
@@ -40,8 +44,11 @@ cursor.execute('''
 CREATE TABLE IF NOT EXISTS grocery_lists (
     list_id INTEGER PRIMARY KEY AUTOINCREMENT,
     name TEXT,
-    creation_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-    update_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    creation_date INTEGER DEFAULT (CAST((julianday('now') - 2440587.5) * 86400000 AS INTEGER)),
+    update_date INTEGER DEFAULT (CAST((julianday('now') - 2440587.5) * 86400000 AS INTEGER)),
+    deleted_at INTEGER DEFAULT NULL,
+    is_template BOOLEAN NOT NULL DEFAULT 0,
+    version INTEGER NOT NULL DEFAULT 0
 )
 ''')
 
@@ -54,7 +61,7 @@ CREATE TABLE IF NOT EXISTS grocery_list_users (
     PRIMARY KEY (list_id, user_id),
     FOREIGN KEY (list_id) REFERENCES grocery_lists (list_id) ON DELETE CASCADE,
     FOREIGN KEY (user_id) REFERENCES users (user_id) ON DELETE CASCADE
-)
+) WITHOUT ROWID
 ''')
 
 # Grocery List Items table
@@ -66,7 +73,7 @@ CREATE TABLE IF NOT EXISTS grocery_list_items (
     PRIMARY KEY (list_id, item_id),
     FOREIGN KEY (list_id) REFERENCES grocery_lists (list_id) ON DELETE CASCADE,
     FOREIGN KEY (item_id) REFERENCES items (item_id) ON DELETE CASCADE
-)
+) WITHOUT ROWID
 ''')
 
 # Notifications table
@@ -80,11 +87,11 @@ CREATE TABLE notifications (
     action_type TEXT CHECK(action_type IN ('join_list_request') OR action_type IS NULL),
     requested_list_id INTEGER,
     unread BOOLEAN NOT NULL DEFAULT 1,
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    created_at INTEGER DEFAULT (CAST((julianday('now') - 2440587.5) * 86400000 AS INTEGER)),
     read_at TIMESTAMP DEFAULT NULL,
     data TEXT DEFAULT NULL,
 
-    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
+    FOREIGN KEY (user_id) REFERENCES users(user_id) ON DELETE CASCADE,
     FOREIGN KEY (requested_list_id) REFERENCES grocery_lists(list_id) ON DELETE CASCADE
 )
 ''')
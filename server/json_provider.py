@@ -0,0 +1,105 @@
+"""
+Module for the Flask JSON provider used by all responses.
+
+`jsonify` and `request.get_json()` go through the app's JSON provider. When orjson
+is installed, `OrjsonProvider` replaces Flask's stdlib-based `DefaultJSONProvider`,
+which is a top CPU cost on large payloads such as list data, the dashboard and
+suggestions. Without orjson, the stdlib provider is used unchanged.
+
+See `benchmarks/bench_json.py` for a comparison of the two.
+"""
+
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - depends on the environment
+    orjson = None
+
+
+# ----------------------------------------------
+#    CLASSES
+# ----------------------------------------------
+
+class OrjsonProvider(DefaultJSONProvider):
+    """
+    JSON provider backed by orjson.
+
+    Output matches `DefaultJSONProvider` apart from whitespace and non-ASCII characters,
+    which are written as UTF-8 rather than `\\u` escapes:
+        - `sort_keys` and `compact` are honored.
+        - Non-string dict keys are converted to strings.
+        - `datetime` values are passed to `default`, producing the same RFC 822
+          strings as Flask's provider.
+
+    Calls with extra `json.dumps` keyword arguments (e.g. `cls`) fall back to the
+    stdlib implementation.
+    """
+
+    def _options(self, indent: bool = False) -> int:
+        option = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        return option
+
+    def dumps_bytes(self, obj, indent: bool = False) -> bytes:
+        """
+        Serialize `obj` to UTF-8 encoded JSON bytes.
+        """
+        return orjson.dumps(obj, default=self.default, option=self._options(indent))
+
+    def dumps(self, obj, **kwargs) -> str:
+        indent = kwargs.pop('indent', None)
+        kwargs.pop('separators', None)
+        if kwargs or indent not in (None, 2):
+            return super().dumps(obj, indent=indent, **kwargs)
+
+        return self.dumps_bytes(obj, indent=indent == 2).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        if kwargs:
+            return super().loads(s, **kwargs)
+
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = (self.compact is None and self._app.debug) or self.compact is False
+
+        # Builds the body as bytes directly, skipping the str round trip
+        return self._app.response_class(self.dumps_bytes(obj, indent) + b'\n', mimetype=self.mimetype)
+
+
+# ----------------------------------------------
+#    FUNCTIONS
+# ----------------------------------------------
+
+def make_json_provider(app: Flask, name: str = 'auto') -> DefaultJSONProvider:
+    """
+    Create the JSON provider for an app.
+
+    Args:
+        app (Flask): The app the provider belongs to.
+        name (str, optional): `'orjson'`, `'stdlib'`, or `'auto'` to use orjson when
+            it is installed. Defaults to `'auto'`.
+
+    Raises:
+        ValueError: If `name` is unknown.
+        RuntimeError: If `'orjson'` is requested but not installed.
+
+    Returns:
+        DefaultJSONProvider: The provider instance.
+    """
+    if name not in ('auto', 'orjson', 'stdlib'):
+        raise ValueError(f"Invalid JSON provider: {name}")
+
+    if name == 'orjson' and orjson is None:
+        raise RuntimeError("JSON provider 'orjson' requested, but orjson is not installed.")
+
+    if name == 'stdlib' or orjson is None:
+        return DefaultJSONProvider(app)
+
+    return OrjsonProvider(app)
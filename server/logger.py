@@ -1,4 +1,186 @@
+"""
+Module configuring application logging.
+
+Log calls only put the record on an in-process queue. A `QueueListener` thread
+formats the records and writes them to stderr, so neither formatting nor I/O happens
+on the request path. Messages should use lazy `%`-style arguments, e.g.
+`logger.info("Fetched %d items", count)`, which are only formatted by the listener,
+and only for records that pass the level and sampling checks.
+
+Configured through environment variables:
+    - `GROCERY_LOG_FORMAT`: `json` (one JSON object per line, the default) or `text`.
+    - `GROCERY_LOG_LEVEL`: Level of the `grocery` logger. Defaults to `INFO`.
+    - `GROCERY_LOG_LEVELS`: Per-logger levels, e.g. `grocery.notifications=DEBUG,werkzeug=WARNING`.
+    - `GROCERY_LOG_DEBUG_SAMPLE`: Fraction of DEBUG records kept. Defaults to `1.0`.
+    - `GROCERY_LOG_DEBUG_RATE`: Most DEBUG records kept per second for each message. Defaults to `10`.
+
+Modules log through `logger` (the `grocery` logger) or a child from `get_logger()`.
+"""
+
+import atexit
+import json
 import logging
+from logging.handlers import QueueHandler, QueueListener
+import os
+import queue
+import random
+import sys
+import time
+
+
+# ----------------------------------------------
+#   CONSTANTS
+# ----------------------------------------------
+
+LOGGER_NAME = 'grocery'
+
+LOG_FORMAT = os.getenv('GROCERY_LOG_FORMAT', 'json')
+LOG_LEVEL = os.getenv('GROCERY_LOG_LEVEL', 'INFO').upper()
+LOG_LEVELS = os.getenv('GROCERY_LOG_LEVELS', '')
+DEBUG_SAMPLE = float(os.getenv('GROCERY_LOG_DEBUG_SAMPLE', 1.0))
+DEBUG_RATE = int(os.getenv('GROCERY_LOG_DEBUG_RATE', 10))
+
+TEXT_FORMAT = '%(asctime)s - %(levelname)s - %(name)s - %(message)s'
+
+# `LogRecord` attributes that are not user-supplied `extra` fields
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime', 'taskName'}
+
+
+# ----------------------------------------------
+#    CLASSES
+# ----------------------------------------------
+
+class JsonFormatter(logging.Formatter):
+    """
+    Formats records as single-line JSON objects, including any `extra` fields.
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'time': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'pid': record.process,
+            'thread': record.threadName,
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES:
+                entry[key] = value
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+class LazyQueueHandler(QueueHandler):
+    """
+    Queue handler that enqueues records as they are.
+
+    The stock `QueueHandler.prepare()` formats the message in the logging thread so
+    records can be pickled. The queue never leaves this process, so formatting is
+    left to the listener thread.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+class DebugSampler(logging.Filter):
+    """
+    Filter keeping a random `sample` fraction of DEBUG records, and at most `rate`
+    records per second for each distinct message template. Other levels always pass.
+
+    Args:
+        sample (float): Fraction of DEBUG records to keep, from 0 to 1.
+        rate (int): Maximum DEBUG records kept per second per message template.
+    """
+
+    def __init__(self, sample: float = 1.0, rate: int = 10):
+        super().__init__()
+        self.sample = sample
+        self.rate = rate
+        self._windows = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > logging.DEBUG:
+            return True
+
+        if self.sample < 1.0 and random.random() >= self.sample:
+            return False
+
+        # Fixed one-second windows per message template. Races between threads can
+        # only let a few extra records through.
+        second = int(time.monotonic())
+        key = (record.name, record.msg if isinstance(record.msg, str) else repr(record.msg))
+        window_second, count = self._windows.get(key, (second, 0))
+        if window_second != second:
+            window_second, count = second, 0
+        if count >= self.rate:
+            return False
+
+        if len(self._windows) > 1000:
+            self._windows.clear()
+        self._windows[key] = (window_second, count + 1)
+        return True
+
+
+# ----------------------------------------------
+#    FUNCTIONS
+# ----------------------------------------------
+
+def get_logger(name: str) -> logging.Logger:
+    """
+    Return a child of the `grocery` logger, e.g. `grocery.notifications`, whose level
+    can be set separately through `GROCERY_LOG_LEVELS`.
+    """
+    return logging.getLogger(f'{LOGGER_NAME}.{name}')
+
+def _parse_levels(spec: str) -> dict[str, str]:
+    levels = {}
+    for part in spec.split(','):
+        name, _, level = part.partition('=')
+        if name.strip() and level.strip():
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+def _start_listener() -> QueueListener:
+    stream_handler = logging.StreamHandler(sys.stderr)
+    stream_handler.setFormatter(JsonFormatter() if LOG_FORMAT == 'json' else logging.Formatter(TEXT_FORMAT))
+
+    listener = QueueListener(queue_handler.queue, stream_handler, respect_handler_level=True)
+    listener.start()
+    return listener
+
+def _restart_after_fork():
+    # The parent's listener thread does not exist in a forked child (e.g. a gunicorn
+    # worker), so the child drains a fresh queue with its own listener
+    global listener
+    queue_handler.queue = queue.SimpleQueue()
+    listener = _start_listener()
+
+def _stop_listener():
+    listener.stop()
+
+
+# ----------------------------------------------
+#    SETUP
+# ----------------------------------------------
+
+queue_handler = LazyQueueHandler(queue.SimpleQueue())
+queue_handler.addFilter(DebugSampler(DEBUG_SAMPLE, DEBUG_RATE))
+
+# Every logger, including library loggers (werkzeug, gunicorn, ...), goes through the queue
+_root = logging.getLogger()
+for _handler in list(_root.handlers):
+    _root.removeHandler(_handler)
+_root.addHandler(queue_handler)
+_root.setLevel(logging.WARNING)
+
+logger = logging.getLogger(LOGGER_NAME)
+logger.setLevel(LOG_LEVEL)
+for _name, _level in _parse_levels(LOG_LEVELS).items():
+    logging.getLogger(_name).setLevel(_level)
 
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
-logger = logging.getLogger(__name__)
\ No newline at end of file
+listener = _start_listener()
+atexit.register(_stop_listener)
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_restart_after_fork)
@@ -0,0 +1,606 @@
+"""
+Module implementing the data-access interface (see `repository.py`) in process memory.
+
+Every table is a dict keyed by its primary key, with secondary indexes for the
+lookups the routes make (username -> user, user -> lists, user -> notifications, ...).
+No I/O happens after loading, which makes the store useful for benchmarking route
+logic in isolation, and as a starting point for backing hot tables with faster stores.
+
+Units of work run one at a time under a store-wide lock. Each records an undo entry
+for every change it makes, and the entries are replayed in reverse if it raises,
+so a failed unit of work leaves no partial changes behind.
+
+The store starts empty except for the default categories, or as a copy of a SQLite
+database with `MemoryStore.load()`. Nothing is written back to disk.
+"""
+
+from bisect import bisect_left, insort
+from contextlib import contextmanager
+import sqlite3
+import threading
+
+import db
+from repository import (
+    DataStore,
+    IntegrityError,
+    ItemRepository,
+    ListContext,
+    ListRepository,
+    MembershipRepository,
+    NotificationRepository,
+    UnitOfWork,
+    UserRepository,
+    format_timestamp,
+    now_ms
+)
+
+
+# ----------------------------------------------
+#   CONSTANTS
+# ----------------------------------------------
+
+# Categories created by `generate_tables.py`, in the same order
+DEFAULT_CATEGORIES = [
+    'dairy', 'meat', 'fish/seafood', 'fruits', 'vegetables', 'canned/pantry', 'bread/bakery',
+    'pasta/grains', 'deli', 'condiments/spices', 'snacks', 'beverages', 'baking', 'frozen',
+    'prepared foods', 'personal care', 'cleaning/household items', 'pet care'
+]
+
+
+# ----------------------------------------------
+#    HELPERS
+# ----------------------------------------------
+
+# Timestamps are kept as epoch milliseconds, like the SQLite tables store them, and
+# formatted when returned
+class _ListRow:
+    __slots__ = ('name', 'creation_date', 'update_date', 'deleted_at', 'is_template', 'version')
+
+    def __init__(self, name, creation_date, update_date, deleted_at=None, is_template=False, version=0):
+        self.name = name
+        self.creation_date = creation_date
+        self.update_date = update_date
+        self.deleted_at = deleted_at
+        self.is_template = bool(is_template)
+        self.version = version
+
+class _NotificationRow:
+    __slots__ = ('user_id', 'icon', 'message', 'actionable', 'action_type', 'requested_list_id', 'unread', 'created_at', 'data')
+
+    def __init__(self, user_id, icon, message, actionable, action_type, requested_list_id, unread, created_at, data):
+        self.user_id = user_id
+        self.icon = icon
+        self.message = message
+        self.actionable = int(actionable)
+        self.action_type = action_type
+        self.requested_list_id = requested_list_id
+        self.unread = int(unread)
+        self.created_at = created_at
+        self.data = data
+
+
+# ----------------------------------------------
+#    REPOSITORIES
+# ----------------------------------------------
+
+class MemoryUserRepository(UserRepository):
+    def __init__(self, uow: 'MemoryUnitOfWork'):
+        self.uow = uow
+        self.store = uow.store
+
+    def get_credentials(self, username):
+        user_id = self.store.user_ids_by_name.get(username)
+        return (user_id, self.store.users[user_id][1]) if user_id is not None else None
+
+    def get_id(self, username):
+        return self.store.user_ids_by_name.get(username)
+
+    def create(self, username, password_hash):
+        if username in self.store.user_ids_by_name:
+            raise IntegrityError(f"Username already exists: {username}")
+
+        user_id = self.uow.next_id('users')
+        self.uow.set(self.store.users, user_id, (username, password_hash))
+        self.uow.set(self.store.user_ids_by_name, username, user_id)
+        self.uow.insort(self.store.usernames_sorted, (username.lower(), user_id))
+        return user_id
+
+    def search(self, prefix, exclude_username):
+        # Prefix range scan over the sorted, lowercased usernames
+        prefix = prefix.lower()
+        exclude = exclude_username.lower()
+        names = self.store.usernames_sorted
+        matches = []
+        for index in range(bisect_left(names, (prefix,)), len(names)):
+            lowered, user_id = names[index]
+            if not lowered.startswith(prefix):
+                break
+            if lowered != exclude:
+                matches.append((user_id, self.store.users[user_id][0]))
+        return matches
+
+class MemoryListRepository(ListRepository):
+    def __init__(self, uow: 'MemoryUnitOfWork'):
+        self.uow = uow
+        self.store = uow.store
+
+    def _active(self, list_id) -> _ListRow | None:
+        row = self.store.lists.get(list_id)
+        return row if row is not None and row.deleted_at is None else None
+
+    def _memberships(self, user_id):
+        # (list_id, role, row) of the user's lists that have not been deleted
+        for list_id in self.store.lists_by_user.get(user_id, ()):
+            row = self._active(list_id)
+            if row is not None:
+                yield list_id, self.store.members[list_id][user_id], row
+
+    def create(self, name, is_template=False):
+        list_id = self.uow.next_id('grocery_lists')
+        now = now_ms()
+        self.uow.set(self.store.lists, list_id, _ListRow(name, now, now, is_template=is_template))
+        return list_id
+
+    def get_name(self, list_id):
+        row = self._active(list_id)
+        return row.name if row else None
+
+    def get_info(self, list_id):
+        row = self._active(list_id)
+        return (row.name, format_timestamp(row.update_date)) if row else None
+
+    def context(self, list_id, user_id):
+        row = self._active(list_id)
+        members = self.store.members.get(list_id, {})
+        if row is None or user_id not in members:
+            return None
+        return ListContext(members[user_id], row.name, row.version, list(members))
+
+    def for_user(self, user_id):
+        lists = [(list_id, row.name, role, row.update_date) for list_id, role, row in self._memberships(user_id) if not row.is_template]
+        lists.sort(key=lambda l: (l[3], l[0]), reverse=True)
+        return [(list_id, name, role, format_timestamp(update_date)) for list_id, name, role, update_date in lists]
+
+    def most_recent_for_user(self, user_id):
+        lists = self.for_user(user_id)
+        return lists[0][0] if lists else None
+
+    def versions_for_user(self, user_id, list_ids=None):
+        wanted = set(list_ids) if list_ids else None
+        return sorted(
+            (list_id, row.name, row.version)
+            for list_id, _, row in self._memberships(user_id)
+            if not row.is_template and (wanted is None or list_id in wanted)
+        )
+
+    def accessible(self, user_id, list_ids):
+        accessible = []
+        for list_id in list_ids:
+            row = self._active(list_id)
+            role = self.store.members.get(list_id, {}).get(user_id)
+            if row is not None and role is not None:
+                accessible.append((list_id, role, row.name, format_timestamp(row.update_date)))
+        return accessible
+
+    def templates_for_user(self, user_id):
+        templates = [
+            (list_id, row.name, format_timestamp(row.update_date), len(self.store.list_items.get(list_id, ())))
+            for list_id, _, row in self._memberships(user_id)
+            if row.is_template
+        ]
+        templates.sort(key=lambda t: t[1])
+        return templates
+
+    def touch(self, list_id):
+        row = self.store.lists.get(list_id)
+        if row is not None:
+            self.uow.setattr(row, 'update_date', now_ms())
+            self.uow.setattr(row, 'version', row.version + 1)
+
+    def rename(self, list_id, name):
+        row = self.store.lists.get(list_id)
+        if row is not None:
+            self.uow.setattr(row, 'name', name)
+            self.touch(list_id)
+
+    def soft_delete(self, list_id):
+        # There is no background purger for this store, so the list's rows are
+        # removed right away. Nothing else is left to contend with for locks.
+        if list_id not in self.store.lists:
+            return
+
+        for user_id in list(self.store.members.get(list_id, ())):
+            self.uow.pop(self.store.lists_by_user.get(user_id, {}), list_id)
+        self.uow.pop(self.store.members, list_id)
+        self.uow.pop(self.store.list_items, list_id)
+        for notification_id in list(self.store.notifications_by_list.get(list_id, ())):
+            self.uow.delete_notification(notification_id)
+        self.uow.pop(self.store.lists, list_id)
+
+class MemoryMembershipRepository(MembershipRepository):
+    def __init__(self, uow: 'MemoryUnitOfWork'):
+        self.uow = uow
+        self.store = uow.store
+
+    def get_role(self, list_id, user_id):
+        row = self.store.lists.get(list_id)
+        if row is None or row.deleted_at is not None:
+            return None
+        return self.store.members.get(list_id, {}).get(user_id)
+
+    def add(self, list_id, user_id, role):
+        members = self.uow.child(self.store.members, list_id)
+        if user_id in members:
+            raise IntegrityError(f"User {user_id} is already a member of list {list_id}")
+
+        self.uow.set(members, user_id, role)
+        self.uow.set(self.uow.child(self.store.lists_by_user, user_id), list_id, None)
+
+    def accept_invite(self, list_id, user_id, role):
+        row = self.store.lists.get(list_id)
+        if row is not None and row.deleted_at is None and user_id not in self.store.members.get(list_id, {}):
+            self.add(list_id, user_id, role)
+
+    def remove(self, list_id, user_id):
+        if self.uow.pop(self.store.members.get(list_id, {}), user_id) is not None:
+            self.uow.pop(self.store.lists_by_user[user_id], list_id)
+
+    def set_role(self, list_id, user_id, role):
+        members = self.store.members.get(list_id, {})
+        if user_id in members:
+            self.uow.set(members, user_id, role)
+
+    def other_members(self, list_id, user_id):
+        return [(u_id, role) for u_id, role in self.store.members.get(list_id, {}).items() if u_id != user_id]
+
+    def other_member_ids(self, list_id, user_id):
+        return [u_id for u_id in self.store.members.get(list_id, ()) if u_id != user_id]
+
+    def other_members_of_lists(self, list_ids, user_id):
+        users = self.store.users
+        return [
+            (list_id, u_id, users[u_id][0], role)
+            for list_id in list_ids
+            for u_id, role in self.store.members.get(list_id, {}).items()
+            if u_id != user_id and u_id in users
+        ]
+
+    def copy(self, source_list_id, list_id, exclude_user_id):
+        for u_id, role in self.other_members(source_list_id, exclude_user_id):
+            self.add(list_id, u_id, 'admin' if role == 'owner' else role)
+
+class MemoryItemRepository(ItemRepository):
+    def __init__(self, uow: 'MemoryUnitOfWork'):
+        self.uow = uow
+        self.store = uow.store
+
+    def categories(self):
+        return [(name, category_id) for category_id, name in self.store.categories.items()]
+
+    def category_id(self, name):
+        return self.store.category_ids.get(name)
+
+    def find(self, name, category_id):
+        return self.store.item_ids_by_key.get((name, category_id))
+
+    def create(self, name, category_id):
+        item_id = self.uow.next_id('items')
+        self.uow.set(self.store.items, item_id, (name, category_id))
+        if (name, category_id) not in self.store.item_ids_by_key:
+            self.uow.set(self.store.item_ids_by_key, (name, category_id), item_id)
+        return item_id
+
+    def get_name(self, item_id):
+        item = self.store.items.get(item_id)
+        return item[0] if item else None
+
+    def created_after(self, item_id):
+        # Item IDs are assigned in increasing order, so the dict is already sorted
+        return [(i_id, name, category_id) for i_id, (name, category_id) in self.store.items.items() if i_id > item_id]
+
+    def on_list(self, list_id):
+        return list(self.store.list_items.get(list_id, {}).items())
+
+    def on_lists(self, list_ids):
+        return [
+            (list_id, item_id, quantity)
+            for list_id in sorted(list_ids)
+            for item_id, quantity in self.store.list_items.get(list_id, {}).items()
+        ]
+
+    def add_to_list(self, list_id, item_id, quantity):
+        items = self.uow.child(self.store.list_items, list_id)
+        if item_id in items:
+            raise IntegrityError(f"Item {item_id} is already on list {list_id}")
+        self.uow.set(items, item_id, quantity)
+
+    def add_many_to_list(self, list_id, items):
+        for item_id, quantity in items:
+            self.add_to_list(list_id, item_id, quantity)
+
+    def set_quantity(self, list_id, item_id, quantity):
+        items = self.store.list_items.get(list_id, {})
+        if item_id in items:
+            self.uow.set(items, item_id, quantity)
+
+    def remove_from_list(self, list_id, item_id):
+        self.uow.pop(self.store.list_items.get(list_id, {}), item_id)
+
+    def copy_list(self, source_list_id, list_id, reset_quantities=False):
+        for item_id, quantity in self.on_list(source_list_id):
+            self.add_to_list(list_id, item_id, 1 if reset_quantities else quantity)
+
+    def totals_for_lists(self, list_ids):
+        totals = {}
+        for list_id in list_ids:
+            for item_id, quantity in self.store.list_items.get(list_id, {}).items():
+                entry = totals.setdefault(item_id, [0, []])
+                entry[0] += quantity
+                entry[1].append((list_id, quantity))
+
+        rows = []
+        for item_id, (quantity, provenance) in totals.items():
+            name, category_id = self.store.items[item_id]
+            category = self.store.categories.get(category_id)
+            if category is not None:
+                rows.append((category, item_id, name, quantity, provenance))
+        rows.sort(key=lambda r: (r[0], r[2]))
+        return rows
+
+class MemoryNotificationRepository(NotificationRepository):
+    def __init__(self, uow: 'MemoryUnitOfWork'):
+        self.uow = uow
+        self.store = uow.store
+
+    def create(self, user_id, message, icon, actionable, action_type, requested_list_id, unread, data):
+        notification_id = self.uow.next_id('notifications')
+        row = _NotificationRow(user_id, icon, message, actionable, action_type, requested_list_id, unread, now_ms(), data)
+        self.uow.set(self.store.notifications, notification_id, row)
+        self.uow.set(self.uow.child(self.store.notifications_by_user, user_id), notification_id, None)
+        if requested_list_id is not None:
+            self.uow.set(self.uow.child(self.store.notifications_by_list, requested_list_id), notification_id, None)
+        return notification_id
+
+    def for_user(self, user_id, limit, after_id=None):
+        notifications = self.store.notifications
+        lists = self.store.lists
+        rows = []
+        for n_id in self.store.notifications_by_user.get(user_id, ()):
+            if n_id <= (after_id or 0):
+                continue
+            n = notifications[n_id]
+            # Hide notifications for lists awaiting purge
+            if n.requested_list_id is not None and n.requested_list_id in lists and lists[n.requested_list_id].deleted_at is not None:
+                continue
+            rows.append((n_id, n.icon, n.message, n.actionable, n.action_type, n.requested_list_id, n.unread, n.created_at, n.data))
+
+        rows.sort(key=lambda r: (r[6], r[7], r[0]), reverse=True)
+        return [(*row[:7], format_timestamp(row[7]), row[8]) for row in rows[:limit]]
+
+    def mark_read(self, notification_ids):
+        for n_id in notification_ids:
+            row = self.store.notifications.get(n_id)
+            if row is not None:
+                self.uow.setattr(row, 'unread', 0)
+
+    def delete(self, notification_ids):
+        for n_id in notification_ids:
+            self.uow.delete_notification(n_id)
+
+
+# ----------------------------------------------
+#    UNIT OF WORK
+# ----------------------------------------------
+
+class MemoryUnitOfWork(UnitOfWork):
+    """
+    Repositories over a `MemoryStore`, recording an undo entry for every change.
+
+    Args:
+        store (MemoryStore): The store, whose lock the caller holds.
+    """
+
+    def __init__(self, store: 'MemoryStore'):
+        self.store = store
+        self._undo = []
+        self.users = MemoryUserRepository(self)
+        self.lists = MemoryListRepository(self)
+        self.memberships = MemoryMembershipRepository(self)
+        self.items = MemoryItemRepository(self)
+        self.notifications = MemoryNotificationRepository(self)
+
+    def snapshot(self):
+        # The store lock is held for the whole unit of work, so reads are already consistent
+        pass
+
+    def pending_migrations(self):
+        return 0
+
+    def rollback(self):
+        """
+        Undo every change made in this unit of work, newest first.
+        """
+        while self._undo:
+            self._undo.pop()()
+
+    # Primitive changes used by the repositories
+
+    def set(self, mapping: dict, key, value):
+        if key in mapping:
+            old = mapping[key]
+            self._undo.append(lambda: mapping.__setitem__(key, old))
+        else:
+            self._undo.append(lambda: mapping.pop(key, None))
+        mapping[key] = value
+
+    def pop(self, mapping: dict, key):
+        if key not in mapping:
+            return None
+        old = mapping.pop(key)
+        self._undo.append(lambda: mapping.__setitem__(key, old))
+        return old
+
+    def child(self, mapping: dict, key) -> dict:
+        # Return `mapping[key]`, creating it as an empty dict if needed
+        if key not in mapping:
+            self.set(mapping, key, {})
+        return mapping[key]
+
+    def setattr(self, obj, name: str, value):
+        old = getattr(obj, name)
+        self._undo.append(lambda: setattr(obj, name, old))
+        setattr(obj, name, value)
+
+    def insort(self, sorted_list: list, value):
+        insort(sorted_list, value)
+        self._undo.append(lambda: sorted_list.remove(value))
+
+    def next_id(self, table: str) -> int:
+        # Like AUTOINCREMENT, IDs are never reused, except when the unit of work is rolled back
+        next_ids = self.store.next_ids
+        self.set(next_ids, table, next_ids.get(table, 1) + 1)
+        return next_ids[table] - 1
+
+    def delete_notification(self, notification_id: int):
+        row = self.pop(self.store.notifications, notification_id)
+        if row is None:
+            return
+        self.pop(self.store.notifications_by_user.get(row.user_id, {}), notification_id)
+        if row.requested_list_id is not None:
+            self.pop(self.store.notifications_by_list.get(row.requested_list_id, {}), notification_id)
+
+class MemoryStore(DataStore):
+    """
+    Application data held in dicts and indexes in process memory.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+
+        self.users: dict[int, tuple[str, bytes]] = {}
+        self.user_ids_by_name: dict[str, int] = {}
+        self.usernames_sorted: list[tuple[str, int]] = []
+
+        self.categories: dict[int, str] = {}
+        self.category_ids: dict[str, int] = {}
+        self.items: dict[int, tuple[str, int | None]] = {}
+        self.item_ids_by_key: dict[tuple[str, int | None], int] = {}
+
+        self.lists: dict[int, _ListRow] = {}
+        self.members: dict[int, dict[int, str]] = {}
+        self.lists_by_user: dict[int, dict[int, None]] = {}
+        self.list_items: dict[int, dict[int, int]] = {}
+
+        self.notifications: dict[int, _NotificationRow] = {}
+        self.notifications_by_user: dict[int, dict[int, None]] = {}
+        self.notifications_by_list: dict[int, dict[int, None]] = {}
+
+        self.next_ids: dict[str, int] = {}
+
+    @classmethod
+    def empty(cls) -> 'MemoryStore':
+        """
+        Create a store holding only the default categories.
+        """
+        store = cls()
+        for category_id, name in enumerate(DEFAULT_CATEGORIES, start=1):
+            store.categories[category_id] = name
+            store.category_ids[name] = category_id
+        store.next_ids['categories'] = len(DEFAULT_CATEGORIES) + 1
+        return store
+
+    @classmethod
+    def load(cls, path: str, notifications_path: str | None = None, partitions: int = 0) -> 'MemoryStore':
+        """
+        Create a store holding a copy of a SQLite database's data.
+
+        Lists awaiting purge are skipped.
+
+        Args:
+            path (str): Path to a database with the current schema.
+            notifications_path (str | None, optional): Path to a separate notifications
+                database, if notifications were moved out of `path`. Defaults to None.
+            partitions (int, optional): Number of list partitions, if the list tables were
+                split out of `path` (see `db.partition_path()`). Defaults to 0.
+        """
+        store = cls()
+        conn = sqlite3.connect(path)
+        try:
+            if notifications_path:
+                # `notifications` then resolves to the attached database's table
+                conn.execute('ATTACH DATABASE ? AS notifications_db', (notifications_path,))
+
+            list_sequence = 0
+            if partitions:
+                # The list tables then resolve to views over every partition's tables
+                for partition in range(partitions):
+                    conn.execute(f'ATTACH DATABASE ? AS p{partition}', (db.partition_path(partition),))
+                    row = conn.execute(f"SELECT seq FROM p{partition}.sqlite_sequence WHERE name = 'grocery_lists'").fetchone()
+                    list_sequence = max(list_sequence, row[0] if row else 0)
+                for table in ('grocery_lists', 'grocery_list_users', 'grocery_list_items'):
+                    union = ' UNION ALL '.join(f'SELECT * FROM p{partition}.{table}' for partition in range(partitions))
+                    conn.execute(f'CREATE TEMP VIEW {table} AS {union}')
+
+            for user_id, username, password_hash in conn.execute('SELECT user_id, username, password_hash FROM users'):
+                store.users[user_id] = (username, password_hash)
+                store.user_ids_by_name[username] = user_id
+                store.usernames_sorted.append((username.lower(), user_id))
+            store.usernames_sorted.sort()
+
+            for category_id, name in conn.execute('SELECT category_id, name FROM categories'):
+                store.categories[category_id] = name
+                store.category_ids[name] = category_id
+
+            for item_id, name, category_id in conn.execute('SELECT item_id, name, category_id FROM items ORDER BY item_id'):
+                store.items[item_id] = (name, category_id)
+                store.item_ids_by_key.setdefault((name, category_id), item_id)
+
+            for list_id, *fields in conn.execute('''
+                SELECT list_id, name, creation_date, update_date, deleted_at, is_template, version
+                FROM grocery_lists
+                WHERE deleted_at IS NULL
+            '''):
+                store.lists[list_id] = _ListRow(*fields)
+
+            for list_id, user_id, role in conn.execute('SELECT list_id, user_id, role FROM grocery_list_users'):
+                if list_id in store.lists:
+                    store.members.setdefault(list_id, {})[user_id] = role
+                    store.lists_by_user.setdefault(user_id, {})[list_id] = None
+
+            for list_id, item_id, quantity in conn.execute('SELECT list_id, item_id, quantity FROM grocery_list_items'):
+                if list_id in store.lists:
+                    store.list_items.setdefault(list_id, {})[item_id] = quantity
+
+            for n_id, user_id, *fields in conn.execute('''
+                SELECT id, user_id, icon, message, actionable, action_type, requested_list_id, unread, created_at, data
+                FROM notifications
+                ORDER BY id
+            '''):
+                row = _NotificationRow(user_id, *fields)
+                store.notifications[n_id] = row
+                store.notifications_by_user.setdefault(user_id, {})[n_id] = None
+                if row.requested_list_id is not None:
+                    store.notifications_by_list.setdefault(row.requested_list_id, {})[n_id] = None
+
+            # Continue from the AUTOINCREMENT sequences, so IDs of deleted rows are not reused either
+            sequences = dict(conn.execute('SELECT name, seq FROM sqlite_sequence').fetchall())
+            sequences['grocery_lists'] = max(sequences.get('grocery_lists', 0), list_sequence)
+        finally:
+            conn.close()
+
+        for table, rows in (('users', store.users), ('categories', store.categories), ('items', store.items),
+                            ('grocery_lists', store.lists), ('notifications', store.notifications)):
+            store.next_ids[table] = max(sequences.get(table, 0), max(rows, default=0)) + 1
+
+        return store
+
+    @contextmanager
+    def unit_of_work(self, readonly=False, notifications_only=False):
+        # Units of work are serialized, so read-only ones need no special handling
+        with self._lock:
+            uow = MemoryUnitOfWork(self)
+            try:
+                yield uow
+            except BaseException:
+                uow.rollback()
+                raise
@@ -0,0 +1,405 @@
+"""
+Module for request and SQL metrics, exposed in Prometheus text format at `/metrics`.
+
+Recorded per route (the URL rule, e.g. `/list/get_list_data`) and method:
+    - request counts by status code and latency histograms,
+    - requests currently in flight,
+    - SQL statements executed and time spent in SQLite, per request,
+    - time spent decoding request bodies (see `schemas.validate_body`),
+    - read-only connection pool usage and read snapshot ages (see `db.read_pool`),
+    - units of work per group commit, commit time, and waits and retries on the
+      database lock (see `writer.py`),
+    - WAL size and checkpoint progress, read from the WAL index without checkpointing
+      (see `db.wal_status()`). Frames a checkpoint cannot copy are held back by readers
+      on older snapshots; `grocery_sqlite_checkpoint_starved` is set while more frames
+      are waiting than SQLite's autocheckpoint lets accumulate.
+    - online backups taken and their duration (see `backup.py`).
+
+Counters are sharded per thread: each thread only ever writes to its own shard,
+so recording a sample takes no lock. A scrape sums all shards. Shards of threads that
+have exited (threaded Werkzeug starts one per request) are folded into a single retired
+shard, so the number of shards stays bounded by the number of live threads.
+
+Each server process keeps its own metrics. With several gunicorn or uvicorn workers,
+every scrape reports the worker that served it; label series by instance or scrape
+each worker directly.
+"""
+
+from bisect import bisect_left
+import os
+import threading
+import time
+import weakref
+
+from flask import Flask, g, request
+
+import db
+
+
+# ----------------------------------------------
+#   CONSTANTS
+# ----------------------------------------------
+
+# Upper bounds (seconds) of the latency histogram buckets
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Upper bounds of the statements-per-request histogram buckets
+SQL_STATEMENT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+# Frames after which SQLite's autocheckpoint copies the WAL into the database (its default);
+# more frames waiting than this means readers hold checkpoints back
+AUTOCHECKPOINT_FRAMES = 1000
+
+# Fewest shards at which registering a thread sweeps the shards of exited threads
+MIN_SWEEP_SHARDS = 64
+
+# Route label for requests that matched no route, keeping label cardinality bounded
+UNMATCHED_ROUTE = '<unmatched>'
+
+METRIC_HELP = {
+    'grocery_http_requests_total': ('counter', 'HTTP requests served, by route, method and status.'),
+    'grocery_http_requests_in_flight': ('gauge', 'HTTP requests currently being served.'),
+    'grocery_http_request_duration_seconds': ('histogram', 'HTTP request latency in seconds.'),
+    'grocery_http_request_sql_statements': ('histogram', 'SQL statements executed per HTTP request.'),
+    'grocery_sql_statements_total': ('counter', 'SQL statements executed, by route.'),
+    'grocery_sql_duration_seconds_total': ('counter', 'Time spent executing SQL statements, by route.'),
+    'grocery_request_decode_seconds_total': ('counter', 'Time spent decoding and validating request bodies, by route.'),
+    'grocery_item_catalog_items': ('gauge', 'Items held in the in-process item catalog.'),
+    'grocery_item_catalog_bytes': ('gauge', 'Approximate memory used by the in-process item catalog.'),
+    'grocery_sqlite_read_connections': ('gauge', 'Read-only SQLite connections in the pool, by state.'),
+    'grocery_sqlite_read_connections_opened_total': ('counter', 'Read-only SQLite connections opened.'),
+    'grocery_sqlite_read_snapshots_total': ('counter', 'Read snapshots taken by read-only units of work.'),
+    'grocery_sqlite_read_snapshot_seconds_total': ('counter', 'Time read snapshots were held, summed.'),
+    'grocery_sqlite_oldest_read_snapshot_seconds': ('gauge', 'Age of the oldest read snapshot still held.'),
+    'grocery_sqlite_wal_bytes': ('gauge', 'Size of the WAL file.'),
+    'grocery_sqlite_wal_frames': ('gauge', 'Frames in the WAL.'),
+    'grocery_sqlite_wal_checkpointed_frames': ('gauge', 'WAL frames already copied into the database.'),
+    'grocery_sqlite_checkpoint_starved': ('gauge', 'Whether readers hold WAL frames back from checkpoints beyond the autocheckpoint threshold.'),
+    'grocery_write_batch_size': ('histogram', 'Write units of work committed per transaction, by database.'),
+    'grocery_write_commit_seconds': ('histogram', 'Time taken by group commits, by database.'),
+    'grocery_write_lock_wait_seconds': ('histogram', 'Time spent waiting for the database lock, by database and stage (begin or commit).'),
+    'grocery_write_lock_retries_total': ('counter', 'Attempts to take the database lock that found it busy, by database and stage.'),
+    'grocery_write_lock_timeouts_total': ('counter', 'Write units of work that gave up waiting for the database lock, by database and stage.'),
+    'grocery_notifications_dropped_total': ('counter', 'Queued notification changes that could not be written to the separate notifications database.'),
+    'grocery_http_busy_retries_total': ('counter', 'Idempotent requests run again after the database stayed busy, by route.'),
+    'grocery_backups_total': ('counter', 'Online database backups taken, by result (ok or error).'),
+    'grocery_backup_seconds': ('histogram', 'Time taken by successful online backups, including compression.'),
+}
+
+
+# ----------------------------------------------
+#    CLASSES
+# ----------------------------------------------
+
+class _Shard:
+    """
+    Metric values written by a single thread.
+    """
+
+    __slots__ = ('counters', 'histograms', 'thread')
+
+    def __init__(self, thread: threading.Thread | None = None):
+        # (name, labels) -> float
+        self.counters = {}
+        # (name, labels) -> [bucket counts..., +Inf count, sum]
+        self.histograms = {}
+        # Weak reference to the owning thread, so the shard does not keep it alive
+        self.thread = weakref.ref(thread) if thread is not None else None
+
+    def is_live(self) -> bool:
+        thread = self.thread()
+        return thread is not None and thread.is_alive()
+
+    def merge_into(self, other: '_Shard'):
+        """
+        Add this shard's values to `other`.
+        """
+        for key, value in self.counters.items():
+            other.counters[key] = other.counters.get(key, 0) + value
+        for key, counts in self.histograms.items():
+            total = other.histograms.get(key)
+            other.histograms[key] = list(counts) if total is None else [a + b for a, b in zip(total, counts)]
+
+class MetricsRegistry:
+    """
+    Thread-sharded registry of counters, gauges and histograms.
+
+    Labels are passed as a tuple of `(name, value)` pairs, in a fixed order per metric.
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+        self._shards = []
+        self._shards_lock = threading.Lock()
+        # Values of threads that have exited, merged by `_retire_dead_shards()`
+        self._retired = _Shard()
+        # Shard count at which registering a new thread triggers a sweep
+        self._sweep_at = MIN_SWEEP_SHARDS
+        self._buckets = {}
+
+    def _shard(self) -> _Shard:
+        try:
+            return self._local.shard
+        except AttributeError:
+            # Only taken once per thread
+            shard = self._local.shard = _Shard(threading.current_thread())
+            with self._shards_lock:
+                self._shards.append(shard)
+                if len(self._shards) >= self._sweep_at:
+                    self._retire_dead_shards()
+            return shard
+
+    def _retire_dead_shards(self):
+        # Caller must hold `self._shards_lock`. A thread that has exited never writes
+        # to its shard again, so its values can be moved to the retired shard safely.
+        live = []
+        for shard in self._shards:
+            if shard.is_live():
+                live.append(shard)
+            else:
+                shard.merge_into(self._retired)
+        self._shards = live
+        # Sweep again once the live count doubles, so registration stays amortized O(1)
+        self._sweep_at = max(MIN_SWEEP_SHARDS, 2 * len(live))
+
+    def inc(self, name: str, labels: tuple = (), value: float = 1):
+        """
+        Add `value` to a counter, or to a gauge when `value` is negative.
+        """
+        counters = self._shard().counters
+        key = (name, labels)
+        counters[key] = counters.get(key, 0) + value
+
+    def observe(self, name: str, labels: tuple, value: float, buckets: tuple):
+        """
+        Record `value` in a histogram with the given bucket upper bounds.
+        """
+        histograms = self._shard().histograms
+        key = (name, labels)
+        counts = histograms.get(key)
+        if counts is None:
+            counts = histograms[key] = [0] * (len(buckets) + 2)
+            self._buckets[name] = buckets
+        counts[bisect_left(buckets, value)] += 1
+        counts[-1] += value
+
+    def collect(self) -> tuple[dict, dict]:
+        """
+        Sum all shards.
+
+        Returns:
+            tuple[dict, dict]: Counters and histograms, keyed by `(name, labels)`.
+        """
+        counters, histograms = {}, {}
+        with self._shards_lock:
+            self._retire_dead_shards()
+            shards = list(self._shards)
+            # The retired shard is only written under the lock, so copy it here
+            counters.update(self._retired.counters)
+            histograms.update({key: list(counts) for key, counts in self._retired.histograms.items()})
+
+        for shard in shards:
+            # Copying items is atomic under the GIL, even while the owning thread writes
+            for key, value in list(shard.counters.items()):
+                counters[key] = counters.get(key, 0) + value
+            for key, counts in list(shard.histograms.items()):
+                counts = list(counts)
+                total = histograms.get(key)
+                histograms[key] = counts if total is None else [a + b for a, b in zip(total, counts)]
+
+        return counters, histograms
+
+    def render(self, gauges: dict | None = None) -> str:
+        """
+        Render all metrics in the Prometheus text exposition format.
+
+        Args:
+            gauges (dict, optional): Extra point-in-time gauge values, keyed by `(name, labels)`.
+
+        Returns:
+            str: The exposition text.
+        """
+        counters, histograms = self.collect()
+        counters.update(gauges or {})
+
+        # Lines of each metric, grouped by label set
+        by_name = {}
+        for (name, labels), value in counters.items():
+            by_name.setdefault(name, []).append((labels, [f"{name}{_format_labels(labels)} {_format_value(value)}"]))
+
+        for (name, labels), counts in histograms.items():
+            # Buckets in increasing `le` order, then `_sum` and `_count`, as the format requires
+            lines = []
+            cumulative = 0
+            for bound, count in zip(self._buckets[name] + ('+Inf',), counts):
+                cumulative += count
+                lines.append(f"{name}_bucket{_format_labels(labels + (('le', _format_value(bound)),))} {cumulative}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(counts[-1])}")
+            lines.append(f"{name}_count{_format_labels(labels)} {cumulative}")
+            by_name.setdefault(name, []).append((labels, lines))
+
+        output = []
+        for name in sorted(by_name):
+            kind, help_text = METRIC_HELP.get(name, ('untyped', ''))
+            output.append(f"# HELP {name} {help_text}")
+            output.append(f"# TYPE {name} {kind}")
+            # Only label sets are sorted; lines within a set keep their order
+            for _, lines in sorted(by_name[name], key=lambda group: [(k, str(v)) for k, v in group[0]]):
+                output.extend(lines)
+
+        return '\n'.join(output) + '\n'
+
+
+# ----------------------------------------------
+#    REGISTRY AND SQL TRACKING
+# ----------------------------------------------
+
+metrics = MetricsRegistry()
+
+# SQL statements executed by the request currently handled on this thread
+_request_sql = threading.local()
+
+def _format_labels(labels: tuple) -> str:
+    if not labels:
+        return ''
+    pairs = (
+        f'{k}="' + str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') + '"'
+        for k, v in labels
+    )
+    return '{' + ','.join(pairs) + '}'
+
+def _format_value(value) -> str:
+    if isinstance(value, str):
+        return value
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+def _record_statement(sql, parameters, seconds, conn):
+    _request_sql.count = getattr(_request_sql, 'count', 0) + 1
+    _request_sql.seconds = getattr(_request_sql, 'seconds', 0.0) + seconds
+
+def reset_sql_stats():
+    """
+    Start counting SQL statements for a new unit of work on this thread.
+    """
+    _request_sql.count = 0
+    _request_sql.seconds = 0.0
+
+def add_sql_stats(count: int, seconds: float):
+    """
+    Count statements executed on another thread on behalf of this thread's unit of work.
+    """
+    _request_sql.count = getattr(_request_sql, 'count', 0) + count
+    _request_sql.seconds = getattr(_request_sql, 'seconds', 0.0) + seconds
+
+def sql_stats() -> tuple[int, float]:
+    """
+    Return the statements executed, and seconds spent in them, on this thread since `reset_sql_stats()`.
+    """
+    return getattr(_request_sql, 'count', 0), getattr(_request_sql, 'seconds', 0.0)
+
+db.add_statement_observer(_record_statement)
+
+
+# ----------------------------------------------
+#    FUNCTIONS
+# ----------------------------------------------
+
+def request_started():
+    """
+    Mark a request as in flight. Pair with `request_finished()`.
+    """
+    metrics.inc('grocery_http_requests_in_flight')
+
+def request_finished(route: str, method: str, status: int, seconds: float,
+                     sql_count: int = 0, sql_seconds: float = 0.0, decode_seconds: float | None = None):
+    """
+    Record a completed request.
+
+    Args:
+        route (str): The matched route pattern.
+        method (str): The HTTP method.
+        status (int): The response status code.
+        seconds (float): Total time taken to handle the request.
+        sql_count (int, optional): SQL statements executed for the request.
+        sql_seconds (float, optional): Time spent executing them.
+        decode_seconds (float | None, optional): Time spent decoding the request body, if any.
+    """
+    labels = (('route', route), ('method', method))
+
+    metrics.inc('grocery_http_requests_in_flight', value=-1)
+    metrics.inc('grocery_http_requests_total', labels + (('status', status),))
+    metrics.observe('grocery_http_request_duration_seconds', labels, seconds, LATENCY_BUCKETS)
+    metrics.observe('grocery_http_request_sql_statements', labels, sql_count, SQL_STATEMENT_BUCKETS)
+    metrics.inc('grocery_sql_statements_total', labels, sql_count)
+    metrics.inc('grocery_sql_duration_seconds_total', labels, sql_seconds)
+    if decode_seconds is not None:
+        metrics.inc('grocery_request_decode_seconds_total', labels, decode_seconds)
+
+def _sqlite_gauges() -> dict:
+    pool_stats = db.read_pool.stats()
+    gauges = {
+        ('grocery_sqlite_read_connections', (('state', 'idle'),)): pool_stats['idle'],
+        ('grocery_sqlite_read_connections', (('state', 'in_use'),)): pool_stats['in_use'],
+        ('grocery_sqlite_read_connections_opened_total', ()): pool_stats['opened'],
+        ('grocery_sqlite_read_snapshots_total', ()): pool_stats['snapshots'],
+        ('grocery_sqlite_read_snapshot_seconds_total', ()): pool_stats['snapshot_seconds'],
+        ('grocery_sqlite_oldest_read_snapshot_seconds', ()): pool_stats['oldest_snapshot_seconds'],
+    }
+
+    wal_path = db.DB_PATH + '-wal'
+    if os.path.exists(wal_path):
+        gauges[('grocery_sqlite_wal_bytes', ())] = os.path.getsize(wal_path)
+
+    status = db.wal_status()
+    if status is not None:
+        wal_frames, checkpointed = status
+        gauges[('grocery_sqlite_wal_frames', ())] = wal_frames
+        gauges[('grocery_sqlite_wal_checkpointed_frames', ())] = checkpointed
+        gauges[('grocery_sqlite_checkpoint_starved', ())] = int(wal_frames - checkpointed > AUTOCHECKPOINT_FRAMES)
+
+    return gauges
+
+def render_metrics() -> str:
+    """
+    Render all metrics, including item catalog and SQLite gauges, for the `/metrics` endpoint.
+    """
+    from catalog import item_catalog
+
+    catalog_stats = item_catalog.stats()
+    return metrics.render({
+        ('grocery_item_catalog_items', ()): catalog_stats['items'],
+        ('grocery_item_catalog_bytes', ()): catalog_stats['bytes'],
+        **_sqlite_gauges(),
+    })
+
+def init_metrics(app: Flask):
+    """
+    Register request hooks on `app` that record metrics for every request.
+    """
+    @app.before_request
+    def start_request_metrics():
+        g.metrics_start = time.perf_counter()
+        reset_sql_stats()
+        request_started()
+
+    @app.teardown_request
+    def finish_request_metrics(exc):
+        # `g.metrics_status` is unset if the request failed before a response was built
+        if 'metrics_start' not in g:
+            return
+
+        sql_count, sql_seconds = sql_stats()
+        request_finished(
+            route=request.url_rule.rule if request.url_rule else UNMATCHED_ROUTE,
+            method=request.method,
+            status=g.get('metrics_status', 500),
+            seconds=time.perf_counter() - g.metrics_start,
+            sql_count=sql_count,
+            sql_seconds=sql_seconds,
+            decode_seconds=g.get('decode_seconds')
+        )
+
+    @app.after_request
+    def capture_status(response):
+        g.metrics_status = response.status_code
+        return response
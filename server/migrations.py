@@ -0,0 +1,571 @@
+"""
+Module for upgrading existing databases to the current schema.
+
+Each migration is idempotent and checks the current schema before changing it, so
+it is safe to run against databases created by either `generate_tables.py` or an
+older version of the app. Applied migrations are tracked with `PRAGMA user_version`.
+"""
+
+import re
+import sqlite3
+
+import db
+from db import enable_wal
+from logger import get_logger
+
+logger = get_logger('migrations')
+
+
+# ----------------------------------------------
+#   CONSTANTS
+# ----------------------------------------------
+
+# The current time in milliseconds since the Unix epoch, the default of the timestamp
+# columns (`unixepoch('subsec')` needs SQLite 3.42)
+EPOCH_MS_NOW = "CAST((julianday('now') - 2440587.5) * 86400000 AS INTEGER)"
+
+# Schema of a separate notifications database (see `db.NOTIFICATIONS_DB_PATH`). Foreign
+# keys cannot reference another file; notifications about purged lists are deleted by
+# the list purger instead.
+NOTIFICATIONS_DDL = (
+    f'''
+    CREATE TABLE IF NOT EXISTS notifications (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL,
+        icon TEXT CHECK(icon IN ('none', 'invite', 'edit', 'delete')) DEFAULT 'none',
+        message TEXT NOT NULL,
+        actionable BOOLEAN NOT NULL DEFAULT 0,
+        action_type TEXT CHECK(action_type IN ('join_list_request') OR action_type IS NULL),
+        requested_list_id INTEGER,
+        unread BOOLEAN NOT NULL DEFAULT 1,
+        created_at INTEGER DEFAULT ({EPOCH_MS_NOW}),
+        read_at TIMESTAMP DEFAULT NULL,
+        data TEXT DEFAULT NULL
+    )
+    ''',
+    '''
+    CREATE INDEX IF NOT EXISTS idx_notifications_requested_list_id
+    ON notifications (requested_list_id)
+    WHERE requested_list_id IS NOT NULL
+    ''',
+    '''
+    CREATE INDEX IF NOT EXISTS idx_notifications_user_id_unread_created_at
+    ON notifications (user_id, unread, created_at)
+    ''',
+)
+
+NOTIFICATION_COLUMNS = 'id, user_id, icon, message, actionable, action_type, requested_list_id, unread, created_at, read_at, data'
+
+# Schema of a list partition (see `db.LIST_PARTITIONS`). Users and items live in the
+# application database, so only the foreign keys to `grocery_lists` remain.
+PARTITION_DDL = (
+    f'''
+    CREATE TABLE IF NOT EXISTS grocery_lists (
+        list_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT,
+        creation_date INTEGER DEFAULT ({EPOCH_MS_NOW}),
+        update_date INTEGER DEFAULT ({EPOCH_MS_NOW}),
+        deleted_at INTEGER DEFAULT NULL,
+        is_template BOOLEAN NOT NULL DEFAULT 0,
+        version INTEGER NOT NULL DEFAULT 0
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS grocery_list_users (
+        list_id INTEGER,
+        user_id INTEGER,
+        role TEXT NOT NULL CHECK (role IN ('owner', 'admin', 'editor', 'viewer', 'temporary')) DEFAULT 'viewer',
+        PRIMARY KEY (list_id, user_id),
+        FOREIGN KEY (list_id) REFERENCES grocery_lists (list_id) ON DELETE CASCADE
+    ) WITHOUT ROWID
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS grocery_list_items (
+        list_id INTEGER,
+        item_id INTEGER,
+        quantity INTEGER NOT NULL,
+        PRIMARY KEY (list_id, item_id),
+        FOREIGN KEY (list_id) REFERENCES grocery_lists (list_id) ON DELETE CASCADE
+    ) WITHOUT ROWID
+    ''',
+    '''
+    CREATE INDEX IF NOT EXISTS idx_grocery_lists_deleted_at
+    ON grocery_lists (deleted_at)
+    WHERE deleted_at IS NOT NULL
+    ''',
+    # A user's lists are looked up in every partition holding any of them
+    '''
+    CREATE INDEX IF NOT EXISTS idx_grocery_list_users_user_id
+    ON grocery_list_users (user_id)
+    ''',
+)
+
+# Tables of the application database once the list tables are partitioned: the
+# partition count, and for each user, the partitions holding lists they are a member of
+DIRECTORY_DDL = (
+    '''
+    CREATE TABLE IF NOT EXISTS list_partitioning (
+        partitions INTEGER NOT NULL
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS user_partitions (
+        user_id INTEGER NOT NULL,
+        partition_id INTEGER NOT NULL,
+        PRIMARY KEY (user_id, partition_id)
+    ) WITHOUT ROWID
+    ''',
+)
+
+# Tables moved to the list partitions, children first
+LIST_TABLES = ('grocery_list_items', 'grocery_list_users', 'grocery_lists')
+
+# Columns stored as milliseconds since the Unix epoch, by table
+TIMESTAMP_COLUMNS = {
+    'grocery_lists': ('creation_date', 'update_date'),
+    'notifications': ('created_at',),
+}
+
+# Tables keyed by a composite primary key and stored without a rowid
+COMPACT_TABLES = ('grocery_list_items', 'grocery_list_users')
+
+
+# ----------------------------------------------
+#    HELPERS
+# ----------------------------------------------
+
+def _columns(cur: sqlite3.Cursor, table: str) -> set[str]:
+    return {row[1] for row in cur.execute(f'PRAGMA table_info({table})').fetchall()}
+
+def _table_exists(cur: sqlite3.Cursor, table: str) -> bool:
+    return cur.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)).fetchone() is not None
+
+def _table_sql(cur: sqlite3.Cursor, table: str) -> str:
+    return cur.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)).fetchone()[0]
+
+def _rebuild_table(cur: sqlite3.Cursor, table: str, sql: str, select: dict[str, str], where: str = '1'):
+    """
+    Recreate `table` as defined by `sql`, copying its rows and keeping its indexes and
+    AUTOINCREMENT sequence.
+
+    `PRAGMA foreign_keys` must be off (the default), or dropping a parent table would
+    delete the rows referencing it.
+
+    Args:
+        cur (sqlite3.Cursor): Cursor in the migration's transaction.
+        table (str): Name of the table.
+        sql (str): The table's new `CREATE TABLE` statement, as stored in `sqlite_master`.
+        select (dict[str, str]): SQL expression for each column of the new table, over the old one.
+        where (str, optional): Condition on the rows to copy. Defaults to all rows.
+    """
+    if cur.execute('PRAGMA foreign_keys').fetchone()[0]:
+        raise RuntimeError(f"Cannot rebuild {table} with PRAGMA foreign_keys enabled")
+
+    sql, renamed = re.subn(rf'^CREATE TABLE\s+"?{table}"?', f'CREATE TABLE {table}_new', sql, count=1)
+    if not renamed:
+        raise RuntimeError(f"Unexpected definition of {table}: {sql}")
+
+    indexes = [row[0] for row in cur.execute(
+        "SELECT sql FROM sqlite_master WHERE type = 'index' AND tbl_name = ? AND sql IS NOT NULL", (table,)
+    ).fetchall()]
+    sequence = None
+    if _table_exists(cur, 'sqlite_sequence'):
+        sequence = cur.execute('SELECT seq FROM sqlite_sequence WHERE name = ?', (table,)).fetchone()
+
+    cur.execute(sql)
+    cur.execute(f'''
+        INSERT INTO {table}_new ({', '.join(select)})
+        SELECT {', '.join(select.values())}
+        FROM {table}
+        WHERE {where}
+    ''')
+    cur.execute(f'DROP TABLE {table}')
+    cur.execute(f'ALTER TABLE {table}_new RENAME TO {table}')
+    for index in indexes:
+        cur.execute(index)
+
+    # IDs of deleted rows are not reused either
+    if sequence:
+        cur.execute('UPDATE sqlite_sequence SET seq = max(seq, ?) WHERE name = ?', (sequence[0], table))
+        cur.execute('''
+            INSERT INTO sqlite_sequence (name, seq)
+            SELECT ?, ?
+            WHERE NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = ?)
+        ''', (table, sequence[0], table))
+
+def _apply(conn: sqlite3.Connection, migrations: list, name: str = 'main'):
+    # Each migration runs in its own transaction, together with the `user_version` bump
+    cur = conn.cursor()
+    version = cur.execute('PRAGMA user_version').fetchone()[0]
+
+    for index, migration in enumerate(migrations[version:], start=version + 1):
+        with conn:
+            # DDL does not open an implicit transaction, so begin one explicitly
+            cur.execute('BEGIN')
+            migration(cur)
+            cur.execute(f'PRAGMA user_version = {index}')
+        logger.info("Applied migration %s to %s: %s", index, name, migration.__name__)
+
+
+# ----------------------------------------------
+#    MIGRATIONS
+# ----------------------------------------------
+
+def _fix_notifications_user_fk(cur: sqlite3.Cursor):
+    """
+    Rebuild `notifications` so its user foreign key references `users(user_id)`.
+
+    The original table referenced the nonexistent `users(id)`, which makes every
+    write to `notifications` fail with "foreign key mismatch" once
+    `PRAGMA foreign_keys` is enabled.
+    """
+    if not _table_exists(cur, 'notifications'):
+        return
+
+    fks = cur.execute('PRAGMA foreign_key_list(notifications)').fetchall()
+    if not any(fk[2] == 'users' and fk[4] == 'id' for fk in fks):
+        return
+
+    cur.execute('''
+        CREATE TABLE notifications_new (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            icon TEXT CHECK(icon IN ('none', 'invite', 'edit', 'delete')) DEFAULT 'none',
+            message TEXT NOT NULL,
+            actionable BOOLEAN NOT NULL DEFAULT 0,
+            action_type TEXT CHECK(action_type IN ('join_list_request') OR action_type IS NULL),
+            requested_list_id INTEGER,
+            unread BOOLEAN NOT NULL DEFAULT 1,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            read_at TIMESTAMP DEFAULT NULL,
+            data TEXT DEFAULT NULL,
+
+            FOREIGN KEY (user_id) REFERENCES users(user_id) ON DELETE CASCADE,
+            FOREIGN KEY (requested_list_id) REFERENCES grocery_lists(list_id) ON DELETE CASCADE
+        )
+    ''')
+    cur.execute('''
+        INSERT INTO notifications_new (id, user_id, icon, message, actionable, action_type, requested_list_id, unread, created_at, read_at, data)
+        SELECT id, user_id, icon, message, actionable, action_type, requested_list_id, unread, created_at, read_at, data
+        FROM notifications
+    ''')
+    cur.execute('DROP TABLE notifications')
+    cur.execute('ALTER TABLE notifications_new RENAME TO notifications')
+
+def _add_list_soft_delete(cur: sqlite3.Cursor):
+    """
+    Add `grocery_lists.deleted_at` and the indexes used by the list purger.
+    """
+    if 'deleted_at' not in _columns(cur, 'grocery_lists'):
+        cur.execute('ALTER TABLE grocery_lists ADD COLUMN deleted_at TIMESTAMP DEFAULT NULL')
+
+    cur.execute('''
+        CREATE INDEX IF NOT EXISTS idx_grocery_lists_deleted_at
+        ON grocery_lists (deleted_at)
+        WHERE deleted_at IS NOT NULL
+    ''')
+    cur.execute('''
+        CREATE INDEX IF NOT EXISTS idx_notifications_requested_list_id
+        ON notifications (requested_list_id)
+        WHERE requested_list_id IS NOT NULL
+    ''')
+
+def _add_list_templates(cur: sqlite3.Cursor):
+    """
+    Add `grocery_lists.is_template`, marking lists saved as reusable templates.
+    """
+    if 'is_template' not in _columns(cur, 'grocery_lists'):
+        cur.execute('ALTER TABLE grocery_lists ADD COLUMN is_template BOOLEAN NOT NULL DEFAULT 0')
+
+def _add_list_version(cur: sqlite3.Cursor):
+    """
+    Add `grocery_lists.version`, incremented on every change to a list's items or name.
+    """
+    if 'version' not in _columns(cur, 'grocery_lists'):
+        cur.execute('ALTER TABLE grocery_lists ADD COLUMN version INTEGER NOT NULL DEFAULT 0')
+
+
+def _integer_timestamps(cur: sqlite3.Cursor):
+    """
+    Store the `TIMESTAMP_COLUMNS` as integer milliseconds since the Unix epoch instead
+    of `YYYY-MM-DD HH:MM:SS` text, so they take at most 8 bytes instead of 19 and
+    compare as integers. The repositories still return them as text.
+
+    Applies to whichever of the tables are in the database, so it also runs on the
+    files split out of it (see `SPLIT_FILE_MIGRATIONS`).
+    """
+    for table, timestamps in TIMESTAMP_COLUMNS.items():
+        if not _table_exists(cur, table):
+            continue
+
+        columns = {row[1]: row[2] for row in cur.execute(f'PRAGMA table_info({table})').fetchall()}
+        stale = [column for column in timestamps if columns[column].upper() != 'INTEGER']
+        if not stale:
+            continue
+
+        sql = _table_sql(cur, table)
+        select = dict((column, column) for column in columns)
+        for column in stale:
+            sql, found = re.subn(
+                rf'\b{column}\s+TIMESTAMP\s+DEFAULT\s+CURRENT_TIMESTAMP',
+                f'{column} INTEGER DEFAULT ({EPOCH_MS_NOW})',
+                sql
+            )
+            if not found:
+                raise RuntimeError(f"Unexpected definition of {table}.{column}: {sql}")
+            select[column] = f"CASE WHEN typeof({column}) = 'text' THEN CAST(strftime('%s', {column}) AS INTEGER) * 1000 ELSE {column} END"
+
+        _rebuild_table(cur, table, sql, select)
+
+def _compact_list_tables(cur: sqlite3.Cursor):
+    """
+    Rebuild the `COMPACT_TABLES` as `WITHOUT ROWID` tables, stored in their primary
+    key's B-tree instead of a rowid table plus a separate index on the key.
+
+    Applies to whichever of the tables are in the database, so it also runs on the
+    list partitions (see `SPLIT_FILE_MIGRATIONS`).
+    """
+    for table in COMPACT_TABLES:
+        if not _table_exists(cur, table):
+            continue
+
+        sql = _table_sql(cur, table)
+        if re.search(r'\bWITHOUT\s+ROWID\s*$', sql, re.IGNORECASE):
+            continue
+
+        info = cur.execute(f'PRAGMA table_info({table})').fetchall()
+        select = dict((row[1], row[1]) for row in info)
+        # Primary key columns of a WITHOUT ROWID table cannot be NULL
+        where = ' AND '.join(f'{row[1]} IS NOT NULL' for row in info if row[5])
+        _rebuild_table(cur, table, f'{sql} WITHOUT ROWID', select, where)
+
+def _add_ordering_indexes(cur: sqlite3.Cursor):
+    """
+    Index a user's notifications in the order they are listed (unread first, newest
+    first; the rowid `id` comes last in every index), and a user's list memberships.
+    """
+    if _table_exists(cur, 'notifications'):
+        cur.execute('''
+            CREATE INDEX IF NOT EXISTS idx_notifications_user_id_unread_created_at
+            ON notifications (user_id, unread, created_at)
+        ''')
+    if _table_exists(cur, 'grocery_list_users'):
+        cur.execute('''
+            CREATE INDEX IF NOT EXISTS idx_grocery_list_users_user_id
+            ON grocery_list_users (user_id)
+        ''')
+
+def _integer_deleted_at(cur: sqlite3.Cursor):
+    """
+    Convert `grocery_lists.deleted_at` values to milliseconds since the Unix epoch, as
+    lists are now soft-deleted with. The column's `TIMESTAMP` type has numeric affinity,
+    so it keeps integers as they are and the table is not rebuilt.
+    """
+    if _table_exists(cur, 'grocery_lists'):
+        cur.execute('''
+            UPDATE grocery_lists
+            SET deleted_at = CAST(strftime('%s', deleted_at) AS INTEGER) * 1000
+            WHERE typeof(deleted_at) = 'text'
+        ''')
+
+
+# Ordered list of migrations. Append new migrations to the end; never reorder.
+MIGRATIONS = [
+    _fix_notifications_user_fk,
+    _add_list_soft_delete,
+    _add_list_templates,
+    _add_list_version,
+    _integer_timestamps,
+    _compact_list_tables,
+    _add_ordering_indexes,
+    _integer_deleted_at,
+]
+
+# Migrations applied to the files split out of the application database (the
+# notifications database and the list partitions), which are created with the schema
+# in `NOTIFICATIONS_DDL` and `PARTITION_DDL` at the time. Each file tracks its own
+# `user_version`. Append new migrations to the end; never reorder.
+SPLIT_FILE_MIGRATIONS = [
+    _integer_timestamps,
+    _compact_list_tables,
+    _add_ordering_indexes,
+    _integer_deleted_at,
+]
+
+
+# ----------------------------------------------
+#    FUNCTIONS
+# ----------------------------------------------
+
+def apply_migrations(conn: sqlite3.Connection):
+    """
+    Apply all migrations newer than the database's `user_version`.
+
+    Each migration runs in its own transaction, and `user_version` is bumped in the
+    same transaction so a failed migration is retried on the next startup.
+    The database is also switched to WAL mode (see `db.enable_wal()`). If
+    `db.NOTIFICATIONS_DB_PATH` is set, notifications are then moved to that file
+    (see `move_notifications()`), and if `db.LIST_PARTITIONS` is set, the list
+    tables are split across the partition files (see `split_lists()`). Those files
+    are then brought up to date with `SPLIT_FILE_MIGRATIONS`.
+
+    Args:
+        conn (sqlite3.Connection): Open connection to the database to migrate.
+
+    Raises:
+        RuntimeError: If the list tables were split across a different number of
+            partitions than `db.LIST_PARTITIONS`.
+    """
+    # Not a schema change, but every database is expected to use WAL, which cannot be
+    # enabled inside a transaction
+    enable_wal(conn)
+    _apply(conn, MIGRATIONS)
+
+    if db.NOTIFICATIONS_DB_PATH:
+        move_notifications(conn, db.NOTIFICATIONS_DB_PATH)
+
+    split_lists(conn, db.LIST_PARTITIONS)
+
+    split_files = [db.NOTIFICATIONS_DB_PATH] if db.NOTIFICATIONS_DB_PATH else []
+    split_files += [db.partition_path(partition) for partition in range(db.LIST_PARTITIONS)]
+    for path in split_files:
+        target = sqlite3.connect(path)
+        try:
+            _apply(target, SPLIT_FILE_MIGRATIONS, path)
+        finally:
+            target.close()
+
+def move_notifications(conn: sqlite3.Connection, path: str):
+    """
+    Move `notifications` out of the application database into its own database file.
+
+    The file is created with `NOTIFICATIONS_DDL` if needed. Rows are copied in one
+    transaction and the table dropped from the application database in another, so
+    an interrupted move is completed by running it again. Once moved, notifications
+    stay in `path`; the app must keep being started with it.
+
+    Args:
+        conn (sqlite3.Connection): Open connection to the application database.
+        path (str): Path to the notifications database file.
+    """
+    target = sqlite3.connect(path)
+    try:
+        enable_wal(target)
+        with target:
+            for statement in NOTIFICATIONS_DDL:
+                target.execute(statement)
+    finally:
+        target.close()
+
+    cur = conn.cursor()
+    if not _table_exists(cur, 'notifications'):
+        return
+
+    cur.execute(f'ATTACH DATABASE ? AS {db.NOTIFICATIONS_SCHEMA}', (path,))
+    try:
+        with conn:
+            cur.execute('BEGIN')
+            moved = cur.execute(f'''
+                INSERT OR IGNORE INTO {db.NOTIFICATIONS_SCHEMA}.notifications ({NOTIFICATION_COLUMNS})
+                SELECT {NOTIFICATION_COLUMNS}
+                FROM main.notifications
+            ''').rowcount
+        with conn:
+            cur.execute('BEGIN')
+            cur.execute('DROP TABLE main.notifications')
+    finally:
+        cur.execute(f'DETACH DATABASE {db.NOTIFICATIONS_SCHEMA}')
+
+    logger.info("Moved %s notifications to %s", moved, path)
+
+def split_lists(conn: sqlite3.Connection, partitions: int):
+    """
+    Move the list tables out of the application database into `partitions` files.
+
+    List `list_id` goes to partition `list_id % partitions`, at `db.partition_path()`,
+    created with `PARTITION_DDL` if needed. Each partition's rows are copied in one
+    transaction; the directory (`DIRECTORY_DDL`) is then filled and the list tables
+    dropped from the application database in another, so an interrupted split is
+    completed by running it again. Once split, lists stay partitioned; the app must
+    keep being started with the same number of partitions.
+
+    Args:
+        conn (sqlite3.Connection): Open connection to the application database.
+        partitions (int): Number of partitions, or 0 to only check that the lists were not split.
+
+    Raises:
+        RuntimeError: If the lists were already split across a different number of partitions.
+    """
+    cur = conn.cursor()
+    current = None
+    if _table_exists(cur, 'list_partitioning'):
+        row = cur.execute('SELECT partitions FROM list_partitioning').fetchone()
+        current = row[0] if row else None
+    if current is not None and current != partitions:
+        raise RuntimeError(
+            f"The lists are split across {current} partitions, but {partitions} are configured "
+            f"(set GROCERY_LIST_PARTITIONS={current})"
+        )
+    if not partitions:
+        return
+
+    for partition in range(partitions):
+        target = sqlite3.connect(db.partition_path(partition))
+        try:
+            enable_wal(target)
+            with target:
+                for statement in PARTITION_DDL:
+                    target.execute(statement)
+        finally:
+            target.close()
+
+    if not _table_exists(cur, 'grocery_lists'):
+        return
+
+    sequence = cur.execute("SELECT seq FROM sqlite_sequence WHERE name = 'grocery_lists'").fetchone()
+    moved = 0
+    for partition in range(partitions):
+        cur.execute('ATTACH DATABASE ? AS partition_db', (db.partition_path(partition),))
+        try:
+            with conn:
+                cur.execute('BEGIN')
+                for table, columns in (
+                    ('grocery_lists', 'list_id, name, creation_date, update_date, deleted_at, is_template, version'),
+                    ('grocery_list_users', 'list_id, user_id, role'),
+                    ('grocery_list_items', 'list_id, item_id, quantity'),
+                ):
+                    rows = cur.execute(f'''
+                        INSERT OR IGNORE INTO partition_db.{table} ({columns})
+                        SELECT {columns}
+                        FROM main.{table}
+                        WHERE list_id % ? = ?
+                    ''', (partitions, partition)).rowcount
+                    if table == 'grocery_lists':
+                        moved += rows
+
+                # IDs of deleted lists are not reused either
+                if sequence:
+                    cur.execute("DELETE FROM partition_db.sqlite_sequence WHERE name = 'grocery_lists' AND seq < ?", (sequence[0],))
+                    cur.execute('''
+                        INSERT INTO partition_db.sqlite_sequence (name, seq)
+                        SELECT 'grocery_lists', ?
+                        WHERE NOT EXISTS (SELECT 1 FROM partition_db.sqlite_sequence WHERE name = 'grocery_lists')
+                    ''', (sequence[0],))
+        finally:
+            cur.execute('DETACH DATABASE partition_db')
+
+    with conn:
+        cur.execute('BEGIN')
+        for statement in DIRECTORY_DDL:
+            cur.execute(statement)
+        cur.execute('DELETE FROM list_partitioning')
+        cur.execute('INSERT INTO list_partitioning (partitions) VALUES (?)', (partitions,))
+        cur.execute('''
+            INSERT OR IGNORE INTO user_partitions (user_id, partition_id)
+            SELECT DISTINCT user_id, list_id % ?
+            FROM grocery_list_users
+        ''', (partitions,))
+        for table in LIST_TABLES:
+            cur.execute(f'DROP TABLE main.{table}')
+
+    logger.info("Split %s lists across %s partitions", moved, partitions)
@@ -4,9 +4,11 @@ Module for managing and creating user notifications.
 
 from enum import Enum
 import json
-import sqlite3
 
-from logger import logger
+from logger import get_logger
+from repository import IntegrityError, UnitOfWork
+
+logger = get_logger('notifications')
 
 
 # ----------------------------------------------
@@ -46,7 +48,7 @@ class ActionableNotificationType(Enum):
 # ----------------------------------------------
 
 def create_notification(
-    cur: sqlite3.Cursor, 
+    repo: UnitOfWork, 
     user_id: int,
     message: str,
     icon: str = NotificationType.DEFAULT.value,
@@ -55,16 +57,16 @@ def create_notification(
     requested_list_id: int|None = None,
     unread: bool = True,
     **kwargs
-) -> int:
+) -> int | None:
     """
     Create and insert a notification entry into the database.
 
-    This function inserts a new notification record for a specific user into 
-    the `notifications` table. It supports both standard and actionable 
+    This function stores a new notification record for a specific user through 
+    `repo.notifications`. It supports both standard and actionable 
     notifications, along with optional custom data stored as JSON.
 
     Args:
-        cur (sqlite3.Cursor): Active SQLite cursor used to execute the query.
+        repo (UnitOfWork): Unit of work the notification is created in.
         user_id (int): The ID of the user receiving the notification.
         message (str): The main text content of the notification.
         icon (str, optional): The notification type identifier, defined by 
@@ -82,10 +84,11 @@ def create_notification(
 
     Raises:
         ValueError: If `icon` or `action_type` values are invalid.
-        sqlite3.IntegrityError: If the database insertion fails due to constraint violations.
+        IntegrityError: If the insertion fails due to constraint violations.
 
     Returns:
-        int: The ID of the newly created notification record.
+        int | None: The ID of the newly created notification record, or None if it 
+            is only written after the unit of work is committed.
     """
     if icon not in [nt.value for nt in NotificationType]:
         raise ValueError(f"Invalid notification type: {icon}")
@@ -96,29 +99,26 @@ def create_notification(
     try:
         data_str = json.dumps(kwargs.get('data')) if 'data' in kwargs else None
         
-        cur.execute('''
-            INSERT INTO notifications (user_id, icon, message, actionable, action_type, requested_list_id, unread, created_at, data)
-            VALUES (?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP, ?)
-        ''', (
+        notification_id = repo.notifications.create(
             user_id,
-            icon,
             message,
+            icon,
             actionable,
             action_type,
             requested_list_id,
             unread,
             data_str
-        ))  
+        )
         
-        logger.info(f"Notification created for user_id {user_id} with message: {message}")
+        logger.debug("Notification created for user_id %s with message: %s", user_id, message)
         
-        return cur.lastrowid
-    except sqlite3.IntegrityError as e:
-        logger.error(f"Failed to create notification: {e}")
+        return notification_id
+    except IntegrityError as e:
+        logger.error("Failed to create notification: %s", e)
         raise
     
 def create_notifications_for_users(
-    cur: sqlite3.Cursor,
+    repo: UnitOfWork,
     user_ids: list[int],
     message: str,
     icon: str = NotificationType.DEFAULT.value,
@@ -136,7 +136,7 @@ def create_notifications_for_users(
     user-specific role data or other metadata to each notification.
 
     Args:
-        cur (sqlite3.Cursor): Active SQLite cursor used to execute database operations.
+        repo (UnitOfWork): Unit of work the notifications are created in.
         user_ids (list[int]): List of user IDs to receive the notification.
         message (str): The text content of the notification.
         icon (str, optional): The notification type identifier, defined by 
@@ -155,16 +155,16 @@ def create_notifications_for_users(
         None: This function does not return a value, but logs and creates notification records.
 
     Raises:
-        sqlite3.IntegrityError: If a database constraint is violated during insertion.
+        IntegrityError: If a constraint is violated during insertion.
     """
     notification_ids = []
     #for user_id in user_ids:
     for i, user_id in enumerate(user_ids):
         data = kwargs.get('data') if 'data' in kwargs else None
-        role_data = {'user_role': data.get('user_roles')[i].lower()} if 'user_roles' in data else None
+        role_data = {'user_role': data.get('user_roles')[i].lower()} if data and 'user_roles' in data else None
         
         new_notification_id = create_notification(
-            cur,
+            repo,
             user_id,
             message,
             icon,
@@ -177,7 +177,7 @@ def create_notifications_for_users(
         notification_ids.append(new_notification_id)
         
 def create_notifications_for_users_of_list(
-    cur: sqlite3.Cursor,
+    repo: UnitOfWork,
     list_id: int,
     creator_user_id: int,
     message: str,
@@ -186,6 +186,7 @@ def create_notifications_for_users_of_list(
     action_type: str|None = None,
     requested_list_id: int|None = None,
     unread: bool = True,
+    member_ids: list[int]|None = None,
     **kwargs
 ):
     """
@@ -195,7 +196,7 @@ def create_notifications_for_users_of_list(
     and generates a notification for each using `create_notification()`.
 
     Args:
-        cur (sqlite3.Cursor): Active SQLite cursor used to execute database operations.
+        repo (UnitOfWork): Unit of work the notifications are created in.
         list_id (int): ID of the grocery list whose users should receive notifications.
         creator_user_id (int): ID of the user who triggered the event (excluded from notifications).
         message (str): The text content of the notification.
@@ -207,26 +208,25 @@ def create_notifications_for_users_of_list(
             `ActionableNotificationType`. Required if `actionable` is True.
         requested_list_id (int | None, optional): The ID of the list being referenced by the notification.
         unread (bool, optional): Whether the notification is initially marked unread. Defaults to True.
+        member_ids (list[int] | None, optional): IDs of the list's members, if the caller already
+            loaded them (see `ListContext`). Fetched from the list if None.
         **kwargs: Reserved for future expansion.
 
     Returns:
         None: This function creates multiple notification records.
 
     Example:
-        >>> create_notifications_for_users_of_list(cur, list_id=3, creator_user_id=1, message="List updated")
+        >>> create_notifications_for_users_of_list(repo, list_id=3, creator_user_id=1, message="List updated")
     """
-    users = cur.execute('''
-        SELECT user_id
-        FROM grocery_list_users
-        WHERE list_id = ? AND user_id != ?
-    ''', (list_id, creator_user_id)).fetchall()
-    
-    user_ids = [user[0] for user in users]
+    if member_ids is None:
+        user_ids = repo.memberships.other_member_ids(list_id, creator_user_id)
+    else:
+        user_ids = [user_id for user_id in member_ids if user_id != creator_user_id]
     
     notification_ids = []
     for user_id in user_ids:
         new_notification_id = create_notification(
-            cur,
+            repo,
             user_id,
             message,
             icon,
@@ -238,7 +238,7 @@ def create_notifications_for_users_of_list(
         notification_ids.append(new_notification_id)
     
 def mark_notification_as_read(
-    cur: sqlite3.Cursor,
+    repo: UnitOfWork,
     notification_id: int
 ):
     """
@@ -247,44 +247,43 @@ def mark_notification_as_read(
     Updates the `unread` flag of a notification to `0`, indicating it has been viewed.
 
     Args:
-        cur (sqlite3.Cursor): Active SQLite cursor used to execute the update.
+        repo (UnitOfWork): Unit of work the update is made in.
         notification_id (int): The ID of the notification to mark as read.
 
     Returns:
         None
 
     Raises:
-        sqlite3.Error: If the database operation fails.
+        Exception: If the update fails.
     """
     try:
-        cur.execute('''
-            UPDATE notifications
-            SET unread = 0
-            WHERE id = ?
-        ''', (notification_id,))
-    except sqlite3.Error as e:
-        logger.error(f"Failed to mark notification as read: {e}")
+        repo.notifications.mark_read([notification_id])
+    except Exception as e:
+        logger.error("Failed to mark notification as read: %s", e)
         raise
     
 def get_notifications(
-    cur: sqlite3.Cursor,
+    repo: UnitOfWork,
     user_id: int,
-    limit: int = NOTIFICATION_LIMIT
-) -> list[sqlite3.Row]:
+    limit: int = NOTIFICATION_LIMIT,
+    after_id: int|None = None
+) -> list[tuple]:
     """
     Retrieve recent notifications for a user.
 
-    Fetches notifications from the database for a given user, sorted by 
-    unread status (unread first) and creation time (newest first).
+    Fetches notifications for a given user, sorted by unread status 
+    (unread first) and creation time (newest first).
 
     Args:
-        cur (sqlite3.Cursor): Active SQLite cursor used to execute the query.
+        repo (UnitOfWork): Unit of work the notifications are read in.
         user_id (int): The ID of the user whose notifications will be fetched.
         limit (int, optional): Maximum number of notifications to retrieve. 
             Defaults to `NOTIFICATION_LIMIT`.
+        after_id (int | None, optional): If given, only notifications with a greater 
+            ID (i.e. created later) are returned. Used for long-polling. Defaults to None.
 
     Returns:
-        list[sqlite3.Row]: A list of notification rows, each containing:
+        list[tuple]: A list of notification rows, each containing:
             - id (int)
             - icon (str)
             - message (str)
@@ -296,23 +295,16 @@ def get_notifications(
             - data (str | None)
 
     Raises:
-        sqlite3.Error: If the query execution fails.
+        Exception: If the query fails.
     """
     try:
-        cur.execute('''
-            SELECT id, icon, message, actionable, action_type, requested_list_id, unread, created_at, data
-            FROM notifications
-            WHERE user_id = ?
-            ORDER BY unread DESC, created_at DESC
-            LIMIT ?
-        ''', (user_id, limit))
-        
-        notifications = cur.fetchall()
+        # Notifications for lists awaiting purge are hidden
+        notifications = repo.notifications.for_user(user_id, limit, after_id)
         
-        logger.info(f"Fetched {len(notifications)} notifications for user_id {user_id}")
+        logger.debug("Fetched %d notifications for user_id %s", len(notifications), user_id)
         
         return notifications
-    except sqlite3.Error as e:
-        logger.error(f"Failed to fetch notifications: {e}")
+    except Exception as e:
+        logger.error("Failed to fetch notifications: %s", e)
         raise
 
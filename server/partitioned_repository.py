@@ -0,0 +1,640 @@
+"""
+Module implementing the data-access interface (see `repository.py`) with the list
+tables hash-partitioned across several SQLite files.
+
+With `db.LIST_PARTITIONS` set to N, `grocery_lists`, `grocery_list_users` and
+`grocery_list_items` are split across N partition files (see `migrations.split_lists()`),
+and list `list_id` lives in partition `list_id % N`. The application database keeps
+users, the item catalog and notifications, and serves as the directory:
+`user_partitions` records the partitions holding lists each user is a member of.
+Entries are added before a membership and pruned by the purger once a user's last
+list in a partition is purged, both while holding that partition's write lock.
+
+Each partition has its own group-commit writer (`writer.partition_writer()`) and read
+pool (`db.partition_pool()`), so writes to lists in different partitions never wait
+on each other's lock, and run in parallel across worker processes.
+
+A write unit of work:
+    - runs on the writer of the first partition it uses, from then on. It may read
+      other partitions, from their committed state, but not write to them. A new list
+      is created in that partition, so a clone lives next to its source, or else in a
+      random one.
+    - writes users, catalog items and directory entries in their own units of work on
+      `writer.group_writer`, committed right away. None of them is wrong to keep if the
+      rest of the unit of work fails: a directory entry without lists only costs one
+      empty query, and an unused catalog item is still a valid suggestion.
+    - queues its notification changes for `sqlite_repository.notification_outbox`.
+
+Reads spanning partitions, like a user's dashboard, run on each partition involved in
+parallel, on up to `FAN_OUT_THREADS` shared threads, and are merged. Each partition is read
+from one snapshot for the whole unit of work.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack, closing, contextmanager
+import os
+import random
+import sqlite3
+import threading
+
+import db
+from metrics import add_sql_stats, reset_sql_stats, sql_stats
+from migrations import MIGRATIONS
+from repository import (
+    DatabaseBusyError,
+    DataStore,
+    ItemRepository,
+    ListRepository,
+    MembershipRepository,
+    NotificationRepository,
+    UnitOfWork,
+    UserRepository,
+    now_ms
+)
+from sqlite_repository import (
+    DeferredNotificationRepository,
+    SqliteItemRepository,
+    SqliteUnitOfWork,
+    SqliteUserRepository,
+    notification_outbox
+)
+from writer import group_writer, notifications_writer, partition_writer
+
+
+# ----------------------------------------------
+#   CONSTANTS
+# ----------------------------------------------
+
+# Threads per process running the per-partition queries of a fan-out; with one, they run
+# one after another on the request's thread, as threads cannot overlap on a single core
+FAN_OUT_THREADS = int(os.getenv('GROCERY_FAN_OUT_THREADS', min(db.MAX_LIST_PARTITIONS, os.cpu_count() or 1)))
+
+# Most IDs bound in one `IN (...)` lookup
+LOOKUP_CHUNK_SIZE = 500
+
+
+# ----------------------------------------------
+#    HELPERS
+# ----------------------------------------------
+
+def _placeholders(values) -> str:
+    return ', '.join(['?'] * len(values))
+
+def _partition_of(list_id: int) -> int:
+    return list_id % db.LIST_PARTITIONS
+
+def _by_partition(list_ids) -> dict[int, list[int]]:
+    groups: dict[int, list[int]] = {}
+    for list_id in list_ids:
+        groups.setdefault(_partition_of(list_id), []).append(list_id)
+    return groups
+
+_executor: ThreadPoolExecutor | None = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+
+def _fan_out_executor() -> ThreadPoolExecutor:
+    global _executor, _executor_pid
+    with _executor_lock:
+        if _executor is None or _executor_pid != os.getpid():
+            # Threads are not inherited through fork
+            _executor = ThreadPoolExecutor(FAN_OUT_THREADS, thread_name_prefix='partition-fan-out')
+            _executor_pid = os.getpid()
+        return _executor
+
+def _run_counted(function, *args):
+    # Statements are counted per thread; hand the fan-out thread's count back to the request
+    reset_sql_stats()
+    result = function(*args)
+    return result, sql_stats()
+
+def _fan_out(groups: dict, function) -> list:
+    """
+    Call `function(partition, value)` for each item of `groups`, in parallel if there are
+    several and `FAN_OUT_THREADS` allows, and return the results in the order of `groups`.
+    """
+    if len(groups) <= 1 or FAN_OUT_THREADS <= 1:
+        return [function(partition, value) for partition, value in groups.items()]
+
+    futures = [_fan_out_executor().submit(_run_counted, function, partition, value) for partition, value in groups.items()]
+    results = []
+    for future in futures:
+        result, (count, seconds) = future.result()
+        add_sql_stats(count, seconds)
+        results.append(result)
+    return results
+
+
+# ----------------------------------------------
+#    REPOSITORIES
+# ----------------------------------------------
+
+class PartitionedUserRepository(UserRepository):
+    def __init__(self, uow: 'PartitionedUnitOfWork'):
+        self.uow = uow
+
+    def get_credentials(self, username):
+        return self.uow.read_main(lambda cur: SqliteUserRepository(cur).get_credentials(username))
+
+    def get_id(self, username):
+        return self.uow.read_main(lambda cur: SqliteUserRepository(cur).get_id(username))
+
+    def create(self, username, password_hash):
+        return self.uow.write_main(lambda cur: SqliteUserRepository(cur).create(username, password_hash))
+
+    def search(self, prefix, exclude_username):
+        return self.uow.read_main(lambda cur: SqliteUserRepository(cur).search(prefix, exclude_username))
+
+class PartitionedListRepository(ListRepository):
+    def __init__(self, uow: 'PartitionedUnitOfWork'):
+        self.uow = uow
+
+    def create(self, name, is_template=False):
+        partition = self.uow.bound_partition
+        if partition is None:
+            partition = random.randrange(db.LIST_PARTITIONS)
+        cur = self.uow.partition(partition, write=True).cur
+
+        # The next unused ID that hashes to this partition; AUTOINCREMENT keeps the highest ever used
+        row = cur.execute("SELECT seq FROM sqlite_sequence WHERE name = 'grocery_lists'").fetchone()
+        list_id = (row[0] if row else 0) + 1
+        list_id += (partition - list_id) % db.LIST_PARTITIONS
+
+        now = now_ms()
+        cur.execute('''
+            INSERT INTO grocery_lists (list_id, name, creation_date, update_date, is_template)
+            VALUES (?, ?, ?, ?, ?)
+        ''', (list_id, name, now, now, is_template))
+        return list_id
+
+    def get_name(self, list_id):
+        return self.uow.at(list_id).lists.get_name(list_id)
+
+    def get_info(self, list_id):
+        return self.uow.at(list_id).lists.get_info(list_id)
+
+    def context(self, list_id, user_id):
+        return self.uow.at(list_id).lists.context(list_id, user_id)
+
+    def for_user(self, user_id):
+        rows = self.uow.fan_out_user(user_id, lambda repo: repo.lists.for_user(user_id))
+        return sorted(rows, key=lambda row: row[3], reverse=True)
+
+    def most_recent_for_user(self, user_id):
+        rows = self.uow.fan_out_user(user_id, lambda repo: repo.cur.execute('''
+            SELECT gl.list_id, gl.update_date
+            FROM grocery_lists gl
+            JOIN grocery_list_users glu ON gl.list_id = glu.list_id
+            WHERE glu.user_id = ?
+            AND gl.deleted_at IS NULL
+            AND gl.is_template = 0
+            ORDER BY gl.update_date DESC
+            LIMIT 1
+        ''', (user_id,)).fetchall())
+        return max(rows, key=lambda row: row[1])[0] if rows else None
+
+    def versions_for_user(self, user_id, list_ids=None):
+        if list_ids:
+            rows = self.uow.fan_out_lists(list_ids, lambda repo, ids: repo.lists.versions_for_user(user_id, ids))
+        else:
+            rows = self.uow.fan_out_user(user_id, lambda repo: repo.lists.versions_for_user(user_id))
+        return sorted(rows)
+
+    def accessible(self, user_id, list_ids):
+        return self.uow.fan_out_lists(list_ids, lambda repo, ids: repo.lists.accessible(user_id, ids))
+
+    def templates_for_user(self, user_id):
+        rows = self.uow.fan_out_user(user_id, lambda repo: repo.lists.templates_for_user(user_id))
+        # SQLite sorts NULL names first
+        return sorted(rows, key=lambda row: (row[1] is not None, row[1] or ''))
+
+    def touch(self, list_id):
+        self.uow.at(list_id, write=True).lists.touch(list_id)
+
+    def rename(self, list_id, name):
+        self.uow.at(list_id, write=True).lists.rename(list_id, name)
+
+    def soft_delete(self, list_id):
+        self.uow.at(list_id, write=True).lists.soft_delete(list_id)
+
+    def deleted(self, list_ids: list[int]) -> set[int]:
+        """
+        Return those of `list_ids` that are awaiting purge.
+        """
+        rows = self.uow.fan_out_lists(list_ids, lambda repo, ids: repo.cur.execute(f'''
+            SELECT list_id
+            FROM grocery_lists
+            WHERE list_id IN ({_placeholders(ids)})
+            AND deleted_at IS NOT NULL
+        ''', ids).fetchall())
+        return {row[0] for row in rows}
+
+class PartitionedMembershipRepository(MembershipRepository):
+    def __init__(self, uow: 'PartitionedUnitOfWork'):
+        self.uow = uow
+
+    def get_role(self, list_id, user_id):
+        return self.uow.at(list_id).memberships.get_role(list_id, user_id)
+
+    def add(self, list_id, user_id, role):
+        self.uow.add_to_directory([user_id], _partition_of(list_id))
+        self.uow.at(list_id, write=True).memberships.add(list_id, user_id, role)
+
+    def accept_invite(self, list_id, user_id, role):
+        self.uow.add_to_directory([user_id], _partition_of(list_id))
+        self.uow.at(list_id, write=True).memberships.accept_invite(list_id, user_id, role)
+
+    def remove(self, list_id, user_id):
+        self.uow.at(list_id, write=True).memberships.remove(list_id, user_id)
+
+    def set_role(self, list_id, user_id, role):
+        self.uow.at(list_id, write=True).memberships.set_role(list_id, user_id, role)
+
+    def other_members(self, list_id, user_id):
+        return self.uow.at(list_id).memberships.other_members(list_id, user_id)
+
+    def other_member_ids(self, list_id, user_id):
+        return self.uow.at(list_id).memberships.other_member_ids(list_id, user_id)
+
+    def other_members_of_lists(self, list_ids, user_id):
+        # Usernames are in the application database; join them in afterwards
+        rows = self.uow.fan_out_lists(list_ids, lambda repo, ids: repo.cur.execute(f'''
+            SELECT list_id, user_id, role
+            FROM grocery_list_users
+            WHERE list_id IN ({_placeholders(ids)})
+            AND user_id != ?
+        ''', (*ids, user_id)).fetchall())
+        usernames = self.uow.lookup_main(
+            'SELECT user_id, username FROM users WHERE user_id IN ({})',
+            {member_id for _, member_id, _ in rows}
+        )
+        return [
+            (list_id, member_id, usernames[member_id][0], role)
+            for list_id, member_id, role in rows
+            if member_id in usernames
+        ]
+
+    def copy(self, source_list_id, list_id, exclude_user_id):
+        members = self.uow.at(source_list_id).memberships.other_members(source_list_id, exclude_user_id)
+        self.uow.add_to_directory([member_id for member_id, _ in members], _partition_of(list_id))
+
+        target = self.uow.at(list_id, write=True)
+        if _partition_of(source_list_id) == _partition_of(list_id):
+            target.memberships.copy(source_list_id, list_id, exclude_user_id)
+        else:
+            target.cur.executemany(
+                'INSERT INTO grocery_list_users (list_id, user_id, role) VALUES (?, ?, ?)',
+                [(list_id, member_id, 'admin' if role == 'owner' else role) for member_id, role in members]
+            )
+
+class PartitionedItemRepository(ItemRepository):
+    def __init__(self, uow: 'PartitionedUnitOfWork'):
+        self.uow = uow
+
+    def categories(self):
+        return self.uow.read_main(lambda cur: SqliteItemRepository(cur).categories())
+
+    def category_id(self, name):
+        return self.uow.read_main(lambda cur: SqliteItemRepository(cur).category_id(name))
+
+    def find(self, name, category_id):
+        return self.uow.read_main(lambda cur: SqliteItemRepository(cur).find(name, category_id))
+
+    def create(self, name, category_id):
+        # Concurrent units of work on other partitions may be creating the same item
+        def find_or_create(cur):
+            items = SqliteItemRepository(cur)
+            item_id = items.find(name, category_id)
+            return item_id if item_id is not None else items.create(name, category_id)
+        return self.uow.write_main(find_or_create)
+
+    def get_name(self, item_id):
+        return self.uow.read_main(lambda cur: SqliteItemRepository(cur).get_name(item_id))
+
+    def created_after(self, item_id):
+        return self.uow.read_main(lambda cur: SqliteItemRepository(cur).created_after(item_id))
+
+    def on_list(self, list_id):
+        return self.uow.at(list_id).items.on_list(list_id)
+
+    def on_lists(self, list_ids):
+        rows = self.uow.fan_out_lists(list_ids, lambda repo, ids: repo.items.on_lists(ids))
+        return sorted(rows, key=lambda row: row[0])
+
+    def add_to_list(self, list_id, item_id, quantity):
+        self.uow.at(list_id, write=True).items.add_to_list(list_id, item_id, quantity)
+
+    def add_many_to_list(self, list_id, items):
+        self.uow.at(list_id, write=True).items.add_many_to_list(list_id, items)
+
+    def set_quantity(self, list_id, item_id, quantity):
+        self.uow.at(list_id, write=True).items.set_quantity(list_id, item_id, quantity)
+
+    def remove_from_list(self, list_id, item_id):
+        self.uow.at(list_id, write=True).items.remove_from_list(list_id, item_id)
+
+    def copy_list(self, source_list_id, list_id, reset_quantities=False):
+        target = self.uow.at(list_id, write=True)
+        if _partition_of(source_list_id) == _partition_of(list_id):
+            target.items.copy_list(source_list_id, list_id, reset_quantities)
+        else:
+            items = self.uow.at(source_list_id).items.on_list(source_list_id)
+            target.items.add_many_to_list(list_id, [(item_id, 1 if reset_quantities else quantity) for item_id, quantity in items])
+
+    def totals_for_lists(self, list_ids):
+        if not list_ids:
+            return []
+
+        rows = self.uow.fan_out_lists(list_ids, lambda repo, ids: repo.items.on_lists(ids))
+        names = self.uow.lookup_main('''
+            SELECT i.item_id, c.name, i.name
+            FROM items i
+            JOIN categories c ON i.category_id = c.category_id
+            WHERE i.item_id IN ({})
+        ''', {item_id for _, item_id, _ in rows})
+
+        provenance: dict[int, list[tuple[int, int]]] = {}
+        for list_id, item_id, quantity in rows:
+            if item_id in names:
+                provenance.setdefault(item_id, []).append((list_id, quantity))
+
+        totals = []
+        for item_id, pairs in provenance.items():
+            category, name = names[item_id]
+            totals.append((category, item_id, name, sum(quantity for _, quantity in pairs), sorted(pairs)))
+        totals.sort(key=lambda row: (row[0], row[2], row[1]))
+        return totals
+
+class PartitionedNotificationRepository(NotificationRepository):
+    """
+    Notifications, in the application database or their own file.
+
+    Writes are applied right away in units of work that only use notifications, and
+    queued for `notification_outbox` otherwise (see `DeferredNotificationRepository`).
+    """
+
+    def __init__(self, uow: 'PartitionedUnitOfWork', writes: NotificationRepository | None):
+        self.uow = uow
+        self.writes = writes
+
+    def create(self, user_id, message, icon, actionable, action_type, requested_list_id, unread, data):
+        return self.writes.create(user_id, message, icon, actionable, action_type, requested_list_id, unread, data)
+
+    def for_user(self, user_id, limit, after_id=None):
+        # The lists are in other files; fetch, then hide notifications about lists
+        # awaiting purge, until none of the rows returned is about one
+        hidden: set[int] = set()
+        checked: set[int] = set()
+        while True:
+            exclude = sorted(hidden)
+            rows = self.uow.read_main(lambda cur: cur.execute(f'''
+                SELECT id, icon, message, actionable, action_type, requested_list_id, unread,
+                    strftime('%Y-%m-%d %H:%M:%S', created_at / 1000, 'unixepoch'), data
+                FROM notifications
+                WHERE user_id = ?
+                AND id > ?
+                AND (requested_list_id IS NULL OR requested_list_id NOT IN ({_placeholders(exclude)}))
+                ORDER BY unread DESC, created_at DESC, id DESC
+                LIMIT ?
+            ''', (user_id, after_id or 0, *exclude, limit)).fetchall())
+
+            unchecked = {row[5] for row in rows if row[5] is not None} - checked
+            deleted = self.uow.lists.deleted(sorted(unchecked)) if unchecked else set()
+            if not deleted:
+                return rows
+            checked |= unchecked
+            hidden |= deleted
+
+    def mark_read(self, notification_ids):
+        self.writes.mark_read(notification_ids)
+
+    def delete(self, notification_ids):
+        self.writes.delete(notification_ids)
+
+
+# ----------------------------------------------
+#    UNIT OF WORK
+# ----------------------------------------------
+
+class PartitionedUnitOfWork(UnitOfWork):
+    """
+    Repositories routing each call to the partition of the list it is about.
+
+    Args:
+        stack (ExitStack): Stack the unit of work's connections and writer units of work
+            are entered on, and closed with.
+        readonly (bool): Whether the unit of work only reads.
+        notifications (NotificationRepository | None): Repository for notification writes,
+            or None if the unit of work only reads.
+    """
+
+    def __init__(self, stack: ExitStack, readonly: bool, notifications: NotificationRepository | None):
+        self.stack = stack
+        self.readonly = readonly
+        self.bound_partition: int | None = None
+        self.busy_error: DatabaseBusyError | None = None
+
+        # Per-partition repositories, on the writer's connection or a read snapshot
+        self._partitions: dict[int, SqliteUnitOfWork] = {}
+        self._main: sqlite3.Cursor | None = None
+        self._main_snapshot = None
+        self._lock = threading.Lock()
+
+        self.users = PartitionedUserRepository(self)
+        self.lists = PartitionedListRepository(self)
+        self.memberships = PartitionedMembershipRepository(self)
+        self.items = PartitionedItemRepository(self)
+        self.notifications = PartitionedNotificationRepository(self, notifications)
+
+    def snapshot(self):
+        # Every partition is already read from one snapshot; pin the application database's too
+        self._main_cursor()
+
+    def pending_migrations(self):
+        return self.read_main(lambda cur: max(len(MIGRATIONS) - cur.execute('PRAGMA user_version').fetchone()[0], 0))
+
+    def at(self, list_id: int, write: bool = False) -> SqliteUnitOfWork:
+        """
+        Return the repositories of the partition holding `list_id`.
+        """
+        return self.partition(_partition_of(list_id), write)
+
+    def partition(self, partition: int, write: bool = False, bind: bool = True) -> SqliteUnitOfWork:
+        """
+        Return the repositories of a partition.
+
+        A write unit of work takes the partition's writer the first time it uses a list,
+        unless `bind` is unset, as for reads spanning partitions; other partitions are
+        read from a snapshot.
+
+        Raises:
+            RuntimeError: If `write` is set and the unit of work is read-only or already
+                writes to another partition.
+            DatabaseBusyError: If the partition's writer could not take its database lock.
+        """
+        with self._lock:
+            repo = self._partitions.get(partition)
+            if repo is not None and (not write or partition == self.bound_partition):
+                return repo
+
+            if not self.readonly and self.bound_partition is None and (bind or write):
+                try:
+                    conn = self.stack.enter_context(partition_writer(partition).unit_of_work())
+                except DatabaseBusyError as e:
+                    # Routes may catch it; `PartitionedStore` raises it again once they return
+                    self.busy_error = e
+                    raise
+                self.bound_partition = partition
+            elif write:
+                if self.readonly:
+                    raise RuntimeError("A read-only unit of work cannot write")
+                raise RuntimeError(
+                    f"A unit of work writes to one list partition only; it writes to "
+                    f"partition {self.bound_partition}, not {partition}"
+                )
+            else:
+                conn = self.stack.enter_context(db.partition_pool(partition).snapshot())
+
+            repo = self._partitions[partition] = SqliteUnitOfWork(conn)
+            # Closed before the connection is released (see `SqliteUnitOfWork.close()`)
+            self.stack.callback(repo.close)
+            return repo
+
+    def fan_out_lists(self, list_ids: list[int], query) -> list:
+        """
+        Run `query(repo, ids)` on the partitions holding `list_ids`, with the IDs in each,
+        and return the rows of all of them.
+        """
+        if not list_ids:
+            return []
+        groups = _by_partition(list_ids)
+        return [row for rows in _fan_out(groups, lambda p, ids: query(self.partition(p, bind=False), ids)) for row in rows]
+
+    def fan_out_user(self, user_id: int, query) -> list:
+        """
+        Run `query(repo)` on every partition holding lists of `user_id`, per the
+        directory, and return the rows of all of them.
+        """
+        partitions = self.read_main(lambda cur: [row[0] for row in cur.execute(
+            'SELECT partition_id FROM user_partitions WHERE user_id = ? ORDER BY partition_id', (user_id,)
+        ).fetchall()])
+        groups = dict.fromkeys(partitions)
+        return [row for rows in _fan_out(groups, lambda p, _: query(self.partition(p, bind=False))) for row in rows]
+
+    def read_main(self, query):
+        """
+        Return `query(cursor)` on the application database.
+
+        Reads share one snapshot, which a write unit of work renews after each of its
+        writes to the application database, so they see their own writes.
+        """
+        return query(self._main_cursor())
+
+    def write_main(self, statement):
+        """
+        Return `statement(cursor)` run in its own unit of work on the application database.
+        """
+        if self.readonly:
+            raise RuntimeError("A read-only unit of work cannot write")
+        try:
+            with group_writer.unit_of_work() as conn, closing(conn.cursor()) as cur:
+                result = statement(cur)
+        except DatabaseBusyError as e:
+            self.busy_error = e
+            raise
+        self._release_main()
+        return result
+
+    def lookup_main(self, query: str, ids) -> dict[int, tuple]:
+        """
+        Run `query`, with `{}` standing for the placeholders of `ids`, on the application
+        database in chunks, and return the rows by their first column.
+        """
+        ids = sorted(ids)
+        found = {}
+        for start in range(0, len(ids), LOOKUP_CHUNK_SIZE):
+            chunk = ids[start:start + LOOKUP_CHUNK_SIZE]
+            rows = self.read_main(lambda cur: cur.execute(query.format(_placeholders(chunk)), chunk).fetchall())
+            found.update((row[0], row[1:]) for row in rows)
+        return found
+
+    def add_to_directory(self, user_ids: list[int], partition: int):
+        """
+        Record that `user_ids` have lists in `partition`, before they are added to them.
+
+        The partition's writer is taken first, and the entries are then read from a new
+        snapshot: the purger only prunes entries while holding the partition's write
+        lock, so entries found here stay until the memberships are committed.
+        """
+        if not user_ids:
+            return
+
+        self.partition(partition, write=True)
+        with db.read_pool.snapshot() as conn, closing(conn.cursor()) as cur:
+            present = {row[0] for row in cur.execute(f'''
+                SELECT user_id
+                FROM user_partitions
+                WHERE partition_id = ? AND user_id IN ({_placeholders(user_ids)})
+            ''', (partition, *user_ids)).fetchall()}
+
+        missing = [user_id for user_id in user_ids if user_id not in present]
+        if not missing:
+            return
+
+        self.write_main(lambda cur: cur.executemany(
+            'INSERT OR IGNORE INTO user_partitions (user_id, partition_id) VALUES (?, ?)',
+            [(user_id, partition) for user_id in missing]
+        ))
+
+    def _main_cursor(self) -> sqlite3.Cursor:
+        with self._lock:
+            if self._main is None:
+                self._main_snapshot = db.read_pool.snapshot()
+                self._main = self._main_snapshot.__enter__().cursor()
+                self.stack.callback(self._release_main)
+            return self._main
+
+    def _release_main(self):
+        with self._lock:
+            snapshot, self._main_snapshot, cur, self._main = self._main_snapshot, None, self._main, None
+        if snapshot is not None:
+            cur.close()
+            snapshot.__exit__(None, None, None)
+
+class PartitionedStore(DataStore):
+    """
+    The SQLite application database with its list tables split across `db.LIST_PARTITIONS`
+    partition files.
+
+    Read-only units of work read snapshots from `db.read_pool` and the partitions' pools.
+    Write units of work run on the writer of the partition they use. Units of work that
+    only use notifications run on `writer.notifications_writer` (or `writer.group_writer`
+    if notifications are in the application database).
+    """
+
+    @contextmanager
+    def unit_of_work(self, readonly=False, notifications_only=False):
+        if readonly:
+            with ExitStack() as stack:
+                yield PartitionedUnitOfWork(stack, True, None)
+            return
+
+        if notifications_only:
+            writer = notifications_writer if db.NOTIFICATIONS_DB_PATH else group_writer
+            with ExitStack() as stack:
+                conn = stack.enter_context(writer.unit_of_work())
+                notifications = stack.enter_context(closing(SqliteUnitOfWork(conn))).notifications
+                uow = PartitionedUnitOfWork(stack, False, notifications)
+                yield uow
+            return
+
+        notifications = DeferredNotificationRepository()
+        with ExitStack() as stack:
+            uow = PartitionedUnitOfWork(stack, False, notifications)
+            yield uow
+            if uow.busy_error is not None:
+                # A route turned it into an error response; report it as busy instead
+                raise uow.busy_error
+        if notifications.pending:
+            notification_outbox.put(notifications.pending)
+
@@ -0,0 +1,210 @@
+"""
+Module for capturing slow SQL statements.
+
+`query_profiler` observes every statement executed on an application connection
+(see `db.add_statement_observer()`). Statements slower than the threshold are
+grouped by their normalized SQL text, and for each distinct statement it keeps:
+    - how often it was slow, and its total and maximum duration,
+    - the shapes of its bound parameters (types only, never values),
+    - the routes it ran under,
+    - its `EXPLAIN QUERY PLAN`, captured once on the connection that ran it, with full
+      table scans and temporary B-trees flagged.
+
+The report is served as JSON at `/debug/slow_queries`.
+"""
+
+from contextlib import closing
+import re
+import sqlite3
+import threading
+import time
+
+from flask import has_request_context, request
+
+import db
+from logger import get_logger
+
+logger = get_logger('profiler')
+
+
+# ----------------------------------------------
+#   CONSTANTS
+# ----------------------------------------------
+
+# Distinct statements kept in the report; the least recently slow are evicted first
+MAX_STATEMENTS = 200
+
+# Distinct parameter shapes and routes kept per statement
+MAX_SHAPES = 10
+
+_WHITESPACE = re.compile(r'\s+')
+
+
+# ----------------------------------------------
+#    CLASSES
+# ----------------------------------------------
+
+class QueryProfiler:
+    """
+    Collects statements slower than `threshold` seconds.
+
+    Recording happens on the executing thread, inside the statement observer, so it
+    only normalizes the SQL and updates counters. The first time a statement is slow,
+    `EXPLAIN QUERY PLAN` also runs on the connection that executed it: that connection
+    holds the statement's tables, whichever database file (notifications, list
+    partition) they are in.
+
+    Args:
+        threshold (float): Duration, in seconds, from which a statement counts as slow.
+    """
+
+    def __init__(self, threshold: float = 0.05):
+        self.threshold = threshold
+        self.enabled = False
+        self._lock = threading.Lock()
+        self._statements = {}
+
+    def enable(self, threshold: float | None = None):
+        """
+        Start profiling statements on all application connections.
+        """
+        if threshold is not None:
+            self.threshold = threshold
+        self.enabled = True
+        db.add_statement_observer(self.observe)
+
+    def observe(self, sql: str, parameters, seconds: float, conn: sqlite3.Connection):
+        """
+        Statement observer recording `sql` if it took at least `threshold` seconds.
+        """
+        if seconds < self.threshold or not self.enabled:
+            return
+
+        statement = _WHITESPACE.sub(' ', sql).strip()
+        shape = parameter_shape(parameters)
+        route = request.url_rule.rule if has_request_context() and request.url_rule else None
+
+        with self._lock:
+            entry = self._statements.pop(statement, None)
+            first_seen = entry is None
+            if first_seen:
+                entry = {
+                    'sql': statement,
+                    'count': 0,
+                    'total_seconds': 0.0,
+                    'max_seconds': 0.0,
+                    'last_seen': None,
+                    'parameter_shapes': [],
+                    'routes': [],
+                    'plan': None,
+                    'full_scan': None,
+                    'temp_btree': None,
+                }
+                if len(self._statements) >= MAX_STATEMENTS:
+                    # Dicts keep insertion order, and entries are re-inserted when seen
+                    del self._statements[next(iter(self._statements))]
+
+            entry['count'] += 1
+            entry['total_seconds'] += seconds
+            entry['max_seconds'] = max(entry['max_seconds'], seconds)
+            entry['last_seen'] = time.time()
+            if shape not in entry['parameter_shapes'] and len(entry['parameter_shapes']) < MAX_SHAPES:
+                entry['parameter_shapes'].append(shape)
+            if route and route not in entry['routes'] and len(entry['routes']) < MAX_SHAPES:
+                entry['routes'].append(route)
+            self._statements[statement] = entry
+
+        if first_seen:
+            logger.warning("Slow query (%.1f ms): %.200s", seconds * 1000, statement)
+
+            plan = explain(conn, statement, shape)
+            if plan is not None:
+                with self._lock:
+                    entry['plan'] = plan
+                    entry['full_scan'] = any(is_full_scan(step) for step in plan)
+                    entry['temp_btree'] = any('USE TEMP B-TREE' in step for step in plan)
+
+    def report(self, limit: int = 20, order_by: str = 'total_seconds') -> list[dict]:
+        """
+        Return the slowest statements, with their query plans.
+
+        Args:
+            limit (int, optional): Maximum number of statements to return. Defaults to `20`.
+            order_by (str, optional): `'total_seconds'`, `'max_seconds'` or `'count'`.
+                Defaults to `'total_seconds'`.
+
+        Raises:
+            ValueError: If `order_by` is not a valid key.
+
+        Returns:
+            list[dict]: One entry per statement, slowest first.
+        """
+        if order_by not in ('total_seconds', 'max_seconds', 'count'):
+            raise ValueError(f"Invalid order: {order_by}")
+
+        with self._lock:
+            entries = [dict(entry) for entry in self._statements.values()]
+
+        entries.sort(key=lambda entry: entry[order_by], reverse=True)
+        for entry in entries:
+            entry['mean_seconds'] = entry['total_seconds'] / entry['count']
+        return entries[:limit]
+
+    def reset(self):
+        """
+        Discard all collected statements.
+        """
+        with self._lock:
+            self._statements.clear()
+
+
+# ----------------------------------------------
+#    FUNCTIONS
+# ----------------------------------------------
+
+def parameter_shape(parameters) -> str:
+    """
+    Describe bound parameters by type, e.g. `(int, str)` or `{id: int}`.
+
+    Values are never recorded, so the report cannot leak user data.
+    """
+    if parameters is None:
+        return 'executemany'
+    if isinstance(parameters, dict):
+        return '{' + ', '.join(f"{k}: {type(v).__name__}" for k, v in parameters.items()) + '}'
+    return '(' + ', '.join(type(v).__name__ for v in parameters) + ')'
+
+def explain(conn, statement: str, shape: str) -> list[str] | None:
+    """
+    Return the `EXPLAIN QUERY PLAN` steps of `statement`, or None if it cannot be explained.
+
+    Parameters are bound as NULL; SQLite's plan depends on the statement, not the values.
+    The plan is read through a plain cursor, so it is not itself reported to the statement
+    observers.
+    """
+    if shape.startswith('{'):
+        names = [part.split(':')[0].strip() for part in shape[1:-1].split(',') if part.strip()]
+        parameters = {name: None for name in names}
+    elif shape == 'executemany':
+        parameters = [None] * statement.count('?')
+    else:
+        parameters = [None] * (shape.count(',') + 1 if shape != '()' else 0)
+
+    try:
+        with closing(conn.cursor(sqlite3.Cursor)) as cur:
+            rows = cur.execute(f'EXPLAIN QUERY PLAN {statement}', parameters).fetchall()
+    except Exception:
+        # Statements such as PRAGMA or BEGIN, or ones with placeholders we cannot bind
+        return None
+
+    # Rows are (id, parent, notused, detail)
+    return [row[3] for row in rows]
+
+def is_full_scan(step: str) -> bool:
+    """
+    Whether a query plan step reads a whole table without an index.
+    """
+    return step.startswith('SCAN ') and 'USING' not in step and 'CONSTANT ROW' not in step
+
+
+query_profiler = QueryProfiler()
@@ -0,0 +1,232 @@
+"""
+Module for purging soft-deleted grocery lists in the background.
+
+Deleting a list only sets `grocery_lists.deleted_at`. The `ListPurger` thread later
+removes the list's rows in small batches, each in its own short transaction, so
+deleting a huge list never holds the write lock long enough to stall other writers.
+"""
+
+import sqlite3
+import threading
+
+import db
+from db import connect
+from logger import get_logger
+
+logger = get_logger('purger')
+
+
+# ----------------------------------------------
+#   CONSTANTS
+# ----------------------------------------------
+
+# Maximum rows deleted per transaction
+PURGE_BATCH_SIZE = 500
+
+# Seconds to sleep between batches, giving other writers a chance to take the lock
+PURGE_BATCH_PAUSE = 0.05
+
+# Seconds between scans for soft-deleted lists when not woken explicitly
+PURGE_INTERVAL = 60.0
+
+
+# ----------------------------------------------
+#    CLASSES
+# ----------------------------------------------
+
+class ListPurger:
+    """
+    Background thread that hard-deletes soft-deleted grocery lists.
+
+    For each list with `deleted_at` set, the purger deletes:
+        1. `grocery_list_items` rows, `PURGE_BATCH_SIZE` at a time
+        2. `notifications` referencing the list, `PURGE_BATCH_SIZE` at a time, in the
+           notifications database if they are kept in their own file
+        3. the `grocery_lists` row itself, with `PRAGMA foreign_keys` enabled so the
+           `ON DELETE CASCADE` clauses remove the remaining `grocery_list_users` rows
+
+    A list whose batches are interrupted by `stop()` keeps its row and is finished on
+    the next scan, so the cascade never deletes more than the list's members.
+
+    With list partitions (`db.LIST_PARTITIONS`), each partition is scanned in turn, and
+    the `user_partitions` entries of members left with no list in the partition are
+    removed with the list row.
+    The purger is safe to run in several processes at once; batches are idempotent.
+    """
+
+    def __init__(
+        self,
+        batch_size: int = PURGE_BATCH_SIZE,
+        batch_pause: float = PURGE_BATCH_PAUSE,
+        interval: float = PURGE_INTERVAL
+    ):
+        self.batch_size = batch_size
+        self.batch_pause = batch_pause
+        self.interval = interval
+
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def start(self):
+        """
+        Start the purger thread if it is not already running.
+        """
+        if self._thread and self._thread.is_alive():
+            return
+
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='list-purger', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float | None = None):
+        """
+        Signal the purger thread to stop and wait for it to exit.
+        """
+        self._stop.set()
+        self._wake.set()
+        if self._thread:
+            self._thread.join(timeout)
+
+    def wake(self):
+        """
+        Ask the purger to scan for deleted lists now instead of waiting for the next interval.
+        """
+        self._wake.set()
+
+    def purge_pending(self) -> int:
+        """
+        Purge every soft-deleted list.
+
+        Returns:
+            int: The number of lists purged.
+        """
+        # With list partitions, the lists are in no file with the notifications
+        databases = [f'partition{partition}' for partition in range(db.LIST_PARTITIONS)] or ['main']
+        separate = db.NOTIFICATIONS_DB_PATH or db.LIST_PARTITIONS
+        notifications_conn = connect(database='notifications') if separate else None
+        directory_conn = connect() if db.LIST_PARTITIONS else None
+        purged = 0
+        try:
+            for database in databases:
+                conn = connect(foreign_keys=True, database=database)
+                try:
+                    list_ids = [row[0] for row in conn.execute('''
+                        SELECT list_id
+                        FROM grocery_lists
+                        WHERE deleted_at IS NOT NULL
+                    ''').fetchall()]
+
+                    for list_id in list_ids:
+                        if self._stop.is_set():
+                            return purged
+                        if self.purge_list(conn, list_id, notifications_conn, directory_conn):
+                            purged += 1
+                finally:
+                    conn.close()
+
+            return purged
+        finally:
+            for extra_conn in (notifications_conn, directory_conn):
+                if extra_conn is not None:
+                    extra_conn.close()
+
+    def purge_list(
+        self,
+        conn: sqlite3.Connection,
+        list_id: int,
+        notifications_conn: sqlite3.Connection | None = None,
+        directory_conn: sqlite3.Connection | None = None
+    ) -> bool:
+        """
+        Hard-delete a single soft-deleted list in bounded batches.
+
+        Args:
+            conn (sqlite3.Connection): Connection with `PRAGMA foreign_keys` enabled.
+            list_id (int): ID of the list to purge.
+            notifications_conn (sqlite3.Connection, optional): Connection to the notifications
+                database, if it is separate. Defaults to `conn`.
+            directory_conn (sqlite3.Connection, optional): Connection to the application
+                database, with list partitions, to prune its `user_partitions` entries.
+
+        Returns:
+            bool: Whether the list was purged, False if the purger was stopped first.
+        """
+        items_deleted = self._delete_in_batches(conn, '''
+            DELETE FROM grocery_list_items
+            WHERE list_id = ? AND item_id IN (
+                SELECT item_id
+                FROM grocery_list_items
+                WHERE list_id = ?
+                LIMIT ?
+            )
+        ''', (list_id, list_id, self.batch_size))
+        if self._stop.is_set():
+            return False
+
+        notifications_deleted = self._delete_in_batches(notifications_conn or conn, '''
+            DELETE FROM notifications
+            WHERE id IN (
+                SELECT id
+                FROM notifications
+                WHERE requested_list_id = ?
+                LIMIT ?
+            )
+        ''', (list_id, self.batch_size))
+        if self._stop.is_set():
+            return False
+
+        with conn:
+            # Holding the partition's write lock keeps members from joining its lists meanwhile
+            conn.execute('BEGIN IMMEDIATE')
+            member_ids = [row[0] for row in conn.execute(
+                'SELECT user_id FROM grocery_list_users WHERE list_id = ?', (list_id,)
+            ).fetchall()]
+
+            # Remaining grocery_list_users rows are removed by ON DELETE CASCADE
+            conn.execute('DELETE FROM grocery_lists WHERE list_id = ? AND deleted_at IS NOT NULL', (list_id,))
+
+            if directory_conn is not None:
+                self._prune_directory(conn, directory_conn, list_id % db.LIST_PARTITIONS, member_ids)
+
+        logger.info("Purged list %s (%s items, %s notifications)", list_id, items_deleted, notifications_deleted)
+        return True
+
+    def _prune_directory(self, conn: sqlite3.Connection, directory_conn: sqlite3.Connection, partition: int, member_ids: list[int]):
+        # Committed before the partition's transaction, while its write lock is still held
+        orphaned = [
+            (user_id, partition) for user_id in member_ids
+            if conn.execute('SELECT 1 FROM grocery_list_users WHERE user_id = ? LIMIT 1', (user_id,)).fetchone() is None
+        ]
+        if orphaned:
+            with directory_conn:
+                directory_conn.executemany(
+                    'DELETE FROM user_partitions WHERE user_id = ? AND partition_id = ?', orphaned
+                )
+
+    def _delete_in_batches(self, conn: sqlite3.Connection, query: str, params: tuple) -> int:
+        total = 0
+        while not self._stop.is_set():
+            with conn:
+                deleted = conn.execute(query, params).rowcount
+            total += deleted
+
+            if deleted < self.batch_size:
+                break
+            self._stop.wait(self.batch_pause)
+
+        return total
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.purge_pending()
+            except sqlite3.Error as e:
+                logger.error("List purge failed: %s", e)
+
+            self._wake.wait(self.interval)
+            self._wake.clear()
+
+
+# Shared purger for the server process
+list_purger = ListPurger()
@@ -0,0 +1,496 @@
+"""
+Module defining the data-access interface used by the routes.
+
+Routes never touch SQL or database cursors directly. They open a unit of work with
+`get_repo()` and go through its repositories:
+    - `repo.users`: Accounts and credentials (`users`).
+    - `repo.lists`: Grocery lists and templates (`grocery_lists`).
+    - `repo.memberships`: Users' roles in lists (`grocery_list_users`).
+    - `repo.items`: Categories, items and the items on each list (`categories`,
+      `items`, `grocery_list_items`).
+    - `repo.notifications`: User notifications (`notifications`).
+
+Three backends implement the interface:
+    - `sqlite_repository.SqliteStore`: The application database (the default).
+    - `partitioned_repository.PartitionedStore`: The application database with the list
+      tables split across several files (`db.LIST_PARTITIONS`), written in parallel.
+    - `memory_repository.MemoryStore`: Dicts and indexes held in process, for
+      benchmarking route logic without I/O and for backing hot tables with faster stores.
+
+Rows are returned as plain tuples, with the fields documented on each method (or
+named tuples, like `ListContext`).
+Timestamps are strings in SQLite's `CURRENT_TIMESTAMP` format (`YYYY-MM-DD HH:MM:SS`, UTC),
+though the backends store them as integer milliseconds since the Unix epoch (see
+`now_ms()` and `format_timestamp()`).
+"""
+
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+import time
+from typing import NamedTuple
+
+
+# ----------------------------------------------
+#    EXCEPTIONS
+# ----------------------------------------------
+
+class IntegrityError(Exception):
+    """
+    Raised when a write would violate a uniqueness constraint, such as adding an
+    item that is already on a list.
+    """
+
+class DatabaseBusyError(Exception):
+    """
+    Raised when a write unit of work could not take the database lock, or commit,
+    before its deadline because other writers held the database. Nothing of the unit
+    of work was applied, so the operation can be retried.
+    """
+
+
+# ----------------------------------------------
+#    ROWS
+# ----------------------------------------------
+
+class ListContext(NamedTuple):
+    """
+    A list as seen by one of its members, loaded in one lookup by
+    `ListRepository.context()` for routes that change the list and notify its members.
+    """
+    role: str
+    name: str
+    version: int
+    member_ids: list[int]
+
+
+# ----------------------------------------------
+#    REPOSITORIES
+# ----------------------------------------------
+
+class UserRepository(ABC):
+    @abstractmethod
+    def get_credentials(self, username: str) -> tuple[int, bytes] | None:
+        """
+        Return `(user_id, password_hash)` for `username`, or None if the user does not exist.
+        """
+
+    @abstractmethod
+    def get_id(self, username: str) -> int | None:
+        """
+        Return the ID of `username`, or None if the user does not exist.
+        """
+
+    @abstractmethod
+    def create(self, username: str, password_hash: bytes) -> int:
+        """
+        Create a user and return their ID.
+
+        Raises:
+            IntegrityError: If the username is taken.
+        """
+
+    @abstractmethod
+    def search(self, prefix: str, exclude_username: str) -> list[tuple[int, str]]:
+        """
+        Return `(user_id, username)` of users whose name starts with `prefix`,
+        case-insensitively, other than `exclude_username`.
+        """
+
+class ListRepository(ABC):
+    @abstractmethod
+    def create(self, name: str, is_template: bool = False) -> int:
+        """
+        Create a list (or template) and return its ID. It has no members yet.
+        """
+
+    @abstractmethod
+    def get_name(self, list_id: int) -> str | None:
+        """
+        Return the name of a list that has not been deleted, or None.
+        """
+
+    @abstractmethod
+    def get_info(self, list_id: int) -> tuple[str, str] | None:
+        """
+        Return `(name, update_date)` of a list that has not been deleted, or None.
+        """
+
+    @abstractmethod
+    def context(self, list_id: int, user_id: int) -> ListContext | None:
+        """
+        Return the user's role in a list, the list's name and version, and the IDs of
+        all its members (including `user_id`), or None if the user is not a member or
+        the list was deleted.
+        """
+
+    @abstractmethod
+    def for_user(self, user_id: int) -> list[tuple[int, str, str, str]]:
+        """
+        Return `(list_id, name, role, update_date)` of a user's lists, excluding
+        templates and deleted lists, most recently updated first.
+        """
+
+    @abstractmethod
+    def most_recent_for_user(self, user_id: int) -> int | None:
+        """
+        Return the ID of the user's most recently updated list, or None if they have none.
+        """
+
+    @abstractmethod
+    def versions_for_user(self, user_id: int, list_ids: list[int] | None = None) -> list[tuple[int, str, int]]:
+        """
+        Return `(list_id, name, version)` of a user's lists, excluding templates and
+        deleted lists, ordered by ID. If `list_ids` is given, only those lists are included.
+        """
+
+    @abstractmethod
+    def accessible(self, user_id: int, list_ids: list[int]) -> list[tuple[int, str, str, str]]:
+        """
+        Return `(list_id, role, name, update_date)` for each of `list_ids` the user
+        is a member of and that has not been deleted.
+        """
+
+    @abstractmethod
+    def templates_for_user(self, user_id: int) -> list[tuple[int, str, str, int]]:
+        """
+        Return `(list_id, name, update_date, item_count)` of a user's templates, ordered by name.
+        """
+
+    @abstractmethod
+    def touch(self, list_id: int):
+        """
+        Set a list's update date to now and bump its version.
+        """
+
+    @abstractmethod
+    def rename(self, list_id: int, name: str):
+        """
+        Rename a list, setting its update date to now and bumping its version.
+        """
+
+    @abstractmethod
+    def soft_delete(self, list_id: int):
+        """
+        Mark a list as deleted. Its rows are removed later (see `purger.py`).
+        """
+
+class MembershipRepository(ABC):
+    @abstractmethod
+    def get_role(self, list_id: int, user_id: int) -> str | None:
+        """
+        Return a user's role in a list, or None if they are not a member or the list was deleted.
+        """
+
+    @abstractmethod
+    def add(self, list_id: int, user_id: int, role: str):
+        """
+        Add a user to a list.
+
+        Raises:
+            IntegrityError: If the user is already a member.
+        """
+
+    @abstractmethod
+    def accept_invite(self, list_id: int, user_id: int, role: str):
+        """
+        Add a user to a list unless they are already a member or the list was deleted.
+        """
+
+    @abstractmethod
+    def remove(self, list_id: int, user_id: int):
+        """
+        Remove a user from a list.
+        """
+
+    @abstractmethod
+    def set_role(self, list_id: int, user_id: int, role: str):
+        """
+        Change a member's role in a list.
+        """
+
+    @abstractmethod
+    def other_members(self, list_id: int, user_id: int) -> list[tuple[int, str]]:
+        """
+        Return `(user_id, role)` of the members of a list other than `user_id`.
+        """
+
+    @abstractmethod
+    def other_member_ids(self, list_id: int, user_id: int) -> list[int]:
+        """
+        Return the IDs of the members of a list other than `user_id`.
+        """
+
+    @abstractmethod
+    def other_members_of_lists(self, list_ids: list[int], user_id: int) -> list[tuple[int, int, str, str]]:
+        """
+        Return `(list_id, user_id, username, role)` of the members of several lists other than `user_id`.
+        """
+
+    @abstractmethod
+    def copy(self, source_list_id: int, list_id: int, exclude_user_id: int):
+        """
+        Copy the members of one list, other than `exclude_user_id`, to another.
+        The source list's owner becomes an admin of the copy.
+        """
+
+class ItemRepository(ABC):
+    @abstractmethod
+    def categories(self) -> list[tuple[str, int]]:
+        """
+        Return `(name, category_id)` of every category.
+        """
+
+    @abstractmethod
+    def category_id(self, name: str) -> int | None:
+        """
+        Return the ID of a category, or None if it does not exist.
+        """
+
+    @abstractmethod
+    def find(self, name: str, category_id: int) -> int | None:
+        """
+        Return the ID of the item with `name` in a category, or None.
+        """
+
+    @abstractmethod
+    def create(self, name: str, category_id: int | None) -> int:
+        """
+        Create an item and return its ID.
+        """
+
+    @abstractmethod
+    def get_name(self, item_id: int) -> str | None:
+        """
+        Return the name of an item, or None if it does not exist.
+        """
+
+    @abstractmethod
+    def created_after(self, item_id: int) -> list[tuple[int, str, int | None]]:
+        """
+        Return `(item_id, name, category_id)` of items with an ID above `item_id`, ordered by ID.
+        """
+
+    @abstractmethod
+    def on_list(self, list_id: int) -> list[tuple[int, int]]:
+        """
+        Return `(item_id, quantity)` of the items on a list.
+        """
+
+    @abstractmethod
+    def on_lists(self, list_ids: list[int]) -> list[tuple[int, int, int]]:
+        """
+        Return `(list_id, item_id, quantity)` of the items on several lists, grouped by list.
+        """
+
+    @abstractmethod
+    def add_to_list(self, list_id: int, item_id: int, quantity: int):
+        """
+        Add an item to a list.
+
+        Raises:
+            IntegrityError: If the item is already on the list.
+        """
+
+    @abstractmethod
+    def add_many_to_list(self, list_id: int, items: list[tuple[int, int]]):
+        """
+        Add `(item_id, quantity)` pairs to a list.
+
+        Raises:
+            IntegrityError: If an item is already on the list.
+        """
+
+    @abstractmethod
+    def set_quantity(self, list_id: int, item_id: int, quantity: int):
+        """
+        Change the quantity of an item on a list.
+        """
+
+    @abstractmethod
+    def remove_from_list(self, list_id: int, item_id: int):
+        """
+        Remove an item from a list.
+        """
+
+    @abstractmethod
+    def copy_list(self, source_list_id: int, list_id: int, reset_quantities: bool = False):
+        """
+        Copy all items of one list to another, optionally with every quantity set to 1.
+        """
+
+    @abstractmethod
+    def totals_for_lists(self, list_ids: list[int]) -> list[tuple[str, int, str, int, list[tuple[int, int]]]]:
+        """
+        Combine the items of several lists, one row per item.
+
+        Returns:
+            list[tuple]: `(category_name, item_id, name, total_quantity, [(list_id, quantity), ...])`,
+                ordered by category name, then item name. Items without a category are excluded.
+        """
+
+class NotificationRepository(ABC):
+    @abstractmethod
+    def create(
+        self,
+        user_id: int,
+        message: str,
+        icon: str,
+        actionable: bool,
+        action_type: str | None,
+        requested_list_id: int | None,
+        unread: bool,
+        data: str | None
+    ) -> int | None:
+        """
+        Store a notification and return its ID. `data` is a JSON string.
+
+        The ID is None if the notification is only written after the unit of work is
+        committed (see `sqlite_repository.DeferredNotificationRepository`).
+        """
+
+    @abstractmethod
+    def for_user(self, user_id: int, limit: int, after_id: int | None = None) -> list[tuple]:
+        """
+        Return a user's notifications, unread first, then newest first, hiding
+        notifications about deleted lists.
+
+        Returns:
+            list[tuple]: `(id, icon, message, actionable, action_type, requested_list_id,
+                unread, created_at, data)` rows, at most `limit`, with IDs above `after_id` if given.
+        """
+
+    @abstractmethod
+    def mark_read(self, notification_ids: list[int]):
+        """
+        Mark notifications as read.
+        """
+
+    @abstractmethod
+    def delete(self, notification_ids: list[int]):
+        """
+        Delete notifications.
+        """
+
+
+# ----------------------------------------------
+#    UNIT OF WORK
+# ----------------------------------------------
+
+class UnitOfWork(ABC):
+    """
+    The repositories of one transaction.
+
+    Changes made through them are committed together when the `get_repo()` block
+    exits normally (including via `return`) and discarded if it raises.
+    """
+
+    users: UserRepository
+    lists: ListRepository
+    memberships: MembershipRepository
+    items: ItemRepository
+    notifications: NotificationRepository
+
+    @abstractmethod
+    def snapshot(self):
+        """
+        Make every following read in this unit of work see the same state, e.g. so
+        a response's ETag and its payload agree.
+        """
+
+    @abstractmethod
+    def pending_migrations(self) -> int:
+        """
+        Return the number of schema migrations not yet applied to the backing store.
+        """
+
+class DataStore(ABC):
+    """
+    A backend holding the application data.
+    """
+
+    @abstractmethod
+    def unit_of_work(self, readonly: bool = False, notifications_only: bool = False):
+        """
+        Context manager yielding a `UnitOfWork`.
+
+        Args:
+            readonly (bool, optional): Whether the unit of work only reads. Read-only units
+                of work see a single snapshot throughout and must not write. Defaults to False.
+            notifications_only (bool, optional): Whether the unit of work only uses
+                `notifications`. Backends keeping notifications apart may then leave the
+                rest of the data untouched. Defaults to False.
+        """
+
+
+# ----------------------------------------------
+#    FUNCTIONS
+# ----------------------------------------------
+
+_store: DataStore | None = None
+
+def configure(store: DataStore):
+    """
+    Set the backend used by all new units of work.
+
+    Args:
+        store (DataStore): The backend, e.g. `SqliteStore()` or `MemoryStore()`.
+    """
+    global _store
+    _store = store
+
+def get_store() -> DataStore:
+    """
+    Return the configured backend, defaulting to the SQLite application database.
+    """
+    global _store
+    if _store is None:
+        import db
+        if db.LIST_PARTITIONS:
+            from partitioned_repository import PartitionedStore
+            _store = PartitionedStore()
+        else:
+            from sqlite_repository import SqliteStore
+            _store = SqliteStore()
+    return _store
+
+@contextmanager
+def get_repo(readonly: bool = False, notifications_only: bool = False):
+    """
+    Context manager yielding a `UnitOfWork` on the configured backend.
+
+    Args:
+        readonly (bool, optional): Whether the unit of work only reads, as for GET routes.
+            On SQLite it then runs on a read-only connection from `db.read_pool`, on one
+            snapshot, without holding up writers or WAL checkpoints. Defaults to False.
+        notifications_only (bool, optional): Whether the unit of work only uses
+            `repo.notifications`. On SQLite with a separate notifications database, it
+            then runs on that database's writer alone. Defaults to False.
+
+    Example:
+        >>> with get_repo(readonly=True) as repo:
+        ...     role = repo.memberships.get_role(list_id, user_id)
+    """
+    with get_store().unit_of_work(readonly, notifications_only) as repo:
+        yield repo
+
+def now_ms() -> int:
+    """
+    Return the current time in milliseconds since the Unix epoch, as stored in the
+    timestamp columns (`grocery_lists.creation_date`, `grocery_lists.update_date`,
+    `notifications.created_at`).
+    """
+    return time.time_ns() // 1_000_000
+
+def format_timestamp(ms: int | None) -> str | None:
+    """
+    Format a timestamp stored by `now_ms()` as the repositories return it.
+
+    Args:
+        ms (int | None): Milliseconds since the Unix epoch.
+
+    Returns:
+        str | None: The timestamp as `YYYY-MM-DD HH:MM:SS` (UTC), or None if `ms` is None.
+    """
+    if ms is None:
+        return None
+    return time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(ms // 1000))
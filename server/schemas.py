@@ -0,0 +1,311 @@
+"""
+Module for decoding and validating JSON request bodies.
+
+Request bodies are declared as dataclasses. `decode()` parses the raw body with the
+app's JSON provider and converts it into the declared dataclass in a single pass,
+checking types along the way, so malformed input is rejected with a `400` before a
+route touches the database.
+
+Routes opt in with the `validate_body` decorator, which passes the decoded object as
+the `body` keyword argument:
+
+    @bp.route('/list/delete_item', methods=['POST'])
+    @validate_body(DeleteItemRequest)
+    def delete_item(body: DeleteItemRequest):
+        ...
+"""
+
+from dataclasses import MISSING, dataclass, field, fields, is_dataclass
+from functools import wraps
+import json
+import time
+import types
+import typing
+
+from flask import current_app, g, jsonify, make_response, request
+
+from logger import get_logger
+
+logger = get_logger('schemas')
+
+
+# ----------------------------------------------
+#    ERRORS
+# ----------------------------------------------
+
+class ValidationError(ValueError):
+    """
+    Raised when a request body does not match its schema.
+
+    Args:
+        message (str): Description of the problem.
+        path (str, optional): Location of the offending value, e.g. `item.quantity`.
+    """
+
+    def __init__(self, message: str, path: str = ''):
+        self.path = path
+        super().__init__(f"{path}: {message}" if path else message)
+
+
+# ----------------------------------------------
+#    FIELD HELPERS
+# ----------------------------------------------
+
+def alias(name: str, default=MISSING, default_factory=MISSING):
+    """
+    Declare a dataclass field whose JSON key differs from its attribute name.
+
+    Example:
+        >>> list_id: int = alias('listId')
+    """
+    return field(default=default, default_factory=default_factory, metadata={'alias': name})
+
+
+# ----------------------------------------------
+#    DECODING
+# ----------------------------------------------
+
+def _type_name(tp) -> str:
+    return getattr(tp, '__name__', str(tp))
+
+def _convert(value, tp, path: str):
+    """
+    Convert a parsed JSON value to type `tp`, raising `ValidationError` on mismatch.
+    """
+    origin = typing.get_origin(tp)
+
+    # Optional[X] / X | None, and other unions: the first matching member wins
+    if origin in (typing.Union, types.UnionType):
+        members = typing.get_args(tp)
+        if value is None:
+            if type(None) in members:
+                return None
+            raise ValidationError("must not be null", path)
+        for member in members:
+            if member is type(None):
+                continue
+            try:
+                return _convert(value, member, path)
+            except ValidationError:
+                continue
+        raise ValidationError(f"expected {' | '.join(_type_name(m) for m in members)}", path)
+
+    if origin is list:
+        if not isinstance(value, list):
+            raise ValidationError("expected a list", path)
+        (item_type,) = typing.get_args(tp) or (typing.Any,)
+        return [_convert(v, item_type, f"{path}[{i}]") for i, v in enumerate(value)]
+
+    if tp is typing.Any:
+        return value
+
+    if is_dataclass(tp):
+        if not isinstance(value, dict):
+            raise ValidationError("expected an object", path)
+        return _decode_object(value, tp, path)
+
+    if tp is dict or origin is dict:
+        if not isinstance(value, dict):
+            raise ValidationError("expected an object", path)
+        return value
+
+    if tp is bool:
+        if not isinstance(value, bool):
+            raise ValidationError("expected a boolean", path)
+        return value
+
+    if tp is int:
+        # Numeric strings are accepted, since HTML number inputs submit strings
+        if isinstance(value, int) and not isinstance(value, bool):
+            return value
+        if isinstance(value, str):
+            try:
+                return int(value.strip())
+            except ValueError:
+                pass
+        raise ValidationError("expected an integer", path)
+
+    if tp is float:
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            return float(value)
+        raise ValidationError("expected a number", path)
+
+    if tp is str:
+        if not isinstance(value, str):
+            raise ValidationError("expected a string", path)
+        return value
+
+    raise TypeError(f"Unsupported schema type: {tp}")
+
+def _decode_object(data: dict, schema: type, path: str = ''):
+    hints = typing.get_type_hints(schema)
+    values = {}
+
+    for f in fields(schema):
+        key = f.metadata.get('alias', f.name)
+        field_path = f"{path}.{key}" if path else key
+
+        if key in data:
+            values[f.name] = _convert(data[key], hints[f.name], field_path)
+        elif f.default is MISSING and f.default_factory is MISSING:
+            raise ValidationError("is required", field_path)
+
+    # Unknown keys are ignored so older servers accept newer clients
+    return schema(**values)
+
+def decode(schema: type, body: bytes | str):
+    """
+    Parse a JSON request body and convert it into an instance of `schema`.
+
+    Args:
+        schema (type): A dataclass describing the expected body.
+        body (bytes | str): The raw request body.
+
+    Raises:
+        ValidationError: If the body is not valid JSON or does not match `schema`.
+
+    Returns:
+        An instance of `schema`.
+    """
+    try:
+        data = current_app.json.loads(body) if body else {}
+    except (ValueError, json.JSONDecodeError) as e:
+        raise ValidationError(f"Malformed JSON body: {e}")
+
+    if not isinstance(data, dict):
+        raise ValidationError("Request body must be a JSON object")
+
+    return _decode_object(data, schema)
+
+def validate_body(schema: type):
+    """
+    Route decorator that decodes the request body into `schema` and passes it as `body`.
+
+    Malformed bodies are rejected with `400 Bad Request` and JSON `{ success: False, error: str }`.
+    The time spent decoding is stored as `g.decode_seconds` and reported in the
+    response's `Server-Timing` header as `decode`.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                body = decode(schema, request.get_data())
+            except ValidationError as e:
+                g.decode_seconds = time.perf_counter() - start
+                logger.warning("Rejected %s body: %s", schema.__name__, e)
+                response = make_response(jsonify({'success': False, 'error': f'Invalid request: {e}'}), 400)
+            else:
+                g.decode_seconds = time.perf_counter() - start
+                response = make_response(view(*args, body=body, **kwargs))
+
+            response.headers.add('Server-Timing', f'decode;dur={g.decode_seconds * 1000:.3f}')
+            return response
+
+        return wrapper
+
+    return decorator
+
+
+# ----------------------------------------------
+#    SCHEMAS
+# ----------------------------------------------
+
+@dataclass
+class LoginRequest:
+    username: str
+    password: str
+    keep_logged_in: bool = alias('keepLoggedIn', default=False)
+
+@dataclass
+class RegisterRequest:
+    username: str
+    password: str
+
+@dataclass
+class SetThemeRequest:
+    new_theme: str | None = alias('newTheme', default=None)
+
+@dataclass
+class NotificationIdsRequest:
+    notification_ids: list[int] = alias('notificationIds', default_factory=list)
+
+@dataclass
+class ListUser:
+    user_id: int
+    role: str
+    username: str | None = None
+
+@dataclass
+class NewListItem:
+    item_id: int
+    quantity: int = 1
+
+@dataclass
+class CreateListRequest:
+    list_name: str = alias('listName', default='New List')
+    other_users: list[ListUser] = alias('otherUsers', default_factory=list)
+    items: list[NewListItem] = field(default_factory=list)
+
+@dataclass
+class CloneListRequest:
+    source_list_id: int = alias('sourceListId')
+    list_name: str | None = alias('listName', default=None)
+    reset_quantities: bool = alias('resetQuantities', default=False)
+    include_members: bool = alias('includeMembers', default=False)
+    as_template: bool = alias('asTemplate', default=False)
+
+@dataclass
+class DeleteListRequest:
+    list_id: int = alias('listId')
+
+@dataclass
+class EditListRequest:
+    list_id: int = alias('listId')
+    list_name: str = alias('listName')
+    other_users: list[ListUser] = alias('otherUsers', default_factory=list)
+
+@dataclass
+class ItemData:
+    name: str
+    category: str
+    quantity: int = 1
+    id: int | None = None
+
+@dataclass
+class AddItemRequest:
+    list_id: int = alias('listId')
+    item: ItemData
+
+@dataclass
+class EditItemRequest:
+    list_id: int = alias('listId')
+    old_item: ItemData = alias('oldItem')
+    new_item: ItemData = alias('newItem')
+
+@dataclass
+class DeleteItemRequest:
+    list_id: int = alias('currentListId')
+    item_id: int = alias('itemId')
+
+@dataclass
+class AddUserToListRequest:
+    list_id: int = alias('currentListId')
+    username: str
+    # Notification data, either decoded or as the JSON string stored with the notification
+    data: dict | str | None = None
+
+    def __post_init__(self):
+        if isinstance(self.data, str):
+            try:
+                self.data = json.loads(self.data)
+            except ValueError:
+                raise ValidationError("expected a JSON object", 'data')
+
+        if self.data is not None and not isinstance(self.data, dict):
+            raise ValidationError("expected a JSON object", 'data')
+
+@dataclass
+class ManageUsersRequest:
+    list_id: int = alias('currentListId')
+    other_users: list[ListUser] = alias('otherUsers', default_factory=list)
@@ -0,0 +1,202 @@
+"""
+Production entry point for the Flask backend.
+
+Runs the app under a pre-fork WSGI server instead of the single-threaded Werkzeug
+development server started by `python app.py`:
+
+    python serve.py                                  # gunicorn if installed, else waitress
+    python serve.py --server gunicorn --workers 4 --threads 8 --bind 0.0.0.0:5000
+    python serve.py --server waitress --threads 16
+    python serve.py --server uvicorn --workers 4     # async mode, see asgi.py
+
+gunicorn (Linux/macOS) runs several worker processes, so requests use more than
+one core. Sending SIGHUP to the gunicorn master reloads the configuration and
+replaces workers gracefully; in-flight requests get `--graceful-timeout` seconds
+to finish. waitress (any platform, including Windows) runs a single multi-threaded
+process. uvicorn runs the ASGI entry point in `asgi.py`, serving the I/O-bound read
+endpoints asynchronously.
+
+All options can also be set through `GROCERY_*` environment variables (see `DEFAULTS`).
+"""
+
+import argparse
+import multiprocessing
+import os
+import socket
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+# ----------------------------------------------
+#   CONSTANTS
+# ----------------------------------------------
+
+DEFAULTS = {
+    'server': os.getenv('GROCERY_SERVER', 'auto'),
+    'bind': os.getenv('GROCERY_BIND', '0.0.0.0:5000'),
+    'workers': int(os.getenv('GROCERY_WORKERS', multiprocessing.cpu_count() * 2 + 1)),
+    'threads': int(os.getenv('GROCERY_THREADS', 4)),
+    'timeout': int(os.getenv('GROCERY_TIMEOUT', 30)),
+    'graceful_timeout': int(os.getenv('GROCERY_GRACEFUL_TIMEOUT', 30)),
+    'max_requests': int(os.getenv('GROCERY_MAX_REQUESTS', 0)),
+}
+
+
+# ----------------------------------------------
+#    FUNCTIONS
+# ----------------------------------------------
+
+def migrate():
+    """
+    Bring the database up to the current schema once, before any worker starts.
+    """
+    import db
+    from migrations import apply_migrations
+
+    db.configure(
+        os.getenv('GROCERY_DB_PATH', db.DB_PATH),
+        os.getenv('GROCERY_NOTIFICATIONS_DB_PATH') or None,
+        int(os.getenv('GROCERY_LIST_PARTITIONS', 0))
+    )
+    conn = db.connect()
+    try:
+        apply_migrations(conn)
+    finally:
+        conn.close()
+
+def warm_up(app):
+    """
+    Prepare a freshly started worker before it accepts requests.
+
+    Loads the in-process item catalog (reading the item tables into the OS page
+    cache on the way), so the first requests served by the worker do not pay for it.
+    """
+    from catalog import item_catalog
+    from logger import logger
+    from repository import get_repo
+
+    with app.app_context(), get_repo() as repo:
+        item_catalog.ensure_loaded(repo.items)
+
+    logger.info("Worker %s warmed up", os.getpid())
+
+def build_app():
+    """
+    Build the app for a worker. Migrations already ran in the parent process.
+    """
+    from app import create_app
+
+    return create_app({'RUN_MIGRATIONS': False})
+
+def run_gunicorn(options: argparse.Namespace):
+    """
+    Serve the app with gunicorn's pre-fork worker model.
+    """
+    from gunicorn.app.base import BaseApplication
+
+    class GroceryApplication(BaseApplication):
+        def load_config(self):
+            self.cfg.set('bind', options.bind)
+            self.cfg.set('workers', options.workers)
+            self.cfg.set('threads', options.threads)
+            self.cfg.set('worker_class', 'gthread')
+            self.cfg.set('timeout', options.timeout)
+            self.cfg.set('graceful_timeout', options.graceful_timeout)
+            self.cfg.set('max_requests', options.max_requests)
+            self.cfg.set('max_requests_jitter', options.max_requests // 10)
+            # Each worker builds its own app, so no SQLite connection or thread
+            # (e.g. the list purger) is ever shared across fork()
+            self.cfg.set('preload_app', False)
+            self.cfg.set('on_starting', lambda server: migrate())
+            self.cfg.set('post_worker_init', lambda worker: warm_up(worker.wsgi))
+
+        def load(self):
+            return build_app()
+
+    GroceryApplication().run()
+
+def run_waitress(options: argparse.Namespace):
+    """
+    Serve the app with waitress in a single multi-threaded process.
+    """
+    from waitress import serve
+
+    migrate()
+    app = build_app()
+    warm_up(app)
+
+    host, _, port = options.bind.rpartition(':')
+    serve(app, host=host or '0.0.0.0', port=int(port), threads=options.threads)
+
+def bind_listener(bind: str) -> socket.socket:
+    """
+    Bind a TCP listening socket to `host:port`, with `TCP_NODELAY` set.
+
+    Sockets accepted from it inherit `TCP_NODELAY`. uvicorn workers serving a listener
+    they inherit do not set it themselves, so responses, written as separate header and
+    body writes, would each wait out Nagle's algorithm against the client's delayed ACK
+    (about 40 ms on Linux).
+    """
+    host, _, port = bind.rpartition(':')
+    host = host.strip('[]') or '0.0.0.0'
+    sock = socket.socket(socket.AF_INET6 if ':' in host else socket.AF_INET)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    sock.bind((host, int(port)))
+    sock.set_inheritable(True)
+    return sock
+
+def run_uvicorn(options: argparse.Namespace):
+    """
+    Serve the ASGI app (`asgi.py`) with uvicorn worker processes, on a listener bound
+    by `bind_listener()`.
+    """
+    import uvicorn
+
+    migrate()
+    # Workers import `asgi` themselves and must not re-run migrations
+    os.environ['GROCERY_RUN_MIGRATIONS'] = '0'
+    # Sizes the thread pool running the routes forwarded to Flask
+    os.environ['GROCERY_THREADS'] = str(options.threads)
+
+    listener = bind_listener(options.bind)
+    uvicorn.run(
+        'asgi:app',
+        fd=listener.fileno(),
+        workers=options.workers,
+        timeout_graceful_shutdown=options.graceful_timeout,
+        limit_max_requests=options.max_requests or None,
+        lifespan='on'
+    )
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the grocery app backend with a production WSGI or ASGI server.")
+    parser.add_argument('--server', choices=['auto', 'gunicorn', 'waitress', 'uvicorn'], default=DEFAULTS['server'])
+    parser.add_argument('--bind', default=DEFAULTS['bind'], help="host:port to listen on")
+    parser.add_argument('--workers', type=int, default=DEFAULTS['workers'], help="worker processes (gunicorn and uvicorn)")
+    parser.add_argument('--threads', type=int, default=DEFAULTS['threads'], help="threads per worker")
+    parser.add_argument('--timeout', type=int, default=DEFAULTS['timeout'], help="seconds before a silent worker is restarted (gunicorn only)")
+    parser.add_argument('--graceful-timeout', type=int, default=DEFAULTS['graceful_timeout'], help="seconds workers get to finish requests on reload/shutdown (gunicorn and uvicorn)")
+    parser.add_argument('--max-requests', type=int, default=DEFAULTS['max_requests'], help="recycle workers after this many requests, 0 to disable (gunicorn and uvicorn)")
+    options = parser.parse_args()
+
+    server = options.server
+    if server == 'auto':
+        try:
+            import gunicorn  # noqa: F401
+            server = 'gunicorn'
+        except ImportError:
+            server = 'waitress'
+
+    if server == 'gunicorn':
+        run_gunicorn(options)
+    elif server == 'uvicorn':
+        run_uvicorn(options)
+    else:
+        run_waitress(options)
+
+
+if __name__ == '__main__':
+    main()
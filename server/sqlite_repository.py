@@ -0,0 +1,597 @@
+"""
+Module implementing the data-access interface (see `repository.py`) on the SQLite
+application database.
+
+Read-only units of work run on a pooled read-only connection, in one snapshot. Write
+units of work run on the process's group-commit writer (see `writer.py`). All
+repositories of a unit of work share a single cursor.
+
+When notifications are kept in their own database (`db.NOTIFICATIONS_DB_PATH`), a
+write unit of work queues its notification writes, and `notification_outbox` writes
+them on the notifications writer once its other changes are committed.
+"""
+
+import atexit
+from contextlib import closing, contextmanager
+import os
+import queue
+import sqlite3
+import threading
+
+import db
+from logger import get_logger
+from metrics import metrics
+from migrations import MIGRATIONS
+from repository import (
+    DataStore,
+    IntegrityError,
+    ItemRepository,
+    ListContext,
+    ListRepository,
+    MembershipRepository,
+    NotificationRepository,
+    UnitOfWork,
+    UserRepository,
+    now_ms
+)
+from writer import WRITE_BATCH_SIZE, group_writer, notifications_writer
+
+logger = get_logger('repository')
+
+
+# ----------------------------------------------
+#    HELPERS
+# ----------------------------------------------
+
+def _placeholders(values) -> str:
+    return ', '.join(['?'] * len(values))
+
+
+# ----------------------------------------------
+#    REPOSITORIES
+# ----------------------------------------------
+
+class SqliteUserRepository(UserRepository):
+    def __init__(self, cur: sqlite3.Cursor):
+        self.cur = cur
+
+    def get_credentials(self, username):
+        row = self.cur.execute('SELECT user_id, password_hash FROM users WHERE username = ?', (username,)).fetchone()
+        return (row[0], row[1]) if row else None
+
+    def get_id(self, username):
+        row = self.cur.execute('SELECT user_id FROM users WHERE username = ?', (username,)).fetchone()
+        return row[0] if row else None
+
+    def create(self, username, password_hash):
+        try:
+            self.cur.execute('INSERT INTO users (username, password_hash) VALUES (?, ?)', (username, password_hash))
+        except sqlite3.IntegrityError as e:
+            raise IntegrityError(str(e)) from e
+        return self.cur.lastrowid
+
+    def search(self, prefix, exclude_username):
+        return self.cur.execute(
+            '''
+            SELECT user_id, username
+            FROM users
+            WHERE username LIKE ?              -- starts with query
+            AND username != ? COLLATE NOCASE   -- exclude matches
+            ''',
+            (f'{prefix}%', exclude_username)
+        ).fetchall()
+
+class SqliteListRepository(ListRepository):
+    def __init__(self, cur: sqlite3.Cursor):
+        self.cur = cur
+
+    def create(self, name, is_template=False):
+        now = now_ms()
+        self.cur.execute('''
+            INSERT INTO grocery_lists (name, creation_date, update_date, is_template)
+            VALUES (?, ?, ?, ?)
+        ''', (name, now, now, is_template))
+        return self.cur.lastrowid
+
+    def get_name(self, list_id):
+        row = self.cur.execute('SELECT name FROM grocery_lists WHERE list_id = ? AND deleted_at IS NULL', (list_id,)).fetchone()
+        return row[0] if row else None
+
+    def get_info(self, list_id):
+        row = self.cur.execute('''
+            SELECT name, strftime('%Y-%m-%d %H:%M:%S', update_date / 1000, 'unixepoch')
+            FROM grocery_lists
+            WHERE list_id = ? AND deleted_at IS NULL
+        ''', (list_id,)).fetchone()
+        return (row[0], row[1]) if row else None
+
+    def context(self, list_id, user_id):
+        # One row per member
+        rows = self.cur.execute('''
+            SELECT glu.user_id, glu.role, gl.name, gl.version
+            FROM grocery_lists gl
+            JOIN grocery_list_users glu ON gl.list_id = glu.list_id
+            WHERE gl.list_id = ?
+            AND gl.deleted_at IS NULL
+        ''', (list_id,)).fetchall()
+        role = next((row[1] for row in rows if row[0] == user_id), None)
+        if role is None:
+            return None
+        return ListContext(role, rows[0][2], rows[0][3], [row[0] for row in rows])
+
+    def for_user(self, user_id):
+        return self.cur.execute('''
+            SELECT gl.list_id, gl.name, glu.role, strftime('%Y-%m-%d %H:%M:%S', gl.update_date / 1000, 'unixepoch')
+            FROM grocery_lists gl
+            JOIN grocery_list_users glu ON gl.list_id = glu.list_id
+            WHERE glu.user_id = ?
+            AND gl.deleted_at IS NULL
+            AND gl.is_template = 0
+            ORDER BY gl.update_date DESC
+        ''', (user_id,)).fetchall()
+
+    def most_recent_for_user(self, user_id):
+        row = self.cur.execute('''
+            SELECT gl.list_id
+            FROM grocery_lists gl
+            JOIN grocery_list_users glu ON gl.list_id = glu.list_id
+            WHERE glu.user_id = ?
+            AND gl.deleted_at IS NULL
+            AND gl.is_template = 0
+            ORDER BY gl.update_date DESC
+            LIMIT 1
+        ''', (user_id,)).fetchone()
+        return row[0] if row else None
+
+    def versions_for_user(self, user_id, list_ids=None):
+        query = '''
+            SELECT gl.list_id, gl.name, gl.version
+            FROM grocery_lists gl
+            JOIN grocery_list_users glu ON gl.list_id = glu.list_id
+            WHERE glu.user_id = ?
+            AND gl.deleted_at IS NULL
+            AND gl.is_template = 0
+        '''
+        params = [user_id]
+        if list_ids:
+            query += f' AND gl.list_id IN ({_placeholders(list_ids)})'
+            params.extend(list_ids)
+        return self.cur.execute(query + ' ORDER BY gl.list_id', params).fetchall()
+
+    def accessible(self, user_id, list_ids):
+        if not list_ids:
+            return []
+        return self.cur.execute(f'''
+            SELECT gl.list_id, glu.role, gl.name, strftime('%Y-%m-%d %H:%M:%S', gl.update_date / 1000, 'unixepoch')
+            FROM grocery_lists gl
+            JOIN grocery_list_users glu ON gl.list_id = glu.list_id
+            WHERE glu.user_id = ?
+            AND gl.deleted_at IS NULL
+            AND gl.list_id IN ({_placeholders(list_ids)})
+        ''', (user_id, *list_ids)).fetchall()
+
+    def templates_for_user(self, user_id):
+        return self.cur.execute('''
+            SELECT gl.list_id, gl.name, strftime('%Y-%m-%d %H:%M:%S', gl.update_date / 1000, 'unixepoch'),
+                (SELECT COUNT(*) FROM grocery_list_items gli WHERE gli.list_id = gl.list_id)
+            FROM grocery_lists gl
+            JOIN grocery_list_users glu ON gl.list_id = glu.list_id
+            WHERE glu.user_id = ?
+            AND gl.deleted_at IS NULL
+            AND gl.is_template = 1
+            ORDER BY gl.name
+        ''', (user_id,)).fetchall()
+
+    def touch(self, list_id):
+        self.cur.execute('''
+            UPDATE grocery_lists
+            SET update_date = ?, version = version + 1
+            WHERE list_id = ?
+        ''', (now_ms(), list_id))
+
+    def rename(self, list_id, name):
+        self.cur.execute('''
+            UPDATE grocery_lists
+            SET name = ?, update_date = ?, version = version + 1
+            WHERE list_id = ?
+        ''', (name, now_ms(), list_id))
+
+    def soft_delete(self, list_id):
+        self.cur.execute('UPDATE grocery_lists SET deleted_at = ? WHERE list_id = ?', (now_ms(), list_id))
+
+class SqliteMembershipRepository(MembershipRepository):
+    def __init__(self, cur: sqlite3.Cursor):
+        self.cur = cur
+
+    def get_role(self, list_id, user_id):
+        row = self.cur.execute('''
+            SELECT glu.role
+            FROM grocery_list_users glu
+            JOIN grocery_lists gl ON gl.list_id = glu.list_id
+            WHERE glu.list_id = ?
+            AND glu.user_id = ?
+            AND gl.deleted_at IS NULL
+        ''', (list_id, user_id)).fetchone()
+        return row[0] if row else None
+
+    def add(self, list_id, user_id, role):
+        try:
+            self.cur.execute('INSERT INTO grocery_list_users (list_id, user_id, role) VALUES (?, ?, ?)', (list_id, user_id, role))
+        except sqlite3.IntegrityError as e:
+            raise IntegrityError(str(e)) from e
+
+    def accept_invite(self, list_id, user_id, role):
+        self.cur.execute('''
+            INSERT OR IGNORE INTO grocery_list_users (list_id, user_id, role)
+            SELECT list_id, ?, ?
+            FROM grocery_lists
+            WHERE list_id = ? AND deleted_at IS NULL
+        ''', (user_id, role, list_id))
+
+    def remove(self, list_id, user_id):
+        self.cur.execute('DELETE FROM grocery_list_users WHERE list_id = ? AND user_id = ?', (list_id, user_id))
+
+    def set_role(self, list_id, user_id, role):
+        self.cur.execute('UPDATE grocery_list_users SET role = ? WHERE user_id = ? AND list_id = ?', (role, user_id, list_id))
+
+    def other_members(self, list_id, user_id):
+        return self.cur.execute('''
+            SELECT user_id, role
+            FROM grocery_list_users
+            WHERE list_id = ? AND user_id != ?
+        ''', (list_id, user_id)).fetchall()
+
+    def other_member_ids(self, list_id, user_id):
+        rows = self.cur.execute('''
+            SELECT user_id
+            FROM grocery_list_users
+            WHERE list_id = ? AND user_id != ?
+        ''', (list_id, user_id)).fetchall()
+        return [row[0] for row in rows]
+
+    def other_members_of_lists(self, list_ids, user_id):
+        if not list_ids:
+            return []
+        return self.cur.execute(f'''
+            SELECT glu.list_id, u.user_id, u.username, glu.role
+            FROM grocery_list_users glu
+            JOIN users u ON glu.user_id = u.user_id
+            WHERE glu.list_id IN ({_placeholders(list_ids)})
+            AND glu.user_id != ?
+        ''', (*list_ids, user_id)).fetchall()
+
+    def copy(self, source_list_id, list_id, exclude_user_id):
+        self.cur.execute('''
+            INSERT INTO grocery_list_users (list_id, user_id, role)
+            SELECT ?, user_id, CASE WHEN role = 'owner' THEN 'admin' ELSE role END
+            FROM grocery_list_users
+            WHERE list_id = ? AND user_id != ?
+        ''', (list_id, source_list_id, exclude_user_id))
+
+class SqliteItemRepository(ItemRepository):
+    def __init__(self, cur: sqlite3.Cursor):
+        self.cur = cur
+
+    def categories(self):
+        return self.cur.execute('SELECT name, category_id FROM categories').fetchall()
+
+    def category_id(self, name):
+        row = self.cur.execute('SELECT category_id FROM categories WHERE name = ?', (name,)).fetchone()
+        return row[0] if row else None
+
+    def find(self, name, category_id):
+        row = self.cur.execute('SELECT item_id FROM items WHERE name = ? AND category_id = ?', (name, category_id)).fetchone()
+        return row[0] if row else None
+
+    def create(self, name, category_id):
+        self.cur.execute('INSERT INTO items (name, category_id) VALUES (?, ?)', (name, category_id))
+        return self.cur.lastrowid
+
+    def get_name(self, item_id):
+        row = self.cur.execute('SELECT name FROM items WHERE item_id = ?', (item_id,)).fetchone()
+        return row[0] if row else None
+
+    def created_after(self, item_id):
+        return self.cur.execute(
+            'SELECT item_id, name, category_id FROM items WHERE item_id > ? ORDER BY item_id',
+            (item_id,)
+        ).fetchall()
+
+    def on_list(self, list_id):
+        return self.cur.execute('''
+            SELECT item_id, quantity
+            FROM grocery_list_items
+            WHERE list_id = ?
+        ''', (list_id,)).fetchall()
+
+    def on_lists(self, list_ids):
+        if not list_ids:
+            return []
+        return self.cur.execute(f'''
+            SELECT list_id, item_id, quantity
+            FROM grocery_list_items
+            WHERE list_id IN ({_placeholders(list_ids)})
+            ORDER BY list_id
+        ''', tuple(list_ids)).fetchall()
+
+    def add_to_list(self, list_id, item_id, quantity):
+        try:
+            self.cur.execute('INSERT INTO grocery_list_items (list_id, item_id, quantity) VALUES (?, ?, ?)', (list_id, item_id, quantity))
+        except sqlite3.IntegrityError as e:
+            raise IntegrityError(str(e)) from e
+
+    def add_many_to_list(self, list_id, items):
+        try:
+            self.cur.executemany(
+                'INSERT INTO grocery_list_items (list_id, item_id, quantity) VALUES (?, ?, ?)',
+                [(list_id, item_id, quantity) for item_id, quantity in items]
+            )
+        except sqlite3.IntegrityError as e:
+            raise IntegrityError(str(e)) from e
+
+    def set_quantity(self, list_id, item_id, quantity):
+        self.cur.execute('''
+            UPDATE grocery_list_items
+            SET quantity = ?
+            WHERE list_id = ? AND item_id = ?
+        ''', (quantity, list_id, item_id))
+
+    def remove_from_list(self, list_id, item_id):
+        self.cur.execute('DELETE FROM grocery_list_items WHERE list_id = ? AND item_id = ?', (list_id, item_id))
+
+    def copy_list(self, source_list_id, list_id, reset_quantities=False):
+        # Copies all items in one statement
+        self.cur.execute('''
+            INSERT INTO grocery_list_items (list_id, item_id, quantity)
+            SELECT ?, item_id, CASE WHEN ? THEN 1 ELSE quantity END
+            FROM grocery_list_items
+            WHERE list_id = ?
+        ''', (list_id, reset_quantities, source_list_id))
+
+    def totals_for_lists(self, list_ids):
+        if not list_ids:
+            return []
+
+        # One row per item: category, item, total quantity, and "list_id:quantity" pairs
+        rows = self.cur.execute(f'''
+            SELECT c.name, i.item_id, i.name, SUM(gli.quantity),
+                GROUP_CONCAT(gli.list_id || ':' || gli.quantity)
+            FROM grocery_list_items gli
+            JOIN items i ON gli.item_id = i.item_id
+            JOIN categories c ON i.category_id = c.category_id
+            WHERE gli.list_id IN ({_placeholders(list_ids)})
+            GROUP BY gli.item_id
+            ORDER BY c.name, i.name
+        ''', list_ids).fetchall()
+
+        totals = []
+        for category, item_id, name, quantity, provenance in rows:
+            pairs = [pair.split(':') for pair in provenance.split(',')]
+            totals.append((category, item_id, name, quantity, [(int(l), int(q)) for l, q in pairs]))
+        return totals
+
+class SqliteNotificationRepository(NotificationRepository):
+    def __init__(self, cur: sqlite3.Cursor):
+        self.cur = cur
+
+    def create(self, user_id, message, icon, actionable, action_type, requested_list_id, unread, data):
+        self.cur.execute('''
+            INSERT INTO notifications (user_id, icon, message, actionable, action_type, requested_list_id, unread, created_at, data)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (user_id, icon, message, actionable, action_type, requested_list_id, unread, now_ms(), data))
+        return self.cur.lastrowid
+
+    def for_user(self, user_id, limit, after_id=None):
+        return self.cur.execute('''
+            SELECT n.id, n.icon, n.message, n.actionable, n.action_type, n.requested_list_id, n.unread,
+                strftime('%Y-%m-%d %H:%M:%S', n.created_at / 1000, 'unixepoch'), n.data
+            FROM notifications n
+            LEFT JOIN grocery_lists gl ON gl.list_id = n.requested_list_id
+            WHERE n.user_id = ?
+            AND n.id > ?
+            AND gl.deleted_at IS NULL   -- hide notifications for lists awaiting purge
+            ORDER BY n.unread DESC, n.created_at DESC, n.id DESC
+            LIMIT ?
+        ''', (user_id, after_id or 0, limit)).fetchall()
+
+    def mark_read(self, notification_ids):
+        self.cur.executemany('UPDATE notifications SET unread = 0 WHERE id = ?', [(n_id,) for n_id in notification_ids])
+
+    def delete(self, notification_ids):
+        self.cur.executemany('DELETE FROM notifications WHERE id = ?', [(n_id,) for n_id in notification_ids])
+
+class DeferredNotificationRepository(NotificationRepository):
+    """
+    Notifications of a write unit of work, when they are kept in their own database.
+
+    Writes are queued in `pending` and handed to `notification_outbox` once the unit of
+    work's other changes are committed. `create()` returns None, as the ID is only known
+    once the notification is written. Reads see committed notifications only.
+    """
+
+    def __init__(self):
+        self.pending: list[tuple] = []
+
+    def create(self, user_id, message, icon, actionable, action_type, requested_list_id, unread, data):
+        self.pending.append((
+            SqliteNotificationRepository.create,
+            (user_id, message, icon, actionable, action_type, requested_list_id, unread, data)
+        ))
+        return None
+
+    def for_user(self, user_id, limit, after_id=None):
+        with db.read_pool.snapshot() as conn:
+            return SqliteNotificationRepository(conn.cursor()).for_user(user_id, limit, after_id)
+
+    def mark_read(self, notification_ids):
+        self.pending.append((SqliteNotificationRepository.mark_read, (list(notification_ids),)))
+
+    def delete(self, notification_ids):
+        self.pending.append((SqliteNotificationRepository.delete, (list(notification_ids),)))
+
+class NotificationOutbox:
+    """
+    Background thread writing the notification changes of committed write units of work
+    to the separate notifications database.
+
+    Requests do not wait for these writes: the change a notification reports is already
+    committed, and list changes and the notifications they fan out to members then never
+    wait on each other's write lock. The changes of up to `max_batch` units of work are
+    written in one unit of work on `writer.notifications_writer`, or `writer.group_writer`
+    if notifications are in the application database (see `partitioned_repository.py`).
+    Changes that cannot be written are logged and counted as dropped.
+
+    Args:
+        max_batch (int): Most units of work whose changes are written together.
+    """
+
+    def __init__(self, max_batch: int = WRITE_BATCH_SIZE):
+        self.max_batch = max(max_batch, 1)
+
+        self._lock = threading.Lock()
+        self._done = threading.Condition(self._lock)
+        self._queue: queue.SimpleQueue | None = None
+        self._pid = None
+        self._unfinished = 0
+
+    def put(self, changes: list[tuple]):
+        """
+        Queue the `pending` changes of a `DeferredNotificationRepository` to be written.
+        """
+        with self._lock:
+            if self._pid != os.getpid():
+                # The writing thread is not inherited through fork; neither are queued changes
+                self._pid = os.getpid()
+                self._queue = queue.SimpleQueue()
+                self._unfinished = 0
+                threading.Thread(target=self._run, args=(self._queue,), name='notification-outbox', daemon=True).start()
+            self._unfinished += 1
+            self._queue.put(changes)
+
+    def join(self, timeout: float | None = None) -> bool:
+        """
+        Wait until every queued change has been written or dropped.
+
+        Returns:
+            bool: False if `timeout` passed first.
+        """
+        with self._done:
+            return self._done.wait_for(lambda: self._unfinished == 0, timeout)
+
+    def _run(self, changes_queue: queue.SimpleQueue):
+        while True:
+            batch = [changes_queue.get()]
+            while len(batch) < self.max_batch:
+                try:
+                    batch.append(changes_queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            try:
+                self._write(batch)
+            except Exception as e:
+                if len(batch) == 1:
+                    self._drop(batch, e)
+                else:
+                    # Keep one unit of work's bad changes from dropping the others'
+                    for changes in batch:
+                        try:
+                            self._write([changes])
+                        except Exception as e:
+                            self._drop([changes], e)
+
+            with self._done:
+                self._unfinished -= len(batch)
+                self._done.notify_all()
+
+    def _write(self, batch: list[list[tuple]]):
+        # Notifications stay in the application database unless they have their own file
+        writer = notifications_writer if db.NOTIFICATIONS_DB_PATH else group_writer
+        with writer.unit_of_work() as conn, closing(conn.cursor()) as cur:
+            repo = SqliteNotificationRepository(cur)
+            for changes in batch:
+                for method, args in changes:
+                    method(repo, *args)
+
+    def _drop(self, batch: list[list[tuple]], error: Exception):
+        count = sum(len(changes) for changes in batch)
+        metrics.inc('grocery_notifications_dropped_total', (), count)
+        logger.error("Dropped %s notification changes: %s", count, error)
+
+
+# ----------------------------------------------
+#    UNIT OF WORK
+# ----------------------------------------------
+
+class SqliteUnitOfWork(UnitOfWork):
+    """
+    Repositories sharing the cursor of an open connection.
+
+    Args:
+        conn (sqlite3.Connection): Connection whose transaction the repositories write in.
+        notifications (NotificationRepository, optional): Repository for notifications, if
+            they are not in `conn`'s database. Defaults to one on `conn`.
+    """
+
+    def __init__(self, conn: sqlite3.Connection, notifications: NotificationRepository | None = None):
+        self.conn = conn
+        self.cur = conn.cursor()
+        self.users = SqliteUserRepository(self.cur)
+        self.lists = SqliteListRepository(self.cur)
+        self.memberships = SqliteMembershipRepository(self.cur)
+        self.items = SqliteItemRepository(self.cur)
+        self.notifications = notifications or SqliteNotificationRepository(self.cur)
+
+    def snapshot(self):
+        # Reads only open a transaction when one is begun explicitly
+        if not self.conn.in_transaction:
+            self.cur.execute('BEGIN')
+
+    def pending_migrations(self):
+        return max(len(MIGRATIONS) - self.cur.execute('PRAGMA user_version').fetchone()[0], 0)
+
+    def close(self):
+        """
+        Close the cursor, before the connection is handed back to its writer or pool.
+
+        Connections are shared between threads, one unit of work at a time, and so is
+        their statement cache. A cursor freed later, e.g. by a route still holding the
+        unit of work, resets its last statement, which another thread may be running
+        by then.
+        """
+        self.cur.close()
+
+class SqliteStore(DataStore):
+    """
+    The SQLite application database, at the path set with `db.configure()`.
+
+    Read-only units of work run on `db.read_pool`. Others run on the process's
+    `writer.group_writer` and are committed in batches.
+
+    With a separate notifications database, units of work that only use notifications
+    run on `writer.notifications_writer`. Other write units of work queue their
+    notification changes for `notification_outbox` once their own changes are committed.
+    """
+
+    @contextmanager
+    def unit_of_work(self, readonly=False, notifications_only=False):
+        if readonly:
+            with db.read_pool.snapshot() as conn, closing(SqliteUnitOfWork(conn)) as uow:
+                yield uow
+        elif not db.NOTIFICATIONS_DB_PATH:
+            with group_writer.unit_of_work() as conn, closing(SqliteUnitOfWork(conn)) as uow:
+                yield uow
+        elif notifications_only:
+            with notifications_writer.unit_of_work() as conn, closing(SqliteUnitOfWork(conn)) as uow:
+                yield uow
+        else:
+            notifications = DeferredNotificationRepository()
+            with group_writer.unit_of_work() as conn, closing(SqliteUnitOfWork(conn, notifications)) as uow:
+                yield uow
+            if notifications.pending:
+                notification_outbox.put(notifications.pending)
+
+
+# Shared outbox for the server process; queued notifications are written before exit
+notification_outbox = NotificationOutbox()
+atexit.register(notification_outbox.join, 5.0)
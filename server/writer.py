@@ -0,0 +1,366 @@
+"""
+Module for committing writes from concurrent requests in groups.
+
+SQLite allows one writer at a time, and each commit ends with an fsync. When every
+request commits its own transaction, concurrent writers queue on the database lock
+and throughput is capped at roughly one fsync per request.
+
+The `GroupCommitWriter` instead shares one write transaction between the requests of
+a process:
+    1. A request's unit of work runs on the writer's connection, inside a savepoint
+       of the currently open transaction (opened with `BEGIN IMMEDIATE` if none is).
+       Units of work run one at a time.
+    2. When the unit of work ends, its savepoint is released (or rolled back, if it
+       raised, leaving the other units of the transaction untouched) and the request
+       waits for the transaction to be committed.
+    3. A writer thread commits the transaction once it holds `max_batch` units of
+       work, `max_delay` seconds after it was opened, or as soon as no other unit of
+       work is running or waiting to run, whichever comes first. Every request of
+       the batch then returns, or raises the commit error.
+
+Requests only return after their changes are committed, so clients never see a
+success for a write that is later lost.
+
+Other processes (other workers, the purger) may hold the database lock. Taking the
+lock and committing are retried with jittered exponential backoff until
+`lock_timeout` has passed, after which the unit of work fails with
+`DatabaseBusyError` and nothing of it is applied.
+
+Each database file has its own writer: `group_writer` for the application database,
+`notifications_writer` for notifications when they are kept in their own file
+(see `db.NOTIFICATIONS_DB_PATH`), and `partition_writer(i)` for each list partition
+(see `db.LIST_PARTITIONS`), so they never wait on each other's lock.
+"""
+
+import os
+import random
+import sqlite3
+import threading
+import time
+
+import db
+from logger import get_logger
+from metrics import metrics
+from repository import DatabaseBusyError
+
+logger = get_logger('writer')
+
+
+# ----------------------------------------------
+#   CONSTANTS
+# ----------------------------------------------
+
+# Maximum units of work committed in one transaction
+WRITE_BATCH_SIZE = int(os.getenv('GROCERY_WRITE_BATCH_SIZE', 32))
+
+# Longest time (seconds) a write transaction stays open collecting units of work
+WRITE_BATCH_DELAY = float(os.getenv('GROCERY_WRITE_BATCH_DELAY_MS', 2)) / 1000
+
+# Longest time (seconds) spent retrying to take the database lock, or to commit
+WRITE_LOCK_TIMEOUT = float(os.getenv('GROCERY_WRITE_LOCK_TIMEOUT_MS', 2000)) / 1000
+
+# First and largest upper bound (seconds) of the random pause between lock attempts
+BACKOFF_BASE = 0.001
+BACKOFF_MAX = 0.05
+
+# Upper bounds (seconds) of the lock wait histogram buckets
+LOCK_WAIT_BUCKETS = (0.0, 0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+# Upper bounds of the units-per-commit histogram buckets
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128)
+
+# Upper bounds (seconds) of the commit duration histogram buckets
+COMMIT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+
+
+# ----------------------------------------------
+#    CLASSES
+# ----------------------------------------------
+
+class _Waiter:
+    """
+    A unit of work waiting for its transaction to be committed.
+    """
+
+    __slots__ = ('done', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.error: BaseException | None = None
+
+class GroupCommitWriter:
+    """
+    Per-process single-writer connection committing units of work in batches.
+
+    Args:
+        max_batch (int): Units of work after which the transaction is committed right away.
+        max_delay (float): Seconds after which an open transaction is committed.
+        lock_timeout (float): Seconds spent retrying to take the database lock, or to commit.
+        database (str): The database written to, `'main'`, `'notifications'` or `'partition{i}'`
+            (see `db.connect()`).
+    """
+
+    def __init__(
+        self,
+        max_batch: int = WRITE_BATCH_SIZE,
+        max_delay: float = WRITE_BATCH_DELAY,
+        lock_timeout: float = WRITE_LOCK_TIMEOUT,
+        database: str = 'main'
+    ):
+        self.max_batch = max(max_batch, 1)
+        self.max_delay = max(max_delay, 0.0)
+        self.lock_timeout = lock_timeout
+        self.database = database
+        self._labels = (('database', database),)
+
+        # Guards the connection and the open batch; held while a unit of work runs
+        self._cond = threading.Condition(threading.Lock())
+        self._local = threading.local()
+        self._conn: sqlite3.Connection | None = None
+        self._path = None
+        self._pid = None
+        self._pending: list[_Waiter] = []
+        self._opened_at = 0.0
+
+        # Units of work running or waiting to run, which a commit is worth delaying for
+        self._active = 0
+        self._active_lock = threading.Lock()
+        self._stop = False
+        self._thread: threading.Thread | None = None
+
+    def unit_of_work(self):
+        """
+        Context manager yielding the writer's connection for one unit of work.
+
+        Changes are committed, together with those of other units of work, after the
+        block exits normally (including via `return`), and rolled back if it raises.
+        The block runs while holding the writer, so it must not open another write
+        unit of work or do slow work that does not need the database.
+
+        Raises:
+            RuntimeError: If a write unit of work is already open on this thread.
+            DatabaseBusyError: If the database stayed locked by other processes past
+                `lock_timeout`, when opening or committing the transaction.
+            sqlite3.Error: If the transaction could not be opened or committed otherwise.
+        """
+        return _UnitOfWork(self)
+
+    def stop(self, timeout: float | None = None):
+        """
+        Commit the open transaction, if any, and stop the writer thread.
+        """
+        with self._cond:
+            self._stop = True
+            self._cond.notify_all()
+        if self._thread:
+            self._thread.join(timeout)
+
+    def _begin(self) -> tuple[sqlite3.Connection, _Waiter]:
+        if getattr(self._local, 'active', False):
+            raise RuntimeError("A write unit of work is already open on this thread")
+
+        with self._active_lock:
+            self._active += 1
+        self._cond.acquire()
+        try:
+            # Leave the writer thread a turn once the open batch is due, so a steady
+            # stream of units of work cannot keep it from committing
+            while self._pending and (
+                len(self._pending) >= self.max_batch or time.monotonic() >= self._opened_at + self.max_delay
+            ):
+                self._cond.wait()
+
+            conn = self._connection()
+            if not conn.in_transaction:
+                # Take the write lock up front, rather than failing to upgrade a read lock later
+                self._retry_busy('begin', lambda: conn.execute('BEGIN IMMEDIATE'))
+                self._opened_at = time.monotonic()
+            conn.execute('SAVEPOINT unit_of_work')
+        except BaseException:
+            self._finish_unit()
+            raise
+
+        self._local.active = True
+        return conn, _Waiter()
+
+    def _end(self, conn: sqlite3.Connection, waiter: _Waiter, failed: bool):
+        try:
+            try:
+                if failed:
+                    conn.execute('ROLLBACK TO unit_of_work')
+                conn.execute('RELEASE unit_of_work')
+            except sqlite3.Error as e:
+                # The transaction is unusable; fail everything in it
+                self._abort(e)
+                if not failed:
+                    raise
+                return
+
+            if failed:
+                if not self._pending:
+                    # Nothing left to commit; release the write lock for other processes
+                    conn.rollback()
+                return
+
+            self._pending.append(waiter)
+            self._ensure_thread()
+            self._cond.notify_all()
+        finally:
+            self._local.active = False
+            self._finish_unit()
+
+        waiter.done.wait()
+        if waiter.error is not None:
+            raise waiter.error
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is not None and self._pid != os.getpid():
+            # Inherited through fork; the parent process still owns the connection and its batch
+            self._conn = None
+            self._pending = []
+            self._thread = None
+        elif self._conn is not None and self._path != db.database_path(self.database):
+            self._abort(sqlite3.OperationalError("The database path changed before the commit"))
+            self._conn.close()
+            self._conn = None
+
+        if self._conn is None:
+            self._conn = db.connect(shared=True, database=self.database)
+            # Lock waits are retried by `_retry_busy()` instead of SQLite's busy handler
+            self._conn.execute('PRAGMA busy_timeout = 0')
+            self._path = db.database_path(self.database)
+            self._pid = os.getpid()
+        return self._conn
+
+    def _finish_unit(self):
+        with self._active_lock:
+            self._active -= 1
+        self._cond.release()
+
+    def _ensure_thread(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop = False
+            self._thread = threading.Thread(target=self._run, name=f'group-commit-{self.database}', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        with self._cond:
+            while True:
+                while not self._pending and not self._stop:
+                    self._cond.wait()
+                if not self._pending:
+                    return
+
+                # Collect more units of work until the batch is full or its delay expires,
+                # unless there is nobody to wait for
+                while len(self._pending) < self.max_batch and self._active and not self._stop:
+                    remaining = self._opened_at + self.max_delay - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+
+                self._commit()
+
+    def _commit(self):
+        batch, self._pending = self._pending, []
+        start = time.perf_counter()
+        error = None
+        try:
+            # A commit that failed with SQLITE_BUSY leaves the transaction open to be retried
+            self._retry_busy('commit', self._conn.commit)
+        except (sqlite3.Error, DatabaseBusyError) as e:
+            logger.error("Group commit of %s units of work to the %s database failed: %s", len(batch), self.database, e)
+            error = e
+            try:
+                self._conn.rollback()
+            except sqlite3.Error:
+                pass
+
+        metrics.observe('grocery_write_batch_size', self._labels, len(batch), BATCH_SIZE_BUCKETS)
+        metrics.observe('grocery_write_commit_seconds', self._labels, time.perf_counter() - start, COMMIT_BUCKETS)
+        for waiter in batch:
+            waiter.error = error
+            waiter.done.set()
+        self._cond.notify_all()
+
+    def _retry_busy(self, stage: str, operation):
+        """
+        Run `operation()`, retrying with jittered exponential backoff while the database is locked.
+        """
+        labels = (*self._labels, ('stage', stage))
+        start = time.monotonic()
+        deadline = start + self.lock_timeout
+        attempt = 0
+        while True:
+            try:
+                operation()
+                break
+            except sqlite3.OperationalError as e:
+                if not _is_busy(e):
+                    raise
+                now = time.monotonic()
+                if now >= deadline:
+                    metrics.inc('grocery_write_lock_timeouts_total', labels)
+                    metrics.observe('grocery_write_lock_wait_seconds', labels, now - start, LOCK_WAIT_BUCKETS)
+                    raise DatabaseBusyError(
+                        f"Database still locked after {self.lock_timeout:.1f}s ({stage}, {attempt + 1} attempts)"
+                    ) from e
+
+                metrics.inc('grocery_write_lock_retries_total', labels)
+                pause = random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+                time.sleep(min(pause, deadline - now))
+                attempt += 1
+
+        metrics.observe('grocery_write_lock_wait_seconds', labels, time.monotonic() - start, LOCK_WAIT_BUCKETS)
+
+    def _abort(self, error: BaseException):
+        batch, self._pending = self._pending, []
+        try:
+            self._conn.rollback()
+        except sqlite3.Error:
+            pass
+        for waiter in batch:
+            waiter.error = error
+            waiter.done.set()
+
+def _is_busy(error: sqlite3.OperationalError) -> bool:
+    code = getattr(error, 'sqlite_errorcode', None)
+    if code is not None:
+        # Primary result code, without the extended bits (e.g. SQLITE_BUSY_SNAPSHOT)
+        return code & 0xff in (sqlite3.SQLITE_BUSY, sqlite3.SQLITE_LOCKED)
+    return 'locked' in str(error) or 'busy' in str(error)
+
+def partition_writer(partition: int) -> GroupCommitWriter:
+    """
+    Return the process's writer for list partition `partition`.
+    """
+    writer = _partition_writers.get(partition)
+    if writer is None:
+        with _partition_writers_lock:
+            writer = _partition_writers.setdefault(partition, GroupCommitWriter(database=f'partition{partition}'))
+    return writer
+
+class _UnitOfWork:
+    """
+    Context manager returned by `GroupCommitWriter.unit_of_work()`.
+    """
+
+    __slots__ = ('writer', 'conn', 'waiter')
+
+    def __init__(self, writer: GroupCommitWriter):
+        self.writer = writer
+
+    def __enter__(self) -> sqlite3.Connection:
+        self.conn, self.waiter = self.writer._begin()
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        self.writer._end(self.conn, self.waiter, failed=exc_type is not None)
+        return False
+
+
+# Shared writers for the server process
+group_writer = GroupCommitWriter()
+notifications_writer = GroupCommitWriter(database='notifications')
+_partition_writers: dict[int, GroupCommitWriter] = {}
+_partition_writers_lock = threading.Lock()